@@ -1,23 +1,63 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from contextlib import asynccontextmanager
 import asyncio
+import json
 import random
 import logging
 import os
-import uuid
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 # Rest of your imports...
-from .services.llm import generate_chat_response, llm_provider_name
+from .services.llm import generate_chat_response, llm_provider_name, stream_chat_response
 from .orchestrator import run_workflow
-from .services.report import build_report
+from .services.report_jobs import report_queue
+from .services.report_store import content_id, legacy_report_path, report_path, report_store
+from .services.http import open_clients, close_clients
+from .services.limits import upstream_metrics
+from .services.metrics import HTTP_DURATION, LLM_DURATION, LLM_FIRST_TOKEN, REPORTS, registry
+from .services.profiling import admin_token, find_profile, is_admin, list_profiles, profile_path, profile_request, profiling_requested
+from .mock_data.loader import preload as preload_mock_data, watch_samples
+from .services.rag import refresh_index, watch_internal_docs
+from .services.ctgov_mirror import watch_ctgov_mirror
+from .services.batch import batch_concurrency, batch_max_queries, combined_report_data, run_batch
 
-app = FastAPI(title="PharmaBridge Agentic Backend", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    preload_mock_data()
+    await asyncio.to_thread(refresh_index)
+    background: List[asyncio.Task] = []
+    if os.getenv("MOCK_DATA_HOT_RELOAD", "0").strip().lower() in ("1", "true", "yes"):
+        interval_s = float(os.getenv("MOCK_DATA_RELOAD_INTERVAL_S", "2"))
+        background.append(asyncio.create_task(watch_samples(interval_s)))
+    rag_interval_s = float(os.getenv("RAG_REFRESH_INTERVAL_S", "30"))
+    if rag_interval_s > 0:
+        background.append(asyncio.create_task(watch_internal_docs(rag_interval_s)))
+    if os.getenv("CTGOV_MODE", "live").strip().lower() == "mirror":
+        sync_interval_s = float(os.getenv("CTGOV_MIRROR_SYNC_INTERVAL_S", "3600"))
+        if sync_interval_s > 0:
+            background.append(asyncio.create_task(watch_ctgov_mirror(sync_interval_s)))
+    await asyncio.to_thread(report_store.maintain)
+    await open_clients()
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await close_clients()
+        await report_queue.shutdown()
+        report_store.maintain()
+
+
+app = FastAPI(title="PharmaBridge Agentic Backend", version="0.1.0", lifespan=lifespan)
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +75,18 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/api/reports/{report_id}), not the raw path, to keep label sets bounded.
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_DURATION.observe(
+        time.perf_counter() - started, method=request.method, route=route, status=str(response.status_code)
+    )
+    return response
+
+
 class ChatMessage(BaseModel):
     id: Optional[str] = None
     role: str
@@ -52,8 +104,20 @@ class ChatResponse(BaseModel):
     content: str
     agentsUsed: List[str]
     report_id: Optional[str] = None
+    report_status: Optional[str] = None
     report_data: Optional[Dict[str, Any]] = None
     llm_provider: Optional[str] = None
+    llm_cache: Optional[Dict[str, Any]] = None
+
+class RenderRequest(BaseModel):
+    report_data: Dict[str, Any]
+
+
+class BatchRequest(BaseModel):
+    queries: List[str]
+    report: bool = False
+    concurrency: Optional[int] = None
+
 
 @app.get("/debug/env")
 async def debug_env():
@@ -63,54 +127,271 @@ async def debug_env():
         "CTGOV_TIMEOUT_S": os.getenv("CTGOV_TIMEOUT_S"),
     }
 
+def _demo_latency_enabled() -> bool:
+    return os.getenv("DEMO_LATENCY", "0").strip().lower() in ("1", "true", "yes")
+
+
+def _record_llm(report_data: Dict[str, Any], mode: str, started: float, llm_cache: Optional[Dict[str, Any]]) -> None:
+    elapsed = time.perf_counter() - started
+    LLM_DURATION.observe(elapsed, mode=mode, outcome=(llm_cache or {}).get("cache", "fallback"))
+    timings = (report_data.get("sources") or {}).get("timings")
+    if isinstance(timings, dict):
+        timings["llm_ms"] = round(elapsed * 1000, 1)
+
+
+def _submit_report(report_data: Dict[str, Any], profile_id: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    if not report_data:
+        return None, None
+    # Identical evidence maps to the same id, so an already rendered PDF is reused as-is.
+    report_id = content_id(report_data)
+    if report_store.touch(report_id):
+        REPORTS.inc(outcome="ready")
+        return report_id, "ready"
+    report_status = report_queue.submit(
+        report_id, report_data, profile_path(profile_id, "report") if profile_id else None
+    )
+    REPORTS.inc(outcome=report_status)
+    if report_status == "rejected":
+        logger.warning("Report queue full (%d pending); skipping PDF for this answer", report_queue.pending())
+        return None, report_status
+    return report_id, report_status
+
+
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    await asyncio.sleep(0.5 + random.random())
-    result = await run_workflow(query=req.message, history=req.history or [])
-
-    response_length = len(str(result))
-    base_delay = min(3.0, 0.5 + (response_length / 1000) * 0.5)
-    jitter = random.uniform(-0.3, 0.3)
-    delay = max(0.2, base_delay + jitter)
-    
-    if result:
-        await asyncio.sleep(delay)
+async def chat(req: ChatRequest, response: Response, x_profile: Optional[str] = Header(None)):
+    # Off unless the admin token is sent in X-Profile or PROFILE_SAMPLE_RATE picks this request.
+    if not profiling_requested(x_profile):
+        return await _chat(req)
+    async with profile_request(req.message) as profile_id:
+        result = await _chat(req, profile_id)
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return result
+
+
+async def _chat(req: ChatRequest, profile_id: Optional[str] = None) -> ChatResponse:
+    # Simulated "thinking" pauses, kept only for demos; off by default.
+    demo_latency = _demo_latency_enabled()
+    if demo_latency:
+        await asyncio.sleep(0.5 + random.random())
+    result = await run_workflow(query=req.message, history=req.history or [], conversation_id=req.conversationId)
+
+    if demo_latency and result:
+        response_length = len(str(result))
+        base_delay = min(3.0, 0.5 + (response_length / 1000) * 0.5)
+        jitter = random.uniform(-0.3, 0.3)
+        await asyncio.sleep(max(0.2, base_delay + jitter))
 
     fallback_content = result.get("summary", "No response")
     agents_used = result.get("agents_used", [])
     report_data = result.get("report_data", {})
 
-    content = await generate_chat_response(
+    llm_started = time.perf_counter()
+    content, llm_cache = await generate_chat_response(
         query=req.message,
         history=[m.model_dump() for m in (req.history or [])],
         report_data=report_data if isinstance(report_data, dict) else {},
         fallback_text=fallback_content,
+        agents_used=agents_used,
     )
+    if isinstance(report_data, dict):
+        _record_llm(report_data, "complete", llm_started, llm_cache)
 
-    report_id = None
-    if report_data:
-        report_id = str(uuid.uuid4())
-        pdf_path = os.path.join(os.path.dirname(__file__), "storage", "reports")
-        os.makedirs(pdf_path, exist_ok=True)
-        target = os.path.join(pdf_path, f"{report_id}.pdf")
-
-        build_report(report_data, target)
-
-        if not os.path.exists(target):
-            logger.warning("Report build did not create expected PDF at %s", target)
+    report_id, report_status = _submit_report(report_data, profile_id)
 
     return ChatResponse(
         content=content,
         agentsUsed=agents_used,
         report_id=report_id,
+        report_status=report_status,
         report_data=report_data if isinstance(report_data, dict) else None,
         llm_provider=llm_provider_name(),
+        llm_cache=llm_cache,
     )
 
 
+def _ndjson(event: Dict[str, Any]) -> bytes:
+    return (json.dumps(event, default=str) + "\n").encode("utf-8")
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Same pipeline as /api/chat, streamed as NDJSON events.
+
+    Emits `plan`, one `agent` event per finished worker, `token` events with content deltas,
+    and a final `done` event carrying the ChatResponse fields (or `error`).
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_event(event: Dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def body():
+        workflow = asyncio.create_task(
+            run_workflow(
+                query=req.message,
+                history=req.history or [],
+                on_event=on_event,
+                conversation_id=req.conversationId,
+            )
+        )
+        try:
+            while not (workflow.done() and events.empty()):
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, workflow}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield _ndjson(getter.result())
+                else:
+                    getter.cancel()
+            result = workflow.result()
+
+            report_data = result.get("report_data", {})
+            parts: List[str] = []
+            llm_cache: Dict[str, Any] = {}
+            llm_started = time.perf_counter()
+            async for delta in stream_chat_response(
+                query=req.message,
+                history=[m.model_dump() for m in (req.history or [])],
+                report_data=report_data if isinstance(report_data, dict) else {},
+                fallback_text=result.get("summary", "No response"),
+                agents_used=result.get("agents_used", []),
+                cache_meta=llm_cache,
+            ):
+                if not parts:
+                    LLM_FIRST_TOKEN.observe(time.perf_counter() - llm_started)
+                parts.append(delta)
+                yield _ndjson({"type": "token", "delta": delta})
+            content = "".join(parts)
+            if isinstance(report_data, dict):
+                _record_llm(report_data, "stream", llm_started, llm_cache)
+
+            report_id, report_status = _submit_report(report_data)
+            done = ChatResponse(
+                content=content,
+                agentsUsed=result.get("agents_used", []),
+                report_id=report_id,
+                report_status=report_status,
+                report_data=report_data if isinstance(report_data, dict) else None,
+                llm_provider=llm_provider_name(),
+                llm_cache=llm_cache or None,
+            )
+            yield _ndjson({"type": "done", **done.model_dump()})
+        except Exception as e:
+            logger.exception("Streaming chat failed")
+            yield _ndjson({"type": "error", "detail": str(e)})
+        finally:
+            if not workflow.done():
+                workflow.cancel()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/api/batch")
+async def batch(req: BatchRequest):
+    """Screen many queries in one job, streamed as NDJSON.
+
+    Queries that resolve to the same molecules and intents share one workflow run. No LLM answer
+    or per-query PDF is produced; `report: true` queues one combined report at the end.
+    """
+    queries = [q for q in req.queries if q.strip()]
+    if not queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(queries) > batch_max_queries():
+        raise HTTPException(status_code=413, detail=f"At most {batch_max_queries()} queries per batch")
+
+    async def body():
+        states: List[Dict[str, Any]] = []
+        try:
+            async for event in run_batch(queries, batch_concurrency(req.concurrency), run_workflow, states if req.report else None):
+                yield _ndjson(event)
+            report_id, report_status = None, None
+            if req.report:
+                report_id, report_status = _submit_report(combined_report_data(queries, states))
+            yield _ndjson({"type": "done", "report_id": report_id, "report_status": report_status})
+        except Exception as e:
+            logger.exception("Batch job failed")
+            yield _ndjson({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, workflow, agent, upstream, cache, LLM and report metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if not admin_token():
+        raise HTTPException(status_code=404, detail="Profiling admin disabled")
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/api/admin/profiles")
+async def profiles(x_admin_token: Optional[str] = Header(None)):
+    """Stored request profiles, newest first."""
+    _require_admin(x_admin_token)
+    return {"profiles": await asyncio.to_thread(list_profiles)}
+
+
+@app.get("/api/admin/profiles/{profile_id}/{kind}")
+async def download_profile(profile_id: str, kind: str, x_admin_token: Optional[str] = Header(None)):
+    """One profile file: `collapsed` (flamegraph input), `pstats`, or `report` (pstats of the PDF render)."""
+    _require_admin(x_admin_token)
+    path = find_profile(profile_id, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if kind == "collapsed":
+        return FileResponse(path, media_type="text/plain; charset=utf-8")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}-{kind}.pstats")
+
+
+@app.get("/api/metrics/upstreams")
+async def upstreams_metrics():
+    """Circuit breaker state and rate limits per upstream."""
+    return upstream_metrics()
+
+
+@app.post("/api/reports/render")
+async def render_report_now(req: RenderRequest):
+    """Render report_data to a PDF in memory and return it directly, without touching the report store."""
+    pdf = await report_queue.render_inline(req.report_data)
+    if pdf is None:
+        raise HTTPException(status_code=503, detail="Report renderer busy", headers={"Retry-After": "1"})
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="report.pdf"'},
+    )
+
+
+@app.get("/api/reports/queue")
+async def report_queue_metrics():
+    return {**report_queue.metrics(), "store": report_store.metrics()}
+
+
+@app.get("/api/reports/{report_id}/status")
+async def report_status(report_id: str):
+    status = report_queue.status(report_id)
+    if status is None:
+        if report_store.has(report_id) or legacy_report_path(report_id):
+            return {"report_id": report_id, "status": "ready"}
+        raise HTTPException(status_code=404, detail="Report not found")
+    return status
+
+
 @app.get("/api/reports/{report_id}")
 async def download_report(report_id: str):
-    pdf_path = os.path.join(os.path.dirname(__file__), "storage", "reports", f"{report_id}.pdf")
-    if not os.path.exists(pdf_path):
+    status = report_queue.status(report_id)
+    if status is not None and status["status"] in ("queued", "rendering"):
+        return JSONResponse(status_code=202, content=status, headers={"Retry-After": "1"})
+    if status is not None and status["status"] == "failed":
+        raise HTTPException(status_code=500, detail="Report generation failed")
+    if report_store.touch(report_id):
+        return FileResponse(report_path(report_id), media_type="application/pdf", filename="report.pdf")
+    legacy = legacy_report_path(report_id)
+    if legacy is None:
         raise HTTPException(status_code=404, detail="Report not found")
-    return FileResponse(pdf_path, media_type="application/pdf", filename="report.pdf")
+    return FileResponse(legacy, media_type="application/pdf", filename="report.pdf")
@@ -1,9 +1,16 @@
+import asyncio
 import json
+import logging
 import os
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, List, Mapping, Tuple
+
+from ..services.matcher import AhoCorasick
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "samples")
 
+logger = logging.getLogger(__name__)
+
 KNOWN_KEYS = {
     "semaglutide": ["semaglutide", "ozempic", "wegovy"],
     "tirzepatide": ["tirzepatide", "mounjaro", "zepbound"],
@@ -12,27 +19,160 @@ KNOWN_KEYS = {
 }
 
 
+def _load_extra_aliases() -> None:
+    """Merge a larger INN/brand alias table ({key: [aliases]}) from MOLECULE_ALIASES_PATH, if set.
+
+    Runs at import, so a missing or malformed table is logged and skipped rather than stopping the app.
+    """
+    path = os.getenv("MOLECULE_ALIASES_PATH")
+    if not path:
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+        if not isinstance(extra, dict) or not all(
+            isinstance(aliases, list) and all(isinstance(a, str) for a in aliases) for aliases in extra.values()
+        ):
+            raise ValueError("expected an object mapping molecule keys to lists of aliases")
+    except (OSError, ValueError):
+        logger.warning("Ignoring molecule alias table %s; using the built-in aliases", path, exc_info=True)
+        return
+    for key, aliases in extra.items():
+        merged = KNOWN_KEYS.setdefault(key.lower(), [key.lower()])
+        merged.extend(a.lower() for a in aliases if a.lower() not in merged)
+
+
+_load_extra_aliases()
+
+# Built once; matches every alias of every molecule in a single pass over the query.
+_ALIAS_MATCHER: AhoCorasick[str] = AhoCorasick(
+    (alias, key) for key, aliases in KNOWN_KEYS.items() for alias in aliases
+)
+
+
+
+def _read_only(self, *args: Any, **kwargs: Any) -> None:
+    raise TypeError(f"shared mock dataset {type(self).__name__} is read-only; copy it before changing it")
+
+
+class FrozenDict(dict):
+    """dict that refuses in-place changes.
+
+    Still a dict for isinstance checks and JSON encoding; pickles (and deep-copies) to a plain dict.
+    """
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """list counterpart of FrozenDict."""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _freeze(value: Any) -> Any:
+    """Deep read-only copy of parsed JSON, so no request can change the datasets shared by all of them."""
+    if isinstance(value, dict):
+        return FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(_freeze(v) for v in value)
+    return value
+
+
+_EMPTY: Mapping[str, Any] = _freeze({
+    "publications": [],
+    "trials": [],
+    "patents": [],
+    "iqvia": {},
+    "exim": {},
+    "internal_docs": [],
+    "web_intel": [],
+})
+
+# key -> read-only dataset view; rebound wholesale on (re)load so readers always see a consistent snapshot.
+_store: Dict[str, Mapping[str, Any]] = {}
+# key -> (mtime_ns, size) of the file each dataset was parsed from
+_stamps: Dict[str, Tuple[int, int]] = {}
+_loaded = False
+_lock = threading.Lock()
+
+
+def detect_keys(query: str) -> List[str]:
+    """All molecule keys mentioned in the query, in order of first mention."""
+    return _ALIAS_MATCHER.labels(query)
+
+
 def detect_key(query: str) -> str:
-    q = query.lower()
-    for key, aliases in KNOWN_KEYS.items():
-        for alias in aliases:
-            if alias in q:
-                return key
-    return "generic"
-
-
-def load_mock(query: str) -> Dict[str, Any]:
-    key = detect_key(query)
-    path = os.path.join(DATA_DIR, f"{key}.json")
-    if not os.path.exists(path):
-        return {
-            "publications": [],
-            "trials": [],
-            "patents": [],
-            "iqvia": {},
-            "exim": {},
-            "internal_docs": [],
-            "web_intel": [],
-        }
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    keys = detect_keys(query)
+    return keys[0] if keys else "generic"
+
+
+def _scan() -> Dict[str, Tuple[int, int]]:
+    stamps: Dict[str, Tuple[int, int]] = {}
+    if not os.path.isdir(DATA_DIR):
+        return stamps
+    for entry in os.scandir(DATA_DIR):
+        if entry.is_file() and entry.name.endswith(".json"):
+            st = entry.stat()
+            stamps[entry.name[:-5]] = (st.st_mtime_ns, st.st_size)
+    return stamps
+
+
+def reload_changed() -> int:
+    """Re-parse only sample files added, changed or removed since the last load. Returns the number touched."""
+    global _store, _stamps, _loaded
+    with _lock:
+        stamps = _scan()
+        store = dict(_store)
+        touched = 0
+        for key in set(store) - set(stamps):
+            del store[key]
+            touched += 1
+        for key, stamp in stamps.items():
+            if _stamps.get(key) == stamp and key in store:
+                continue
+            try:
+                with open(os.path.join(DATA_DIR, f"{key}.json"), "r", encoding="utf-8") as f:
+                    store[key] = _freeze(json.load(f))
+                touched += 1
+            except (OSError, ValueError):
+                logger.warning("Could not load mock dataset %s", key, exc_info=True)
+                stamps.pop(key, None)
+        _store, _stamps, _loaded = store, stamps, True
+        return touched
+
+
+def preload() -> None:
+    if not _loaded:
+        reload_changed()
+
+
+async def watch_samples(interval_s: float) -> None:
+    """Poll the samples directory and hot-reload changed datasets until cancelled."""
+    while True:
+        await asyncio.sleep(interval_s)
+        touched = await asyncio.to_thread(reload_changed)
+        if touched:
+            logger.info("Reloaded %d mock dataset(s)", touched)
+
+
+def get_dataset(key: str) -> Mapping[str, Any]:
+    if not _loaded:
+        preload()
+    return _store.get(key, _EMPTY)
+
+
+def load_mock(query: str) -> Mapping[str, Any]:
+    """Return the preloaded dataset for the query's molecule.
+
+    The dataset is shared across requests and frozen all the way down; mutating it raises TypeError.
+    """
+    return get_dataset(detect_key(query))
@@ -1,7 +1,22 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional, Set
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
 from typing_extensions import TypedDict
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import os
+import time
+
+from .mock_data.loader import get_dataset
+from .workers.common import molecule_result, resolve_keys
+from .services.classifier import classify
+from .services.limits import agent_slots
+from .services.metrics import AGENT_DURATION, AGENT_FALLBACKS, NODE_DURATION, agent_timing, rounded_ms
+from .services.sections import AGENT_SECTIONS
+from .services.sessions import sessions
 
 from .workers.web_search import web_search_agent
 from .workers.trials import trials_agent
@@ -12,6 +27,25 @@ from .workers.internal_knowledge import internal_knowledge_agent
 from .workers.web_intel import web_intel_agent
 
 
+AGENTS: Dict[str, Callable[[str, Optional[List[str]]], Any]] = {
+    "web_search": web_search_agent,
+    "trials": trials_agent,
+    "patent": patent_agent,
+    "iqvia": iqvia_agent,
+    "exim": exim_agent,
+    "internal_knowledge": internal_knowledge_agent,
+    "web_intel": web_intel_agent,
+}
+
+# Agents whose results depend on the question wording, not just the molecule; never reused across turns.
+QUERY_DEPENDENT_AGENTS = {"internal_knowledge"}
+
+_AGENT_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AGENT_THREAD_POOL_SIZE", "16")),
+    thread_name_prefix="agent",
+)
+
+
 class State(TypedDict, total=False):
     query: str
     tasks: List[str]
@@ -22,6 +56,11 @@ class State(TypedDict, total=False):
     summary: str
     report_data: Dict[str, Any]
     history: List[Dict[str, Any]]
+    intents: List[str]
+    molecules: List[str]
+    session: Dict[str, Any]
+    reused: List[str]
+    timings: Dict[str, float]
 
 
 def _dedupe_preserve_order(items: List[str]) -> List[str]:
@@ -39,132 +78,167 @@ def _utcnow_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 
-def plan(state: State) -> State:
-    q = state["query"].lower()
-    tasks: List[str] = []
+def _emit(config: Optional[RunnableConfig], event: Dict[str, Any]) -> None:
+    """Report workflow progress to the caller's on_event callback, if one was passed to run_workflow."""
+    on_event = ((config or {}).get("configurable") or {}).get("on_event")
+    if on_event is not None:
+        on_event(event)
+
 
-    full_analysis = any(
-        k in q
-        for k in [
-            "repurpose",
-            "repurposing",
-            "complete analysis",
-            "business case",
-            "i need everything",
-            "we're evaluating",
-            "we are evaluating",
-            "we're considering",
-            "considering licensing",
-            "licensing",
-            "compare the market",
-        ]
-    )
-
-    if full_analysis:
+def plan_tasks(intents: Set[str]) -> List[str]:
+    """Agents to run, in order, for a set of classified intents."""
+    tasks: List[str] = []
+    if "full_analysis" in intents:
         tasks.extend(["web_search", "trials", "patent", "iqvia", "internal_knowledge", "web_intel"])
     else:
-        if any(k in q for k in ["trial", "phase", "study", "nct", "pipeline"]):
-            tasks.append("trials")
-        if any(k in q for k in ["patent", "expiry", "fto", "ip", "biosimilar", "generic", "competition"]):
-            tasks.append("patent")
-        if any(k in q for k in ["market", "sales", "cagr", "iqvia", "market size", "therapy area"]):
-            tasks.append("iqvia")
-        if any(k in q for k in ["export", "import", "exim", "trade", "sourcing", "dependency"]):
-            tasks.append("exim")
-        if any(k in q for k in ["internal", "mins", "deck", "strategy", "upload", "pdf", "briefing"]):
-            tasks.append("internal_knowledge")
-        if any(k in q for k in ["web", "guideline", "news", "forum", "publication", "real-time", "real time", "web search"]):
-            tasks.append("web_intel")
+        for agent in ["trials", "patent", "iqvia", "exim", "internal_knowledge", "web_intel"]:
+            if agent in intents:
+                tasks.append(agent)
 
         # Always include web search summary for demo richness
         tasks.insert(0, "web_search")
 
-    tasks = _dedupe_preserve_order(tasks)
+    return _dedupe_preserve_order(tasks)
+
+
+def _record_phase(state: State, phase: str, started: float) -> None:
+    elapsed = time.perf_counter() - started
+    NODE_DURATION.observe(elapsed, node=phase)
+    timings = state.setdefault("timings", {})
+    timings[f"{phase}_ms"] = round(timings.get(f"{phase}_ms", 0.0) + elapsed * 1000, 1)
+
+
+def plan(state: State, config: Optional[RunnableConfig] = None) -> State:
+    started = time.perf_counter()
+    classification = classify(state["query"])
+    intents = classification["intents"]
+    molecules = classification["molecules"]
+    session = state.get("session") or {}
+    if not molecules and session.get("molecules"):
+        # Follow-ups like "and what about patents?" stay on the conversation's molecules.
+        molecules = list(session["molecules"])
+
+    # Fresh results from earlier turns for the same molecules are merged in instead of refetched.
+    results: Dict[str, Any] = {}
+    if molecules and session:
+        now = time.time()
+        for agent, (fetched_at, res) in sessions.fresh_results(session, molecules).items():
+            if agent in AGENTS and agent not in QUERY_DEPENDENT_AGENTS:
+                meta = {**res.get("_meta", {}), "session": "reused", "session_age_s": round(now - fetched_at, 1)}
+                meta.pop("timing", None)
+                results[agent] = {**res, "_meta": meta}
+    reused = [a for a in AGENTS if a in results]
+    tasks = [t for t in plan_tasks(intents) if t not in results]
 
     state["tasks"] = tasks
+    state["reused"] = reused
+    state["intents"] = sorted(intents)
+    state["molecules"] = molecules
     state["i"] = 0
-    state["results"] = {}
-    state["agents_used"] = []
+    state["results"] = results
+    state["agents_used"] = list(reused)
     state["next"] = tasks[0] if tasks else "aggregate"
+    state["timings"] = {}
+    _record_phase(state, "plan", started)
+    _emit(config, {"type": "plan", "tasks": tasks, "reused": reused})
     return state
 
 
-def web_node(state: State) -> State:
-    q = state["query"]
-    res = web_search_agent(q)
-    state["results"]["web_search"] = res
-    state["agents_used"].append("web_search")
-    state["i"] += 1
-    state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
+def _agent_deadline_s(name: str) -> float:
+    default = os.getenv("AGENT_DEADLINE_S", "12")
+    return float(os.getenv(f"AGENT_DEADLINE_{name.upper()}_S", default))
+
+
+def _fallback_result(name: str, query: str, keys: Optional[List[str]], reason: str) -> Dict[str, Any]:
+    section = AGENT_SECTIONS[name]
+    empty: Any = {} if section in ("iqvia", "exim") else []
+    keys = resolve_keys(query, keys)
+    meta = {"source": "mock", "fetched_at": _utcnow_iso(), "fallback_reason": reason}
+    by_molecule = {k: get_dataset(k).get(section, empty) for k in keys}
+    return molecule_result(section, keys, by_molecule, {k: dict(meta) for k in keys})
+
+
+def _fallback_reasons(meta: Dict[str, Any]) -> List[str]:
+    """Fallback reasons of every molecule an agent result covers (top-level _meta for a single molecule)."""
+    metas = list(meta["by_molecule"].values()) if "by_molecule" in meta else [meta]
+    return [m["fallback_reason"] for m in metas if m.get("fallback_reason")]
+
+
+async def _run_agent(name: str, query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+    fn = AGENTS[name]
+    # The deadline starts once a slot is free, so queueing behind a busy batch is not a timeout.
+    async with agent_slots():
+        with agent_timing() as timing:
+            if asyncio.iscoroutinefunction(fn):
+                pending = fn(query, keys)
+            else:
+                loop = asyncio.get_running_loop()
+                ctx = contextvars.copy_context()
+                pending = loop.run_in_executor(_AGENT_POOL, functools.partial(ctx.run, fn, query, keys))
+            try:
+                res = await asyncio.wait_for(pending, timeout=_agent_deadline_s(name))
+            except asyncio.TimeoutError:
+                res = _fallback_result(name, query, keys, "deadline_exceeded")
+            except Exception:
+                res = _fallback_result(name, query, keys, "agent_error")
+
+    meta = res.get("_meta", {})
+    reasons = _fallback_reasons(meta)
+    for reason in reasons:
+        AGENT_FALLBACKS.inc(agent=name, reason=reason)
+    AGENT_DURATION.observe(timing["wall_ms"] / 1000, agent=name, outcome="fallback" if reasons else "ok")
+    return {**res, "_meta": {**meta, "timing": rounded_ms(timing)}}
+
+
+async def dispatch_node(state: State, config: RunnableConfig) -> State:
+    """Run every planned agent concurrently, each bounded by its own deadline."""
+    started = time.perf_counter()
+    tasks = [t for t in state["tasks"] if t in AGENTS]
+
+    async def run(name: str) -> Dict[str, Any]:
+        res = await _run_agent(name, state["query"], state.get("molecules"))
+        _emit(config, _agent_event(name, res))
+        return res
+
+    outcomes = await asyncio.gather(*(run(t) for t in tasks))
+    for name, res in zip(tasks, outcomes):
+        state["results"][name] = res
+        state["agents_used"].append(name)
+    state["i"] = len(state["tasks"])
+    state["next"] = "aggregate"
+    _record_phase(state, "agents", started)
     return state
 
 
-def trials_node(state: State) -> State:
-    q = state["query"]
-    res = trials_agent(q)
-    state["results"]["trials"] = res
-    state["agents_used"].append("trials")
-    state["i"] += 1
-    state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
-    return state
+def _agent_event(name: str, res: Dict[str, Any]) -> Dict[str, Any]:
+    meta = res.get("_meta", {})
+    return {"type": "agent", "agent": name, "source": meta.get("source"), "fallback_reason": meta.get("fallback_reason")}
 
 
-def patent_node(state: State) -> State:
-    q = state["query"]
-    res = patent_agent(q)
-    state["results"]["patent"] = res
-    state["agents_used"].append("patent")
-    state["i"] += 1
-    state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
-    return state
-
-
-def iqvia_node(state: State) -> State:
-    q = state["query"]
-    res = iqvia_agent(q)
-    state["results"]["iqvia"] = res
-    state["agents_used"].append("iqvia")
-    state["i"] += 1
-    state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
-    return state
+def _agent_node(name: str):
+    async def node(state: State, config: RunnableConfig) -> State:
+        started = time.perf_counter()
+        res = await _run_agent(name, state["query"], state.get("molecules"))
+        _record_phase(state, "agents", started)
+        _emit(config, _agent_event(name, res))
+        state["results"][name] = res
+        state["agents_used"].append(name)
+        state["i"] += 1
+        state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
+        return state
 
-
-def exim_node(state: State) -> State:
-    q = state["query"]
-    res = exim_agent(q)
-    state["results"]["exim"] = res
-    state["agents_used"].append("exim")
-    state["i"] += 1
-    state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
-    return state
-
-
-def internal_node(state: State) -> State:
-    q = state["query"]
-    res = internal_knowledge_agent(q)
-    state["results"]["internal_knowledge"] = res
-    state["agents_used"].append("internal_knowledge")
-    state["i"] += 1
-    state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
-    return state
-
-
-def web_intel_node(state: State) -> State:
-    q = state["query"]
-    res = web_intel_agent(q)
-    state["results"]["web_intel"] = res
-    state["agents_used"].append("web_intel")
-    state["i"] += 1
-    state["next"] = state["tasks"][state["i"]] if state["i"] < len(state["tasks"]) else "aggregate"
-    return state
+    node.__name__ = f"{name}_node"
+    return node
 
 
 def aggregate(state: State) -> State:
+    started = time.perf_counter()
     q = state["query"]
     results = state["results"]
 
     publications = results.get("web_search", {}).get("publications", [])
     trials = results.get("trials", {}).get("trials", [])
+    trial_landscape = results.get("trials", {}).get("landscape") or {}
     patents = results.get("patent", {}).get("patents", [])
     iqvia = results.get("iqvia", {}).get("iqvia", {})
     exim = results.get("exim", {}).get("exim", {})
@@ -193,7 +267,14 @@ def aggregate(state: State) -> State:
         ("Web Intelligence", sources.get("web_intel")),
     ]:
         if isinstance(meta, dict) and meta.get("source"):
-            lines.append(f"- {k}: {meta.get('source')}")
+            freshness = ""
+            if meta.get("session") == "reused":
+                freshness = f" (from earlier in this conversation, {meta.get('session_age_s')}s old)"
+            elif meta.get("cache") in ("hit", "coalesced"):
+                freshness = f" (cached, {meta.get('cache_age_s')}s old)"
+            elif meta.get("fallback_reason"):
+                freshness = f" (fallback: {meta['fallback_reason']})"
+            lines.append(f"- {k}: {meta.get('source')}{freshness}")
     lines.extend(["", "Findings:"])
 
     if publications:
@@ -206,6 +287,16 @@ def aggregate(state: State) -> State:
         for t in trials[:3]:
             lines.append(f"  • {t['nct_id']} — {t['title']} [{t['phase']}] ({t['status']})")
 
+    for key, ls in trial_landscape.items():
+        phases = ", ".join(f"{p} {n}" for p, n in ls.get("phases", {}).items())
+        sponsors = ", ".join(f"{sp['name']} ({sp['count']})" for sp in ls.get("top_sponsors", [])[:3])
+        partial = f", first {ls['scanned']} scanned" if ls.get("truncated") else ""
+        lines.append(f"- Trial landscape ({key}): {ls.get('total')} registered, {ls.get('active')} active{partial}")
+        if phases:
+            lines.append(f"  • Phases: {phases}")
+        if sponsors:
+            lines.append(f"  • Top sponsors: {sponsors}")
+
     if patents:
         lines.append("- Patents:")
         for p in patents[:3]:
@@ -239,14 +330,40 @@ def aggregate(state: State) -> State:
         for w in web_items[:3]:
             lines.append(f"  • {w['source']} — {w['summary'][:80]} ({w['url']})")
 
+    molecules = state.get("molecules") or []
+    per_molecule: Dict[str, Dict[str, Any]] = {}
+    if len(molecules) > 1:
+        for key in molecules:
+            per_molecule[key] = {
+                section: results.get(agent, {}).get("by_molecule", {}).get(key)
+                for agent, section in AGENT_SECTIONS.items()
+                if "by_molecule" in results.get(agent, {})
+            }
+        lines.append("- Per-molecule comparison:")
+        for key, data in per_molecule.items():
+            parts: List[str] = []
+            if data.get("publications") is not None:
+                parts.append(f"{len(data['publications'])} publications")
+            if key in trial_landscape:
+                parts.append(f"{trial_landscape[key].get('total')} registered trials")
+            elif data.get("trials") is not None:
+                parts.append(f"{len(data['trials'])} trials")
+            if data.get("patents") is not None:
+                parts.append(f"{len(data['patents'])} patents")
+            if data.get("iqvia"):
+                parts.append(f"CAGR {data['iqvia'].get('cagr')}%")
+            if data.get("exim") and data["exim"].get("import_dependency") is not None:
+                parts.append(f"import dependency {int(data['exim']['import_dependency']*100)}%")
+            lines.append(f"  • {key}: {', '.join(parts) if parts else 'no data'}")
+
     # Clarification prompts to support conversation flow
     clarifications: List[str] = []
-    ql = q.lower()
-    if any(k in ql for k in ["unmet need", "opportunity", "whitespace"]) and not any(r in ql for r in ["us", "eu", "europe", "india", "china", "apac", "emea", "region", "global"]):
+    intents = set(state.get("intents") or classify(q)["intents"])
+    if "opportunity" in intents and "region" not in intents:
         clarifications.append("Do you want the assessment by region (US/EU/APAC) or global?")
-    if any(k in ql for k in ["competition", "competitor", "biosimilar"]) and not any(k in ql for k in ["moa", "mechanism", "class", "molecule", "drug", "brand"]):
+    if "competition" in intents and "competition_scope" not in intents:
         clarifications.append("Should we scope competition by molecule, class/MoA, or brand?")
-    if ("market" in ql or "sales" in ql) and not any(k in ql for k in ["year", "2022", "2023", "2024", "2025"]):
+    if "market_or_sales" in intents and "time_horizon" not in intents:
         clarifications.append("Which time horizon should we analyze (last 3y, 5y CAGR, or forecast)?")
 
     insights: List[str] = []
@@ -302,45 +419,86 @@ def aggregate(state: State) -> State:
         "insights": insights,
         "sources": sources,
     }
+    if trial_landscape:
+        state["report_data"]["trial_landscape"] = trial_landscape
+    if per_molecule:
+        state["report_data"]["molecules"] = per_molecule
+    _record_phase(state, "aggregate", started)
+    # Request-level breakdown; filled in further (llm_ms) by the API layer.
+    sources["timings"] = dict(state["timings"])
     return state
 
 
-async def run_workflow(query: str, history: List[Dict[str, Any]]):
+def _orchestrator_mode() -> str:
+    mode = os.getenv("ORCHESTRATOR_MODE", "parallel").strip().lower()
+    return mode if mode in ("parallel", "sequential") else "parallel"
+
+
+def _router(state: State) -> str:
+    return state.get("next", "aggregate")
+
+
+def build_parallel_graph():
     graph = StateGraph(State)
     graph.add_node("plan", plan)
-    graph.add_node("web_search", web_node)
-    graph.add_node("trials", trials_node)
-    graph.add_node("patent", patent_node)
-    graph.add_node("iqvia", iqvia_node)
-    graph.add_node("exim", exim_node)
-    graph.add_node("internal_knowledge", internal_node)
-    graph.add_node("web_intel", web_intel_node)
+    graph.add_node("dispatch", dispatch_node)
     graph.add_node("aggregate", aggregate)
 
     graph.set_entry_point("plan")
+    graph.add_edge("plan", "dispatch")
+    graph.add_edge("dispatch", "aggregate")
+    graph.set_finish_point("aggregate")
+    return graph.compile()
 
-    def router(state: State):
-        return state.get("next", "aggregate")
-
-    mapping = {
-        "web_search": "web_search",
-        "trials": "trials",
-        "patent": "patent",
-        "iqvia": "iqvia",
-        "exim": "exim",
-        "internal_knowledge": "internal_knowledge",
-        "web_intel": "web_intel",
-        "aggregate": "aggregate",
-    }
-    graph.add_conditional_edges("plan", router, mapping)
-    graph.add_conditional_edges("web_search", router, mapping)
-    graph.add_conditional_edges("trials", router, mapping)
-    graph.add_conditional_edges("patent", router, mapping)
-    graph.add_conditional_edges("iqvia", router, mapping)
-    graph.add_conditional_edges("exim", router, mapping)
-    graph.add_conditional_edges("internal_knowledge", router, mapping)
-    graph.add_conditional_edges("web_intel", router, mapping)
-
-    app = graph.compile()
-    final: State = app.invoke({"query": query, "history": history})
+
+def build_sequential_graph():
+    graph = StateGraph(State)
+    graph.add_node("plan", plan)
+    for name in AGENTS:
+        graph.add_node(name, _agent_node(name))
+    graph.add_node("aggregate", aggregate)
+
+    graph.set_entry_point("plan")
+
+    mapping = {name: name for name in AGENTS}
+    mapping["aggregate"] = "aggregate"
+    graph.add_conditional_edges("plan", _router, mapping)
+    for name in AGENTS:
+        graph.add_conditional_edges(name, _router, mapping)
+    graph.set_finish_point("aggregate")
+    return graph.compile()
+
+
+# Compiled once at import; compiled graphs are stateless and safe to share across requests.
+WORKFLOWS = {
+    "parallel": build_parallel_graph(),
+    "sequential": build_sequential_graph(),
+}
+
+
+async def run_workflow(
+    query: str,
+    history: List[Dict[str, Any]],
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    conversation_id: Optional[str] = None,
+):
+    """Plan, run agents and aggregate. on_event receives progress events and may be called from worker threads.
+
+    With a conversation_id, fresh agent results from earlier turns are reused and this turn's are remembered.
+    """
+    app = WORKFLOWS[_orchestrator_mode()]
+    config: RunnableConfig = {"configurable": {"on_event": on_event}}
+    session = sessions.load(conversation_id)
+    started = time.perf_counter()
+    final: State = await app.ainvoke({"query": query, "history": history, "session": session}, config=config)
+    NODE_DURATION.observe(time.perf_counter() - started, node="workflow")
+    if conversation_id and final.get("molecules"):
+        fetched = {
+            name: final["results"][name]
+            for name in final.get("tasks", [])
+            if name in final["results"]
+            and name not in QUERY_DEPENDENT_AGENTS
+            and not _fallback_reasons(final["results"][name].get("_meta", {}))
+        }
+        sessions.save(conversation_id, session, final["molecules"], fetched)
     return final
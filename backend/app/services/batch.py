@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .cache import normalize_key
+from .classifier import classify
+from .sections import AGENT_SECTIONS
+
+
+logger = logging.getLogger(__name__)
+
+
+def batch_max_queries() -> int:
+    return int(os.getenv("BATCH_MAX_QUERIES", "1000"))
+
+
+def batch_concurrency(requested: Optional[int] = None) -> int:
+    limit = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    return max(1, min(limit, requested or limit))
+
+
+def group_key(query: str) -> Tuple[Any, ...]:
+    """Queries with the same key produce the same agent calls, so they share one workflow run.
+
+    Agents only look at the molecule keys (and the raw query when no molecule is known), and the
+    plan and clarifications only depend on the matched intents.
+    """
+    classification = classify(query)
+    molecules = tuple(classification["molecules"]) or ("generic", normalize_key(query))
+    return molecules, tuple(sorted(classification["intents"]))
+
+
+async def run_batch(
+    queries: List[str],
+    concurrency: int,
+    run_workflow: Callable[..., Awaitable[Dict[str, Any]]],
+    collect: Optional[List[Dict[str, Any]]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run a list of queries through run_workflow and yield NDJSON-ready events as each unique query finishes.
+
+    Yields one `batch` header, then one `result` (or `error`) event per input query in completion
+    order; duplicates of an already-emitted query carry `same_as` instead of repeating the payload.
+    Final workflow states are appended to `collect` when given.
+    """
+    started = time.perf_counter()
+    groups: Dict[Tuple[Any, ...], List[int]] = {}
+    for i, q in enumerate(queries):
+        groups.setdefault(group_key(q), []).append(i)
+    yield {"type": "batch", "total": len(queries), "unique": len(groups), "concurrency": concurrency}
+
+    work: asyncio.Queue = asyncio.Queue()
+    for indices in groups.values():
+        work.put_nowait(indices)
+    finished: asyncio.Queue = asyncio.Queue()
+
+    async def worker() -> None:
+        while True:
+            try:
+                indices = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                state = await run_workflow(query=queries[indices[0]], history=[])
+                await finished.put((indices, state, None))
+            except Exception as e:
+                logger.exception("Batch query failed: %s", queries[indices[0]])
+                await finished.put((indices, None, e))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(groups)))]
+    failed = 0
+    try:
+        for _ in range(len(groups)):
+            indices, state, error = await finished.get()
+            first = indices[0]
+            if error is not None:
+                failed += len(indices)
+                for i in indices:
+                    yield {"type": "error", "index": i, "query": queries[i], "detail": str(error)}
+                continue
+            if collect is not None:
+                collect.append(state)
+            yield {
+                "type": "result",
+                "index": first,
+                "query": queries[first],
+                "agentsUsed": state.get("agents_used", []),
+                "molecules": state.get("molecules", []),
+                "summary": state.get("summary", ""),
+                "report_data": state.get("report_data"),
+            }
+            for i in indices[1:]:
+                yield {"type": "result", "index": i, "query": queries[i], "same_as": first}
+    finally:
+        for task in workers:
+            task.cancel()
+
+    yield {
+        "type": "summary",
+        "total": len(queries),
+        "unique": len(groups),
+        "failed": failed,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def combined_report_data(queries: List[str], states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-query report data into one report with a per-molecule breakdown."""
+    combined: Dict[str, Any] = {
+        "query": f"Portfolio screen: {len(queries)} queries ({len(states)} unique)",
+        "clarifications": [],
+        "insights": [],
+    }
+    per_molecule: Dict[str, Dict[str, Any]] = {}
+    seen: Dict[str, set] = {}
+    for state in states:
+        rd = state.get("report_data") or {}
+        molecules = state.get("molecules") or []
+        if rd.get("molecules"):
+            per_molecule.update(rd["molecules"])
+        elif len(molecules) == 1:
+            per_molecule[molecules[0]] = {s: rd.get(s) for s in AGENT_SECTIONS.values() if rd.get(s)}
+
+        label = ", ".join(molecules) or state.get("query", "")
+        for section in AGENT_SECTIONS.values():
+            value = rd.get(section)
+            if isinstance(value, list):
+                bucket = combined.setdefault(section, [])
+                ids = seen.setdefault(section, set())
+                for item in value:
+                    ident = json.dumps(item, sort_keys=True, default=str)
+                    if ident not in ids:
+                        ids.add(ident)
+                        bucket.append(item)
+            elif value and section not in combined:
+                combined[section] = value
+        if rd.get("trial_landscape"):
+            combined.setdefault("trial_landscape", {}).update(rd["trial_landscape"])
+        combined["insights"].extend(f"{label}: {insight}" for insight in rd.get("insights", []))
+
+    combined["molecules"] = per_molecule
+    combined["sources"] = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    return combined
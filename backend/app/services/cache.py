@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .metrics import CACHE_REQUESTS
+
+
+_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "storage", "cache")
+
+
+def normalize_key(*parts: Any) -> str:
+    return "|".join(" ".join(str(p).lower().split()) for p in parts)
+
+
+class MemoryBackend:
+    """In-process LRU with a per-entry TTL."""
+
+    # Cheap enough to call on the event loop.
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        # key -> (stored_at, value, ttl_s)
+        self._data: "OrderedDict[str, Tuple[float, Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > entry[2]:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        """Store value; ttl_s, if given, replaces the backend's TTL for this entry."""
+        with self._lock:
+            self._data[key] = (time.time(), value, self.ttl_s if ttl_s is None else ttl_s)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """On-disk LRU/TTL store that survives restarts. Values must be JSON-serializable."""
+
+    # Disk I/O: ResponseCache calls it from a worker thread, never on the event loop.
+    blocking = True
+
+    def __init__(self, path: str, namespace: str, max_entries: int, ttl_s: float):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL, accessed_at REAL NOT NULL, ttl_s REAL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        if "ttl_s" not in {row[1] for row in self._conn.execute("PRAGMA table_info(cache)")}:
+            self._conn.execute("ALTER TABLE cache ADD COLUMN ttl_s REAL")  # files from before per-entry TTLs
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at, ttl_s FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > (self.ttl_s if row[2] is None else row[2]):
+                self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        return row[1], json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at, accessed_at, ttl_s)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now, now, ttl_s),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                " SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_entries),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+
+def is_empty(value: Any) -> bool:
+    """Default negative-result test: None or an empty string, list or dict."""
+    return value is None or (isinstance(value, (str, list, dict)) and not value)
+
+
+class ResponseCache:
+    """Cache in front of an async fetch with single-flight coalescing of concurrent misses.
+
+    Values the negative predicate flags (by default empty ones) are kept for negative_ttl_s only, so
+    an upstream that briefly returns nothing is asked again soon rather than after the full TTL.
+    """
+
+    def __init__(self, backend: Optional[Any], name: str = "", negative_ttl_s: Optional[float] = None):
+        self.backend = backend
+        self.name = name
+        self.negative_ttl_s = negative_ttl_s
+        # key -> the task filling it; one task resolves to (stored_at, {key: value}) for all keys it fills.
+        self._inflight: Dict[str, "asyncio.Task[Tuple[float, Dict[str, Any]]]"] = {}
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        negative: Callable[[Any], bool] = is_empty,
+    ) -> Tuple[Any, Dict[str, Any]]:
+        if self.backend is None:
+            return await fetch(), {"cache": "disabled"}
+
+        entry = await self._get(key)
+        if entry is not None:
+            return entry[1], self._meta("hit", entry[0])
+
+        # No await between this check and _spawn, so a key never gets two fills.
+        pending = self._inflight.get(key)
+        if pending is not None:
+            stored_at, values = await asyncio.shield(pending)
+            return values[key], self._meta("coalesced", stored_at)
+
+        async def fill() -> Tuple[float, Dict[str, Any]]:
+            value = await fetch()
+            stored_at = time.time()
+            await self._set(key, value, negative)
+            return stored_at, {key: value}
+
+        stored_at, values = await asyncio.shield(self._spawn([key], fill))
+        return values[key], self._meta("miss", stored_at)
+
+    async def peek(self, key: str) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """Cached value and hit metadata, or None. For callers that fill the cache themselves (e.g. streams)."""
+        if self.backend is None:
+            return None
+        entry = await self._get(key)
+        if entry is None:
+            return None
+        return entry[1], self._meta("hit", entry[0])
+
+    async def store(self, key: str, value: Any, negative: Callable[[Any], bool] = is_empty) -> Dict[str, Any]:
+        if self.backend is None:
+            return {"cache": "disabled"}
+        stored_at = time.time()
+        await self._set(key, value, negative)
+        return self._meta("miss", stored_at)
+
+    async def get_or_fetch_many(
+        self,
+        keys: List[str],
+        fetch_many: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+        negative: Callable[[Any], bool] = is_empty,
+    ) -> Dict[str, Tuple[Any, Dict[str, Any]]]:
+        """Batched get_or_fetch: every key that is neither cached nor in flight is fetched in one fetch_many call.
+
+        fetch_many receives the missing keys and must return a value for each of them.
+        """
+        out: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+        if self.backend is None:
+            values = await fetch_many(list(keys))
+            return {k: (values[k], {"cache": "disabled"}) for k in keys}
+
+        unique = list(dict.fromkeys(keys))
+        entries = await self._get_many(unique)
+        waiting: Dict[str, "asyncio.Task[Tuple[float, Dict[str, Any]]]"] = {}
+        missing: List[str] = []
+        for key, entry in zip(unique, entries):
+            if entry is not None:
+                out[key] = (entry[1], self._meta("hit", entry[0]))
+            elif key in self._inflight:
+                waiting[key] = self._inflight[key]
+            else:
+                missing.append(key)
+
+        if missing:
+            async def fill() -> Tuple[float, Dict[str, Any]]:
+                values = await fetch_many(missing)
+                stored_at = time.time()
+                await self._set_many({key: values[key] for key in missing}, negative)
+                return stored_at, values
+
+            stored_at, values = await asyncio.shield(self._spawn(missing, fill))
+            for key in missing:
+                out[key] = (values[key], self._meta("miss", stored_at))
+
+        for key, pending in waiting.items():
+            stored_at, values = await asyncio.shield(pending)
+            out[key] = (values[key], self._meta("coalesced", stored_at))
+        return out
+
+    async def _get(self, key: str) -> Optional[Tuple[float, Any]]:
+        return (await self._get_many([key]))[0]
+
+    async def _get_many(self, keys: List[str]) -> List[Optional[Tuple[float, Any]]]:
+        if self.backend.blocking:
+            return await asyncio.to_thread(lambda: [self.backend.get(k) for k in keys])
+        return [self.backend.get(k) for k in keys]
+
+    async def _set(self, key: str, value: Any, negative: Callable[[Any], bool]) -> None:
+        await self._set_many({key: value}, negative)
+
+    async def _set_many(self, values: Dict[str, Any], negative: Callable[[Any], bool]) -> None:
+        def write() -> None:
+            for key, value in values.items():
+                self.backend.set(key, value, self.negative_ttl_s if negative(value) else None)
+
+        if self.backend.blocking:
+            await asyncio.to_thread(write)
+        else:
+            write()
+
+    def _spawn(
+        self, keys: List[str], fill: Callable[[], Awaitable[Tuple[float, Dict[str, Any]]]]
+    ) -> "asyncio.Task[Tuple[float, Dict[str, Any]]]":
+        """Run fill() as its own task, registered as in flight for every key until it finishes.
+
+        The fetch belongs to no caller and every waiter, the starting one included, awaits it through
+        asyncio.shield: a waiter cancelled by its deadline or a client disconnect leaves the fetch and
+        the other waiters untouched.
+        """
+        task = asyncio.get_running_loop().create_task(fill())
+        for key in keys:
+            self._inflight[key] = task
+
+        def done(t: "asyncio.Task[Tuple[float, Dict[str, Any]]]") -> None:
+            for key in keys:
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+            if not t.cancelled():
+                t.exception()  # retrieved, so a fetch nobody awaits any more does not log a warning
+
+        task.add_done_callback(done)
+        return task
+
+    def _meta(self, outcome: str, stored_at: float) -> Dict[str, Any]:
+        CACHE_REQUESTS.inc(cache=self.name, outcome=outcome)
+        return _cache_meta(outcome, stored_at)
+
+
+def _cache_meta(outcome: str, stored_at: float) -> Dict[str, Any]:
+    return {
+        "cache": outcome,
+        "cache_age_s": round(max(0.0, time.time() - stored_at), 1),
+        "fetched_at": datetime.utcfromtimestamp(stored_at).isoformat() + "Z",
+    }
+
+
+def _build_cache(prefix: str, namespace: str, default_ttl_s: str, default_max_entries: str, filename: str) -> ResponseCache:
+    kind = os.getenv(f"{prefix}_BACKEND", "memory").strip().lower()
+    ttl_s = float(os.getenv(f"{prefix}_TTL_S", default_ttl_s))
+    negative_ttl_s = min(ttl_s, float(os.getenv(f"{prefix}_NEGATIVE_TTL_S", "60")))
+    max_entries = int(os.getenv(f"{prefix}_MAX_ENTRIES", default_max_entries))
+    if kind in ("none", "off", "disabled"):
+        return ResponseCache(None, namespace)
+    if kind in ("disk", "sqlite"):
+        path = os.getenv(f"{prefix}_PATH", os.path.join(_CACHE_DIR, filename))
+        backend: Any = SQLiteBackend(path, namespace, max_entries, ttl_s)
+    else:
+        backend = MemoryBackend(max_entries, ttl_s)
+    return ResponseCache(backend, namespace, negative_ttl_s)
+
+
+def evidence_cache(namespace: str) -> ResponseCache:
+    """Build the cache for an external evidence agent from EVIDENCE_CACHE_* settings."""
+    return _build_cache("EVIDENCE_CACHE", namespace, "900", "1024", "evidence.sqlite3")
+
+
+def llm_cache() -> ResponseCache:
+    """Build the cache for generated LLM answers from LLM_CACHE_* settings."""
+    return _build_cache("LLM_CACHE", "llm", "3600", "512", "llm.sqlite3")
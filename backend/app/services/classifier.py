@@ -0,0 +1,74 @@
+from typing import Dict, List, Set, Tuple
+
+from typing_extensions import TypedDict
+
+from ..mock_data.loader import KNOWN_KEYS
+from .matcher import AhoCorasick
+
+
+# Keyword groups recognised in user queries. Agent names double as intents for plan();
+# the remaining groups drive aggregate()'s clarification prompts.
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "full_analysis": [
+        "repurpose",
+        "repurposing",
+        "complete analysis",
+        "business case",
+        "i need everything",
+        "we're evaluating",
+        "we are evaluating",
+        "we're considering",
+        "considering licensing",
+        "licensing",
+        "compare the market",
+    ],
+    "trials": ["trial", "phase", "study", "studies", "nct", "pipeline"],
+    "patent": ["patent", "expiry", "expiries", "fto", "ip", "biosimilar", "generic", "competition"],
+    "iqvia": ["market", "sales", "cagr", "iqvia", "market size", "therapy area"],
+    "exim": ["export", "import", "exim", "trade", "sourcing", "dependency"],
+    "internal_knowledge": ["internal", "mins", "deck", "strategy", "upload", "pdf", "briefing"],
+    "web_intel": ["web", "guideline", "news", "forum", "publication", "real-time", "real time", "web search"],
+    "opportunity": ["unmet need", "opportunity", "opportunities", "whitespace"],
+    "region": ["us", "eu", "europe", "india", "china", "apac", "emea", "region", "global"],
+    "competition": ["competition", "competitor", "biosimilar"],
+    "competition_scope": ["moa", "mechanism", "class", "molecule", "drug", "brand"],
+    "market_or_sales": ["market", "sales"],
+    "time_horizon": ["year", "2022", "2023", "2024", "2025"],
+}
+
+# Keywords this long also match inflected forms ("patented", "marketing", "trials"); shorter ones
+# ("ip", "us", "eu") must match whole words. Molecule aliases always match whole words.
+_MIN_STEM_CHARS = 3
+
+
+class Classification(TypedDict):
+    intents: Set[str]
+    molecules: List[str]
+
+
+def _patterns() -> Tuple[List[Tuple[str, Tuple[str, str]]], List[Tuple[str, Tuple[str, str]]]]:
+    """(whole-word patterns, stems) for the matcher."""
+    words: List[Tuple[str, Tuple[str, str]]] = []
+    stems: List[Tuple[str, Tuple[str, str]]] = []
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for k in keywords:
+            (stems if len(k) >= _MIN_STEM_CHARS else words).append((k, ("intent", intent)))
+    for key, aliases in KNOWN_KEYS.items():
+        words.extend((a, ("molecule", key)) for a in aliases)
+    return words, stems
+
+
+# Built once at import: one automaton over every intent keyword and molecule alias.
+_MATCHER: AhoCorasick[Tuple[str, str]] = AhoCorasick(*_patterns())
+
+
+def classify(query: str) -> Classification:
+    """Matched intent groups and molecule keys (in order of first mention), from one pass over the query."""
+    intents: Set[str] = set()
+    molecules: List[str] = []
+    for kind, label in _MATCHER.labels(query):
+        if kind == "intent":
+            intents.add(label)
+        elif label not in molecules:
+            molecules.append(label)
+    return {"intents": intents, "molecules": molecules}
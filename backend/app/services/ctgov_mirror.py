@@ -0,0 +1,474 @@
+# Local ClinicalTrials.gov mirror: studies in SQLite with an FTS5 index, kept current by delta syncs.
+#
+#   python -m backend.app.services.ctgov_mirror ingest ctg-studies.json.zip
+#   python -m backend.app.services.ctgov_mirror sync
+#   python -m backend.app.services.ctgov_mirror search "semaglutide obesity"
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .http import close_clients, open_clients, upstream_request
+
+
+_DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "..", "storage", "ctgov", "mirror.sqlite3")
+
+_TERM_RE = re.compile(r"\w+")
+_NCT_RE = re.compile(r"\bNCT\d{8}\b", re.IGNORECASE)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS studies ("
+    " nct_id TEXT PRIMARY KEY, title TEXT NOT NULL, status TEXT, phase TEXT, sponsor TEXT,"
+    " completion_date TEXT, last_update TEXT, trial TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS study_conditions (nct_id TEXT NOT NULL, condition TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS studies_phase ON studies (phase)",
+    "CREATE INDEX IF NOT EXISTS studies_status ON studies (status)",
+    "CREATE INDEX IF NOT EXISTS studies_sponsor ON studies (sponsor COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS studies_last_update ON studies (last_update)",
+    "CREATE INDEX IF NOT EXISTS study_conditions_condition ON study_conditions (condition COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS study_conditions_nct ON study_conditions (nct_id)",
+    # rowid follows studies.rowid; the FTS table keeps its own copy of the text.
+    "CREATE VIRTUAL TABLE IF NOT EXISTS studies_fts USING fts5("
+    " title, conditions, interventions, sponsor, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def mirror_path() -> str:
+    return os.getenv("CTGOV_MIRROR_PATH", _DEFAULT_PATH)
+
+
+def _first_str(v: Any) -> Optional[str]:
+    if isinstance(v, str) and v.strip():
+        return v.strip()
+    if isinstance(v, list) and v:
+        for item in v:
+            if isinstance(item, str) and item.strip():
+                return item.strip()
+    return None
+
+
+def _str_list(v: Any) -> List[str]:
+    return [s.strip() for s in v if isinstance(s, str) and s.strip()] if isinstance(v, list) else []
+
+
+def parse_study(study: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Trial dict the agents return, from one CT.gov v2 study (`protocolSection` shape)."""
+    ps = (study or {}).get("protocolSection", {})
+    idmod = (ps or {}).get("identificationModule", {})
+    statusmod = (ps or {}).get("statusModule", {})
+    designmod = (ps or {}).get("designModule", {})
+    sponsmod = (ps or {}).get("sponsorCollaboratorsModule", {})
+
+    nct = _first_str(idmod.get("nctId")) or _first_str(idmod.get("orgStudyId"))
+    title = _first_str(idmod.get("briefTitle")) or _first_str(idmod.get("officialTitle"))
+    status = _first_str(statusmod.get("overallStatus"))
+    phases = designmod.get("phases")
+    phase = _first_str(phases)
+
+    sponsor = None
+    lead = sponsmod.get("leadSponsor")
+    if isinstance(lead, dict):
+        sponsor = _first_str(lead.get("name"))
+
+    completion_date = None
+    cds = statusmod.get("completionDateStruct")
+    if isinstance(cds, dict):
+        completion_date = _first_str(cds.get("date")) or _first_str(cds.get("completionDate"))
+
+    if not nct or not title:
+        return None
+
+    return {
+        "nct_id": nct,
+        "title": title,
+        "status": status or "N/A",
+        "phase": phase or "N/A",
+        "completion_date": completion_date or "N/A",
+        "sponsor": sponsor or "N/A",
+        "url": f"https://clinicaltrials.gov/study/{nct}",
+    }
+
+
+# Statuses counted as "active" in landscape stats.
+_ACTIVE_STATUSES = frozenset({"RECRUITING", "NOT_YET_RECRUITING", "ACTIVE_NOT_RECRUITING", "ENROLLING_BY_INVITATION"})
+
+
+class TrialLandscape:
+    """Running phase/status/sponsor counts over a stream of trials, in bounded memory.
+
+    Phases and statuses are small closed sets. Sponsors are not, so once more than
+    `max_sponsors` distinct names are tracked the rarest half is dropped; the heavy hitters
+    reported in `top_sponsors` stay exact unless a sponsor first appears after a prune.
+    """
+
+    def __init__(self, max_sponsors: int = 1000):
+        self.max_sponsors = max(2, max_sponsors)
+        self.scanned = 0
+        self.active = 0
+        self.phases: Dict[str, int] = {}
+        self.statuses: Dict[str, int] = {}
+        self.sponsors: Dict[str, int] = {}
+        self.sponsors_pruned = False
+
+    def add(self, phase: Optional[str], status: Optional[str], sponsor: Optional[str]) -> None:
+        self.scanned += 1
+        phase = phase or "N/A"
+        status = status or "N/A"
+        self.phases[phase] = self.phases.get(phase, 0) + 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status in _ACTIVE_STATUSES:
+            self.active += 1
+        if sponsor and sponsor != "N/A":
+            self.sponsors[sponsor] = self.sponsors.get(sponsor, 0) + 1
+            if len(self.sponsors) > self.max_sponsors:
+                keep = sorted(self.sponsors.items(), key=lambda kv: kv[1], reverse=True)[: self.max_sponsors // 2]
+                self.sponsors = dict(keep)
+                self.sponsors_pruned = True
+
+    def to_dict(self, total: Optional[int] = None, truncated: bool = False, top: int = 10) -> Dict[str, Any]:
+        top_sponsors = sorted(self.sponsors.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+        out: Dict[str, Any] = {
+            "total": total if total is not None else self.scanned,
+            "scanned": self.scanned,
+            "active": self.active,
+            "phases": dict(sorted(self.phases.items())),
+            "statuses": dict(sorted(self.statuses.items(), key=lambda kv: -kv[1])),
+            "top_sponsors": [{"name": n, "count": c} for n, c in top_sponsors],
+        }
+        if truncated:
+            out["truncated"] = True
+        if self.sponsors_pruned:
+            out["sponsors_approximate"] = True
+        return out
+
+
+def _index_fields(study: Dict[str, Any]) -> Tuple[str, List[str], str, Optional[str]]:
+    """(full title text, conditions, interventions/keywords text, last update date) for indexing."""
+    ps = (study or {}).get("protocolSection", {}) or {}
+    idmod = ps.get("identificationModule", {}) or {}
+    condmod = ps.get("conditionsModule", {}) or {}
+    armsmod = ps.get("armsInterventionsModule", {}) or {}
+    statusmod = ps.get("statusModule", {}) or {}
+
+    titles = [idmod.get(k) for k in ("briefTitle", "officialTitle", "acronym")]
+    interventions: List[str] = []
+    for iv in armsmod.get("interventions") or []:
+        if isinstance(iv, dict):
+            interventions.append(iv.get("name") or "")
+            interventions.extend(_str_list(iv.get("otherNames")))
+    interventions.extend(_str_list(condmod.get("keywords")))
+
+    last_update = None
+    lu = statusmod.get("lastUpdatePostDateStruct")
+    if isinstance(lu, dict):
+        last_update = _first_str(lu.get("date"))
+    return (
+        " ".join(t for t in titles if isinstance(t, str)),
+        _str_list(condmod.get("conditions")),
+        " ".join(i for i in interventions if i),
+        last_update,
+    )
+
+
+def fts_query(term: str) -> Optional[str]:
+    """Every word of the term as a quoted FTS5 token (implicit AND); None when there is nothing to match."""
+    words = _TERM_RE.findall(term.lower())
+    return " ".join(f'"{w}"' for w in words) if words else None
+
+
+class CtgovMirror:
+    """SQLite store of CT.gov studies with an FTS5 index over titles, conditions, interventions and sponsor."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            self._conn = conn
+        return self._conn
+
+    def available(self) -> bool:
+        """True once the mirror file exists and holds at least one study."""
+        if self._conn is None and not os.path.exists(self.path):
+            return False
+        with self._lock:
+            return self._db().execute("SELECT 1 FROM studies LIMIT 1").fetchone() is not None
+
+    def upsert(self, studies: Iterable[Dict[str, Any]], batch_size: int = 500) -> int:
+        """Insert or replace studies (raw v2 JSON) in batches of one transaction each; returns rows written."""
+        written = 0
+        batch: List[Dict[str, Any]] = []
+        for study in studies:
+            batch.append(study)
+            if len(batch) >= batch_size:
+                written += self._write(batch)
+                batch = []
+        if batch:
+            written += self._write(batch)
+        return written
+
+    def _write(self, studies: List[Dict[str, Any]]) -> int:
+        written = 0
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                for study in studies:
+                    trial = parse_study(study)
+                    if trial is None:
+                        continue
+                    titles, conditions, interventions, last_update = _index_fields(study)
+                    nct = trial["nct_id"]
+                    old = db.execute("SELECT rowid FROM studies WHERE nct_id = ?", (nct,)).fetchone()
+                    if old is not None:
+                        db.execute("DELETE FROM studies_fts WHERE rowid = ?", (old[0],))
+                        db.execute("DELETE FROM study_conditions WHERE nct_id = ?", (nct,))
+                        db.execute("DELETE FROM studies WHERE rowid = ?", (old[0],))
+                    rowid = db.execute(
+                        "INSERT INTO studies (nct_id, title, status, phase, sponsor, completion_date, last_update, trial)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            nct, trial["title"], trial["status"], trial["phase"], trial["sponsor"],
+                            trial["completion_date"], last_update, json.dumps(trial, separators=(",", ":")),
+                        ),
+                    ).lastrowid
+                    db.executemany(
+                        "INSERT INTO study_conditions (nct_id, condition) VALUES (?, ?)",
+                        [(nct, c) for c in conditions],
+                    )
+                    db.execute(
+                        "INSERT INTO studies_fts (rowid, title, conditions, interventions, sponsor) VALUES (?, ?, ?, ?, ?)",
+                        (rowid, titles, " ; ".join(conditions), interventions, trial["sponsor"]),
+                    )
+                    written += 1
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return written
+
+    def search(self, term: str, limit: int) -> List[Dict[str, Any]]:
+        """Best-matching trials for a free-text term, ranked by BM25 (title matches weigh most)."""
+        ids = [m.upper() for m in _NCT_RE.findall(term)]
+        if ids:
+            # Registry ids go straight to the primary key.
+            with self._lock:
+                rows = self._db().execute(
+                    f"SELECT trial FROM studies WHERE nct_id IN ({','.join('?' * len(ids))}) LIMIT ?",
+                    (*ids, limit),
+                ).fetchall()
+            return [json.loads(r[0]) for r in rows]
+        match = fts_query(term)
+        if match is None:
+            return []
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT s.trial FROM studies_fts f JOIN studies s ON s.rowid = f.rowid"
+                " WHERE studies_fts MATCH ? ORDER BY bm25(studies_fts, 4.0, 2.0, 2.0, 1.0) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def search_many(self, terms: List[str], limit: int) -> List[List[Dict[str, Any]]]:
+        return [self.search(t, limit) for t in terms]
+
+    def landscape(self, term: str, max_sponsors: int = 1000) -> Dict[str, Any]:
+        """Landscape stats over every study matching the term, folded row by row from the cursor."""
+        acc = TrialLandscape(max_sponsors)
+        ids = [m.upper() for m in _NCT_RE.findall(term)]
+        if ids:
+            sql = f"SELECT phase, status, sponsor FROM studies WHERE nct_id IN ({','.join('?' * len(ids))})"
+            args: Tuple[Any, ...] = tuple(ids)
+        else:
+            match = fts_query(term)
+            if match is None:
+                return acc.to_dict()
+            sql = "SELECT phase, status, sponsor FROM studies WHERE rowid IN (SELECT rowid FROM studies_fts WHERE studies_fts MATCH ?)"
+            args = (match,)
+        with self._lock:
+            for phase, status, sponsor in self._db().execute(sql, args):
+                acc.add(phase, status, sponsor)
+        return acc.to_dict()
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        with self._lock:
+            self._db().execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def watermark(self) -> Optional[str]:
+        """Latest LastUpdatePostDate held; delta syncs ask CT.gov for anything updated since."""
+        with self._lock:
+            row = self._db().execute("SELECT MAX(last_update) FROM studies").fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            db = self._db()
+            studies = db.execute("SELECT COUNT(*) FROM studies").fetchone()[0]
+            watermark = db.execute("SELECT MAX(last_update) FROM studies").fetchone()[0]
+            synced = db.execute("SELECT value FROM sync_state WHERE key = 'synced_at'").fetchone()
+        return {
+            "path": self.path,
+            "studies": studies,
+            "last_update": watermark,
+            "synced_at": synced[0] if synced else None,
+        }
+
+
+mirror = CtgovMirror(mirror_path())
+
+
+def iter_export(path: str) -> Iterator[Dict[str, Any]]:
+    """Studies from a CT.gov v2 export: the bulk zip / directory of per-study JSON files, an API page
+    or JSON array, or JSON Lines."""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                yield from _iter_json_doc(_read_json(os.path.join(path, name)))
+        return
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                if name.endswith(".json"):
+                    yield from _iter_json_doc(json.loads(zf.read(name)))
+        return
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    yield from _iter_json_doc(_read_json(path))
+
+
+def _read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _iter_json_doc(doc: Any) -> Iterator[Dict[str, Any]]:
+    if isinstance(doc, list):
+        yield from (s for s in doc if isinstance(s, dict))
+    elif isinstance(doc, dict) and isinstance(doc.get("studies"), list):
+        yield from (s for s in doc["studies"] if isinstance(s, dict))
+    elif isinstance(doc, dict) and "protocolSection" in doc:
+        yield doc
+
+
+def ingest(path: str, store: Optional[CtgovMirror] = None) -> int:
+    store = store or mirror
+    started = time.perf_counter()
+    written = store.upsert(iter_export(path))
+    store.set_state("ingested_at", datetime.now(timezone.utc).isoformat())
+    logger.info("Ingested %d studies from %s in %.1fs", written, path, time.perf_counter() - started)
+    return written
+
+
+async def sync(store: Optional[CtgovMirror] = None, since: Optional[str] = None) -> int:
+    """Pull studies updated on or after the watermark (or `since`) from the live API and upsert them.
+
+    Pages are requested oldest-update first, so a sync cut short by `CTGOV_MIRROR_SYNC_MAX_PAGES`
+    or an upstream error resumes where it stopped. Returns the number of studies written.
+    """
+    store = store or mirror
+    since = since or await asyncio.to_thread(store.watermark)
+    if not since:
+        logger.warning("CT.gov mirror is empty; run the ingest command before syncing")
+        return 0
+    max_pages = int(os.getenv("CTGOV_MIRROR_SYNC_MAX_PAGES", "50"))
+    params = {
+        "filter.advanced": f"AREA[LastUpdatePostDate]RANGE[{since},MAX]",
+        "sort": "LastUpdatePostDate:asc",
+        "pageSize": os.getenv("CTGOV_MIRROR_SYNC_PAGE_SIZE", "1000"),
+        "countTotal": "false",
+    }
+    scope = os.getenv("CTGOV_MIRROR_SYNC_TERM", "").strip()
+    if scope:
+        params["query.term"] = scope
+
+    written = 0
+    token: Optional[str] = None
+    for _ in range(max_pages):
+        page = dict(params, pageToken=token) if token else params
+        r = await upstream_request("ctgov", "GET", "/studies", params=page)
+        data = r.json()
+        studies = data.get("studies", [])
+        if isinstance(studies, list) and studies:
+            written += await asyncio.to_thread(store.upsert, studies)
+        token = data.get("nextPageToken")
+        if not token:
+            break
+    await asyncio.to_thread(store.set_state, "synced_at", datetime.now(timezone.utc).isoformat())
+    return written
+
+
+async def watch_ctgov_mirror(interval_s: float) -> None:
+    """Periodically fold CT.gov updates into the mirror until cancelled."""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            written = await sync()
+            if written:
+                logger.info("Synced %d updated CT.gov studies into the mirror", written)
+        except Exception:
+            logger.warning("CT.gov mirror sync failed; retrying in %.0fs", interval_s, exc_info=True)
+
+
+async def _sync_once(since: Optional[str]) -> int:
+    await open_clients()
+    try:
+        return await sync(since=since)
+    finally:
+        await close_clients()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="ctgov_mirror", description="Maintain the local ClinicalTrials.gov mirror.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ingest = sub.add_parser("ingest", help="bulk-load a CT.gov v2 export (zip, directory, .json or .jsonl)")
+    p_ingest.add_argument("path")
+    p_sync = sub.add_parser("sync", help="fetch studies updated since the newest one held")
+    p_sync.add_argument("--since", help="YYYY-MM-DD; defaults to the mirror's latest LastUpdatePostDate")
+    p_search = sub.add_parser("search", help="query the mirror")
+    p_search.add_argument("term")
+    p_search.add_argument("--limit", type=int, default=5)
+    sub.add_parser("stats", help="print mirror size and sync state")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "ingest":
+        ingest(args.path)
+    elif args.command == "sync":
+        logger.info("Synced %d studies", asyncio.run(_sync_once(args.since)))
+    elif args.command == "search":
+        for trial in mirror.search(args.term, args.limit):
+            print(json.dumps(trial))
+        return
+    print(json.dumps(mirror.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
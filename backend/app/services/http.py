@@ -0,0 +1,140 @@
+import importlib.util
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Tuple
+
+import httpx
+
+from .limits import CircuitOpenError, rate_limit_hook, upstream_breaker
+from .metrics import UPSTREAM_SHORT_CIRCUITS, record_upstream
+
+
+# name -> (base url env var, default base url, timeout env var, default timeout seconds)
+UPSTREAMS: Dict[str, Tuple[str, str, str, str]] = {
+    "pubmed": ("PUBMED_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils", "PUBMED_TIMEOUT_S", "8"),
+    "ctgov": ("CTGOV_BASE_URL", "https://clinicaltrials.gov/api/v2", "CTGOV_TIMEOUT_S", "10"),
+    "groq": ("GROQ_BASE_URL", "https://api.groq.com/openai/v1", "GROQ_TIMEOUT_S", "30"),
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("HTTP2_ENABLED", "1").strip().lower() in ("0", "false", "no"):
+        return False
+    # HTTP/2 needs the optional `h2` package (httpx[http2]); fall back to HTTP/1.1 without it.
+    return importlib.util.find_spec("h2") is not None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30")),
+    )
+
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    base_env, base_default, timeout_env, timeout_default = UPSTREAMS[name]
+    return httpx.AsyncClient(
+        base_url=os.getenv(base_env, base_default),
+        timeout=float(os.getenv(timeout_env, timeout_default)),
+        limits=_limits(),
+        http2=_http2_enabled(),
+        event_hooks={"request": [rate_limit_hook(name)]},
+    )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Return the long-lived pooled client for an upstream, creating it on first use."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _build_client(name)
+        _clients[name] = client
+    return client
+
+
+def _is_upstream_failure(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        # A 4xx other than 429 is our request's fault, not a sign the upstream is down.
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+async def upstream_request(name: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Send a request through the upstream's pooled client and circuit breaker.
+
+    Raises CircuitOpenError without touching the network while the breaker is open, and
+    httpx errors (including non-2xx statuses) otherwise.
+    """
+    breaker = upstream_breaker(name)
+    if not breaker.allow():
+        UPSTREAM_SHORT_CIRCUITS.inc(upstream=name)
+        raise CircuitOpenError(name)
+    started = time.perf_counter()
+    try:
+        r = await get_client(name).request(method, url, **kwargs)
+        r.raise_for_status()
+    except Exception as e:
+        record_upstream(name, time.perf_counter() - started, 0, "error")
+        if _is_upstream_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    breaker.record_success()
+    # r.elapsed runs from sending the request to the body being read, excluding rate-limit waits.
+    record_upstream(name, r.elapsed.total_seconds(), r.num_bytes_downloaded, "ok")
+    return r
+
+
+@asynccontextmanager
+async def upstream_stream(name: str, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+    """Streaming counterpart of upstream_request: yields the response once its status is known to be 2xx."""
+    breaker = upstream_breaker(name)
+    if not breaker.allow():
+        UPSTREAM_SHORT_CIRCUITS.inc(upstream=name)
+        raise CircuitOpenError(name)
+    settled = False
+    started = time.perf_counter()
+    response = None
+    outcome = "error"
+    try:
+        async with get_client(name).stream(method, url, **kwargs) as r:
+            response = r
+            r.raise_for_status()
+            breaker.record_success()
+            settled = True
+            yield r
+            outcome = "ok"
+    except Exception as e:
+        if _is_upstream_failure(e):
+            breaker.record_failure()
+        elif not settled:
+            breaker.record_success()
+        raise
+    except BaseException:
+        outcome = "cancelled"
+        if not settled:
+            breaker.release()
+        raise
+    finally:
+        nbytes = response.num_bytes_downloaded if response is not None else 0
+        record_upstream(name, time.perf_counter() - started, nbytes, outcome)
+
+
+async def open_clients() -> None:
+    for name in UPSTREAMS:
+        get_client(name)
+
+
+async def close_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
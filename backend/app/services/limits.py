@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+
+# upstream name -> (rate env var, default requests/second, burst env var).
+# NCBI allows 3 req/s without an API key.
+UPSTREAM_RATES: Dict[str, Tuple[str, str, str]] = {
+    "pubmed": ("PUBMED_RATE_PER_S", "3", "PUBMED_BURST"),
+    "ctgov": ("CTGOV_RATE_PER_S", "10", "CTGOV_BURST"),
+    "groq": ("GROQ_RATE_PER_S", "0", "GROQ_BURST"),
+}
+
+
+class TokenBucket:
+    """Async token bucket: up to `burst` requests at once, refilled at `rate` per second."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                # Holding the lock while sleeping keeps waiters FIFO.
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+_buckets: Dict[str, Optional[TokenBucket]] = {}
+_agent_slots: Optional[asyncio.Semaphore] = None
+
+
+def upstream_bucket(name: str) -> Optional[TokenBucket]:
+    """Shared rate limiter for an upstream, or None when its rate is set to 0 (unlimited)."""
+    if name not in _buckets:
+        rate_env, rate_default, burst_env = UPSTREAM_RATES[name]
+        rate = float(os.getenv(rate_env, rate_default))
+        burst = float(os.getenv(burst_env, str(max(1.0, rate))))
+        _buckets[name] = TokenBucket(rate, burst) if rate > 0 else None
+    return _buckets[name]
+
+
+def rate_limit_hook(name: str):
+    """httpx request event hook that waits for a token from the upstream's bucket."""
+
+    async def hook(request: httpx.Request) -> None:
+        bucket = upstream_bucket(name)
+        if bucket is not None:
+            await bucket.acquire()
+
+    return hook
+
+
+def agent_slots() -> asyncio.Semaphore:
+    """Process-wide cap on concurrently running agent calls (AGENT_MAX_CONCURRENCY, default 32)."""
+    global _agent_slots
+    if _agent_slots is None:
+        _agent_slots = asyncio.Semaphore(int(os.getenv("AGENT_MAX_CONCURRENCY", "32")))
+    return _agent_slots
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"circuit open for upstream {name}")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Trips after `threshold` consecutive failures; after `reset_s` lets one probe through (half-open)."""
+
+    def __init__(self, threshold: int, reset_s: float):
+        self.threshold = threshold
+        self.reset_s = reset_s
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._counters = {"successes": 0, "failures": 0, "short_circuited": 0, "trips": 0}
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - (self.opened_at or 0) >= self.reset_s:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self._counters["short_circuited"] += 1
+        return False
+
+    def record_success(self) -> None:
+        self._counters["successes"] += 1
+        self.consecutive_failures = 0
+        self._probing = False
+        self.state = "closed"
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self._counters["failures"] += 1
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+            if self.state != "open":
+                self._counters["trips"] += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self) -> None:
+        """Forget an in-flight probe that ended without an outcome (e.g. the caller was cancelled)."""
+        self._probing = False
+
+    def snapshot(self) -> Dict[str, object]:
+        retry_in = None
+        if self.state == "open" and self.opened_at is not None:
+            retry_in = round(max(0.0, self.reset_s - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_s": retry_in,
+            **self._counters,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def upstream_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        prefix = name.upper()
+        threshold = int(os.getenv(f"{prefix}_BREAKER_THRESHOLD", os.getenv("BREAKER_THRESHOLD", "5")))
+        reset_s = float(os.getenv(f"{prefix}_BREAKER_RESET_S", os.getenv("BREAKER_RESET_S", "30")))
+        breaker = _breakers[name] = CircuitBreaker(threshold, reset_s)
+    return breaker
+
+
+def upstream_metrics() -> Dict[str, Dict[str, object]]:
+    out: Dict[str, Dict[str, object]] = {}
+    for name in UPSTREAM_RATES:
+        bucket = upstream_bucket(name)
+        out[name] = {
+            "breaker": upstream_breaker(name).snapshot(),
+            "rate_per_s": bucket.rate if bucket else None,
+            "burst": bucket.burst if bucket else None,
+        }
+    return out
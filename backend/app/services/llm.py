@@ -1,7 +1,19 @@
+import hashlib
+import json
+import logging
 import os
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-import httpx
+from .cache import llm_cache
+from .http import upstream_request, upstream_stream
+from .prompt import pack_report_data
+
+
+logger = logging.getLogger(__name__)
+
+_CACHE = llm_cache()
+_NON_WORD_RE = re.compile(r"[^\w]+")
 
 
 def _is_configured() -> bool:
@@ -14,26 +26,9 @@ def llm_provider_name() -> str:
     return "none"
 
 
-async def generate_chat_response(
-    *,
-    query: str,
-    history: List[Dict[str, Any]],
-    report_data: Dict[str, Any],
-    fallback_text: str,
-) -> str:
-    """Generate assistant markdown.
-
-    - Uses Groq OpenAI-compatible endpoint if GROQ_API_KEY is set.
-    - Otherwise returns fallback_text.
-
-    Important: The prompt strictly instructs the model to only use provided report_data.
-    """
-
-    if not _is_configured():
-        return fallback_text
-
+def _completion_payload(query: str, packed: str, stream: bool = False) -> Dict[str, Any]:
+    """Chat completion request body. The prompt strictly instructs the model to only use report_data."""
     model = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
-    base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
 
     system = (
         "You are PharmaBridge Insight Engine, an analyst assistant for pharmaceutical intelligence. "
@@ -47,11 +42,6 @@ async def generate_chat_response(
         "When possible, include citations as links using fields already present in report_data (e.g., publication url, trial url)."
     )
 
-    user_payload = {
-        "query": query,
-        "report_data": report_data,
-    }
-
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": system},
         {
@@ -59,31 +49,126 @@ async def generate_chat_response(
             "content": (
                 "Using the following JSON as the only source, write the response. "
                 "Include: Findings summary, key evidence bullets per section, and clarifications if present.\n\n"
-                f"{user_payload}"
+                f'{{"query":{json.dumps(query, ensure_ascii=False)},"report_data":{packed}}}'
             ),
         },
     ]
 
-    timeout_s = float(os.getenv("GROQ_TIMEOUT_S", "30"))
+    payload: Dict[str, Any] = {
+        "model": model,
+        "messages": messages,
+        "temperature": float(os.getenv("GROQ_TEMPERATURE", "0.2")),
+        "max_tokens": int(os.getenv("GROQ_MAX_TOKENS", "900")),
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(_NON_WORD_RE.sub(" ", query.lower()).split())
+
+
+def _cache_key(query: str, packed: str, payload: Dict[str, Any]) -> str:
+    """Stable hash of the normalized question, the packed evidence actually sent, and the sampling settings."""
+    h = hashlib.sha256()
+    for part in (payload["model"], payload["temperature"], payload["max_tokens"], _normalize_query(query), packed):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _auth_headers() -> Dict[str, str]:
+    return {"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"}
+
 
+async def generate_chat_response(
+    *,
+    query: str,
+    history: List[Dict[str, Any]],
+    report_data: Dict[str, Any],
+    fallback_text: str,
+    agents_used: Optional[List[str]] = None,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Generate assistant markdown. Returns (content, llm cache metadata or None).
+
+    - Uses Groq OpenAI-compatible endpoint if GROQ_API_KEY is set.
+    - Otherwise returns fallback_text.
+    - report_data is packed to the sections agents_used produced, within LLM_PROMPT_BUDGET_TOKENS.
+    - Answers are cached by question + packed evidence (LLM_CACHE_*); fallbacks are never cached.
+    """
+
+    if not _is_configured():
+        return fallback_text, None
+
+    packed = pack_report_data(report_data, agents_used)
+    payload = _completion_payload(query, packed)
+
+    async def fetch() -> str:
+        # Pooled client with the Groq circuit breaker; an open breaker fails fast to fallback_text.
+        r = await upstream_request("groq", "POST", "/chat/completions", headers=_auth_headers(), json=payload)
+        content = r.json().get("choices", [{}])[0].get("message", {}).get("content")
+        if not content:
+            raise ValueError("empty completion")
+        return content
+
+    try:
+        return await _CACHE.get_or_fetch(_cache_key(query, packed, payload), fetch)
+    except Exception:
+        return fallback_text, None
+
+
+async def stream_chat_response(
+    *,
+    query: str,
+    history: List[Dict[str, Any]],
+    report_data: Dict[str, Any],
+    fallback_text: str,
+    agents_used: Optional[List[str]] = None,
+    cache_meta: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[str]:
+    """Like generate_chat_response, but yields content deltas as the model produces them (SSE).
+
+    Yields fallback_text as a single chunk when the LLM is not configured or fails before the
+    first token. A failure mid-stream ends the iteration after the tokens already sent. A cached
+    answer is yielded as one chunk; a fully streamed answer is cached. cache_meta, if given, is
+    filled with the llm cache metadata.
+    """
+    if not _is_configured():
+        yield fallback_text
+        return
+
+    packed = pack_report_data(report_data, agents_used)
+    payload = _completion_payload(query, packed, stream=True)
+    key = _cache_key(query, packed, payload)
+    cached = await _CACHE.peek(key)
+    if cached is not None:
+        if cache_meta is not None:
+            cache_meta.update(cached[1])
+        yield cached[0]
+        return
+
+    parts: List[str] = []
     try:
-        async with httpx.AsyncClient(timeout=timeout_s) as client:
-            r = await client.post(
-                f"{base_url}/chat/completions",
-                headers={"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"},
-                json={
-                    "model": model,
-                    "messages": messages,
-                    "temperature": float(os.getenv("GROQ_TEMPERATURE", "0.2")),
-                    "max_tokens": int(os.getenv("GROQ_MAX_TOKENS", "900")),
-                },
-            )
-            r.raise_for_status()
-            data = r.json()
-            return (
-                data.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", fallback_text)
-            )
+        async with upstream_stream("groq", "POST", "/chat/completions", headers=_auth_headers(), json=payload) as r:
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                delta = (json.loads(data).get("choices") or [{}])[0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
     except Exception:
-        return fallback_text
+        if not parts:
+            yield fallback_text
+        else:
+            logger.warning("LLM stream ended early", exc_info=True)
+        return
+
+    if parts:
+        meta = await _CACHE.store(key, "".join(parts))
+        if cache_meta is not None:
+            cache_meta.update(meta)
@@ -0,0 +1,101 @@
+from collections import deque
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, Tuple, TypeVar
+
+
+L = TypeVar("L", bound=Hashable)
+
+# Endings a stem may take: plurals, past and -ing forms, agent nouns. Anything else ("import" in
+# "important", "trade" in "trademark", "web" in "webinar") is a different word.
+_INFLECTIONS = frozenset(["s", "es", "d", "ed", "ing", "ings", "er", "ers"])
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum()
+
+
+class AhoCorasick(Generic[L]):
+    """Multi-pattern matcher: finds every (pattern, label) occurrence in one pass over the text.
+
+    Matching is case-insensitive and word-boundary aware. A match must not start inside a word,
+    and must not be followed by a letter; a trailing digit is allowed, so "phase" matches "phase3"
+    and "nct" matches "NCT01234567". Patterns given as `stems` may also be followed by an
+    inflectional ending, so "patent" matches "patented" and "market" matches "marketing".
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, L]], stems: Iterable[Tuple[str, L]] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # node -> [(pattern length, label, matches as a word prefix)]
+        self._out: List[List[Tuple[int, L, bool]]] = [[]]
+        for pattern, label in patterns:
+            self._add(pattern.lower(), label, False)
+        for pattern, label in stems:
+            self._add(pattern.lower(), label, True)
+        self._build()
+
+    def _add(self, pattern: str, label: L, stem: bool) -> None:
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), label, stem))
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, L]]:
+        """Yield (start, end, label) for every word-bounded match, in order of match end."""
+        text = text.lower()
+        n = len(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            open_end = end < n and text[end].isalpha()
+            inflected = False
+            if open_end:
+                rest = end
+                while rest < n and text[rest].isalpha():
+                    rest += 1
+                inflected = text[end:rest] in _INFLECTIONS
+            for length, label, stem in out[node]:
+                if open_end and not (stem and inflected):
+                    continue
+                start = end - length
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                yield start, end, label
+
+    def labels(self, text: str) -> List[L]:
+        """Distinct matched labels, ordered by first occurrence in the text."""
+        seen: Dict[L, int] = {}
+        for start, _, label in self.finditer(text):
+            if label not in seen or start < seen[label]:
+                seen[label] = start
+        return sorted(seen, key=seen.__getitem__)
@@ -0,0 +1,186 @@
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Seconds; spans cache hits (ms) up to slow upstreams and LLM calls.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, Prometheus style."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out: List[str] = []
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = 'le="' + _fmt(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(cumulative)}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(row[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(cumulative)}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")  # type: ignore[attr-defined]
+            lines.append(f"# TYPE {metric.name} {metric.kind}")  # type: ignore[attr-defined]
+            lines.extend(metric.samples())  # type: ignore[attr-defined]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_DURATION = registry.histogram(
+    "http_request_duration_seconds", "API request time until the response starts (streams: until headers).",
+    ("method", "route", "status"),
+)
+NODE_DURATION = registry.histogram(
+    "workflow_node_duration_seconds", "Orchestrator phase wall time (plan, dispatch, aggregate, workflow).", ("node",),
+)
+AGENT_DURATION = registry.histogram(
+    "agent_duration_seconds", "Agent wall time including its upstream calls.", ("agent", "outcome"),
+)
+AGENT_FALLBACKS = registry.counter(
+    "agent_fallbacks_total", "Agent results answered from mock data, by reason.", ("agent", "reason"),
+)
+UPSTREAM_DURATION = registry.histogram(
+    "upstream_request_duration_seconds", "Upstream HTTP latency (streams: until the body is consumed).", ("upstream", "outcome"),
+)
+UPSTREAM_BYTES = registry.counter(
+    "upstream_response_bytes_total", "Response bytes received from upstreams.", ("upstream",),
+)
+UPSTREAM_SHORT_CIRCUITS = registry.counter(
+    "upstream_short_circuits_total", "Requests refused without a network call because the breaker was open.", ("upstream",),
+)
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Response cache lookups by outcome (hit, miss, coalesced).", ("cache", "outcome"),
+)
+LLM_DURATION = registry.histogram(
+    "llm_duration_seconds", "LLM answer time by mode (complete, stream) and outcome (cache outcome or fallback).",
+    ("mode", "outcome"),
+)
+LLM_FIRST_TOKEN = registry.histogram(
+    "llm_first_token_seconds", "Time from the start of a streamed answer to its first content chunk.",
+)
+REPORT_RENDER = registry.histogram(
+    "report_render_seconds", "PDF render time (queued: in the worker process; inline: including the pool wait).", ("mode",),
+)
+REPORTS = registry.counter(
+    "reports_total", "Report requests by outcome (ready, queued, rejected, completed, failed).", ("outcome",),
+)
+
+
+# Upstream calls made while an agent runs are added to its accumulator (set per agent run; inherited by
+# tasks, to_thread and the agent thread pool through context copies).
+_upstream_acc: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("upstream_acc", default=None)
+
+
+def record_upstream(name: str, seconds: float, nbytes: int, outcome: str) -> None:
+    UPSTREAM_DURATION.observe(seconds, upstream=name, outcome=outcome)
+    if nbytes:
+        UPSTREAM_BYTES.inc(nbytes, upstream=name)
+    acc = _upstream_acc.get()
+    if acc is not None:
+        acc["upstream_calls"] += 1
+        acc["upstream_ms"] += seconds * 1000
+        acc["bytes"] += nbytes
+
+
+@contextmanager
+def agent_timing() -> Iterator[Dict[str, float]]:
+    """Collect wall time and upstream calls/latency/bytes for the code run inside the block."""
+    acc: Dict[str, float] = {"wall_ms": 0.0, "upstream_calls": 0, "upstream_ms": 0.0, "bytes": 0}
+    token = _upstream_acc.set(acc)
+    started = time.perf_counter()
+    try:
+        yield acc
+    finally:
+        acc["wall_ms"] = (time.perf_counter() - started) * 1000
+        _upstream_acc.reset(token)
+
+
+def rounded_ms(values: Dict[str, float]) -> Dict[str, float]:
+    return {k: round(v, 1) if isinstance(v, float) else v for k, v in values.items()}
@@ -0,0 +1,205 @@
+import asyncio
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+PROFILES_DIR = os.path.join(os.path.dirname(__file__), "..", "storage", "profiles")
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Leaf frames of threads parked in the stdlib (executor, queue feeder and pool management threads).
+_IDLE_LEAVES = {("_worker", "thread.py"), ("wait", "threading.py"), ("select", "selectors.py"), ("wait", "connection.py")}
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# kind -> file suffix; "report" is written by the report worker process for profiled requests.
+PROFILE_FILES = {"collapsed": ".collapsed.txt", "pstats": ".pstats", "report": ".report.pstats"}
+
+logger = logging.getLogger(__name__)
+
+# One profile at a time: the sampler sees every thread and cProfile allows one active profiler.
+_active = threading.Lock()
+
+
+def admin_token() -> str:
+    return os.getenv("PROFILE_ADMIN_TOKEN", "")
+
+
+def is_admin(token: Optional[str]) -> bool:
+    expected = admin_token()
+    return bool(expected) and token is not None and hmac.compare_digest(token, expected)
+
+
+def profiling_requested(header_token: Optional[str]) -> bool:
+    """Profile this request? An admin token in the header forces it; otherwise PROFILE_SAMPLE_RATE decides."""
+    if header_token is not None and is_admin(header_token):
+        return True
+    rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    return rate > 0 and random.random() < rate
+
+
+def profile_path(profile_id: str, kind: str) -> str:
+    return os.path.join(PROFILES_DIR, f"{profile_id}{PROFILE_FILES[kind]}")
+
+
+def _frame_label(code: Any) -> str:
+    path = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed interval into collapsed-stack counts.
+
+    Covers the event loop and the agent thread pool alike, and costs nothing between samples.
+    Threads idling in the stdlib outside application code are skipped so they do not dominate the output.
+    """
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.samples = 0
+        self.counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval_s):
+            frames = sys._current_frames()
+            if any(ident not in names for ident in frames):
+                names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                leaf = frame.f_code
+                in_app = False
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or code.co_filename.startswith(_APP_DIR)
+                    stack.append(_frame_label(code))
+                    frame = frame.f_back
+                if not in_app and (leaf.co_name, os.path.basename(leaf.co_filename)) in _IDLE_LEAVES:
+                    continue
+                key = ";".join([names.get(ident, str(ident))] + stack[::-1])
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+def _prune() -> None:
+    keep = int(os.getenv("PROFILE_MAX_PROFILES", "50"))
+    metas = sorted(
+        (e for e in os.scandir(PROFILES_DIR) if e.name.endswith(".json")),
+        key=lambda e: e.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in metas[keep:]:
+        profile_id = entry.name[: -len(".json")]
+        for kind in PROFILE_FILES:
+            try:
+                os.remove(profile_path(profile_id, kind))
+            except FileNotFoundError:
+                pass
+        os.remove(entry.path)
+
+
+def _write(profile_id: str, meta: Dict[str, Any], sampler: Optional[StackSampler], prof: Optional[cProfile.Profile]) -> None:
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    if sampler is not None:
+        with open(profile_path(profile_id, "collapsed"), "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+    if prof is not None:
+        prof.dump_stats(profile_path(profile_id, "pstats"))
+    with open(os.path.join(PROFILES_DIR, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    _prune()
+
+
+@asynccontextmanager
+async def profile_request(label: str) -> AsyncIterator[Optional[str]]:
+    """Profile the enclosed block and store the result; yields the profile id, or None if one is already running.
+
+    `PROFILE_MODE=sampling` (default) samples all threads every `PROFILE_INTERVAL_MS` into collapsed stacks.
+    `cprofile` records the event loop thread deterministically into a pstats file. Either way, anything else
+    running on the shared loop during the block is captured too.
+    """
+    if not _active.acquire(blocking=False):
+        yield None
+        return
+    profile_id = uuid.uuid4().hex
+    mode = "cprofile" if os.getenv("PROFILE_MODE", "sampling").strip().lower() == "cprofile" else "sampling"
+    sampler = StackSampler(float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000) if mode == "sampling" else None
+    prof = cProfile.Profile() if mode == "cprofile" else None
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        if sampler is not None:
+            sampler.start()
+        if prof is not None:
+            prof.enable()
+        try:
+            yield profile_id
+        finally:
+            if prof is not None:
+                prof.disable()
+            if sampler is not None:
+                sampler.stop()
+        meta = {
+            "id": profile_id,
+            "label": label[:200],
+            "mode": mode,
+            "started_at": started_at,
+            "duration_s": round(time.perf_counter() - started, 3),
+            "samples": sampler.samples if sampler is not None else None,
+            "files": ["collapsed" if sampler is not None else "pstats"],
+        }
+        await asyncio.to_thread(_write, profile_id, meta, sampler, prof)
+        logger.info("Stored %s profile %s (%.2fs)", mode, profile_id, meta["duration_s"])
+    finally:
+        _active.release()
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    if not os.path.isdir(PROFILES_DIR):
+        return []
+    out: List[Dict[str, Any]] = []
+    for entry in os.scandir(PROFILES_DIR):
+        if entry.name.endswith(".json"):
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if os.path.exists(profile_path(meta["id"], "report")):
+                meta["files"] = meta["files"] + ["report"]
+            out.append(meta)
+    return sorted(out, key=lambda m: m["started_at"], reverse=True)
+
+
+def find_profile(profile_id: str, kind: str) -> Optional[str]:
+    """Path of a stored profile file, or None (unknown id/kind or not written yet)."""
+    if not _ID_RE.match(profile_id) or kind not in PROFILE_FILES:
+        return None
+    path = profile_path(profile_id, kind)
+    return path if os.path.exists(path) else None
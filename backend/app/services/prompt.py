@@ -0,0 +1,139 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from .sections import AGENT_SECTIONS
+
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+# Long free-text fields, stripped from lower-ranked items first when over budget.
+_BULKY_FIELDS = ("abstract", "claims", "key_findings", "authors", "endpoints", "trends", "notes")
+
+# Per-section provenance the model needs for its "Data Sources" section. Time-varying fields
+# (fetched_at, cache_age_s) are left out so identical evidence always packs to identical text.
+_SOURCE_FIELDS = ("source", "fallback_reason")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap BPE-ish estimate: one token per word or punctuation mark, plus one per 6 chars of long words."""
+    return sum(1 + len(p) // 6 for p in _PIECE_RE.findall(text))
+
+
+def _budget_tokens() -> int:
+    return int(os.getenv("LLM_PROMPT_BUDGET_TOKENS", "2500"))
+
+
+def _field_chars() -> int:
+    return int(os.getenv("LLM_PROMPT_FIELD_CHARS", "280"))
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _trim(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[: max_chars - 1].rstrip() + "…"
+    if isinstance(value, dict):
+        return {k: _trim(v, max_chars) for k, v in value.items() if v not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        return [_trim(v, max_chars) for v in value]
+    return value
+
+
+def _strip_bulky(items: List[Any], keep: int) -> bool:
+    changed = False
+    for item in items[keep:]:
+        if isinstance(item, dict):
+            for field in _BULKY_FIELDS:
+                if item.pop(field, None) is not None:
+                    changed = True
+    return changed
+
+
+def pack_report_data(
+    report_data: Dict[str, Any],
+    agents_used: Optional[List[str]] = None,
+    budget_tokens: Optional[int] = None,
+) -> str:
+    """Serialize report_data (without the query) for the LLM as compact JSON within a token budget.
+
+    Only sections produced by the agents that ran are kept, long strings are clipped, and
+    provenance is reduced to what the prompt asks for. Over budget, bulky fields are dropped
+    from all but each section's top item, then the longest lists (including those inside the
+    iqvia/exim dicts) lose their lowest-ranked items, then the top items and the dicts lose their
+    bulky fields too. If that is still too long, whole dict sections are dropped, per-molecule
+    copies first, and listed under "omitted". Lists keep their relevance order throughout; the
+    top item of each list is always kept, so a very small budget can still be exceeded.
+    """
+    budget = budget_tokens or _budget_tokens()
+    sections = [AGENT_SECTIONS[a] for a in agents_used if a in AGENT_SECTIONS] if agents_used else list(AGENT_SECTIONS.values())
+
+    sources = report_data.get("sources") or {}
+    packed: Dict[str, Any] = {
+        "sources": {
+            s: {f: sources[s][f] for f in _SOURCE_FIELDS if isinstance(sources.get(s), dict) and f in sources[s]}
+            for s in sections
+            if isinstance(sources.get(s), dict)
+        },
+    }
+
+    per_molecule = report_data.get("molecules") or {}
+    if per_molecule:
+        packed["molecules"] = {
+            key: {s: data[s] for s in sections if data.get(s)} for key, data in per_molecule.items()
+        }
+    # Flat sections are the concatenation of the per-molecule ones where a breakdown exists; send
+    # those only once, and the rest (e.g. internal docs retrieved for the whole query) as they are.
+    covered = {s for data in per_molecule.values() for s in data}
+    for s in sections:
+        if s not in covered and report_data.get(s):
+            packed[s] = report_data[s]
+    if "trials" in sections and report_data.get("trial_landscape"):
+        packed["trial_landscape"] = report_data["trial_landscape"]
+    for extra in ("insights", "clarifications"):
+        if report_data.get(extra):
+            packed[extra] = report_data[extra]
+
+    packed = _trim(packed, _field_chars())
+    text = _dumps(packed)
+    if estimate_tokens(text) <= budget:
+        return text
+
+    containers = [packed] + list(packed.get("molecules", {}).values())
+    lists: List[List[Any]] = []
+    dicts: List[Dict[str, Any]] = []
+    for container in containers:
+        lists.extend(v for k, v in container.items() if k in sections and isinstance(v, list))
+        dicts.extend(v for k, v in container.items() if k in sections and isinstance(v, dict))
+    for d in dicts + list(packed.get("trial_landscape", {}).values()):
+        lists.extend(v for k, v in d.items() if k not in _BULKY_FIELDS and isinstance(v, list))
+
+    if any([_strip_bulky(items, keep=1) for items in lists]):
+        text = _dumps(packed)
+    # Track the estimate incrementally (item + separator) instead of re-serializing per drop.
+    tokens = estimate_tokens(text)
+    dropped = False
+    while tokens > budget:
+        longest = max(lists, key=len, default=[])
+        if len(longest) <= 1:
+            break
+        tokens -= estimate_tokens(_dumps(longest.pop())) + 1
+        dropped = True
+    if dropped:
+        text = _dumps(packed)
+    if estimate_tokens(text) > budget and any([_strip_bulky(items, keep=0) for items in lists + [dicts]]):
+        text = _dumps(packed)
+    holders = [(f" ({key})", data) for key, data in reversed(list(packed.get("molecules", {}).items()))]
+    omitted: List[str] = []
+    for suffix, container in holders + [("", packed)]:
+        for s in [k for k, v in container.items() if k in sections and isinstance(v, dict)]:
+            if estimate_tokens(text) <= budget:
+                return text
+            del container[s]
+            omitted.append(s + suffix)
+            packed["omitted"] = omitted
+            text = _dumps(packed)
+    return text
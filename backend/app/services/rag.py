@@ -1,24 +1,34 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import math
 import os
 import re
-from typing import Any, Dict, List, Tuple
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import vectors
 
 
 _INTERNAL_DIR = os.path.join(os.path.dirname(__file__), "..", "storage", "internal_docs")
+_INDEX_PATH = os.path.join(os.path.dirname(__file__), "..", "storage", "index", "internal_docs.json")
+_INDEX_VERSION = 2
 
+logger = logging.getLogger(__name__)
 
-def _tokenize(text: str) -> List[str]:
-    return [t for t in re.split(r"[^a-zA-Z0-9]+", text.lower()) if t]
 
+_TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
+
+_STOPWORDS = frozenset(
+    "a about an and are as at be by can do does for from how i in is it me my of on or our should that the this to was we what when which who why with you".split()
+)
 
-def _score(query_tokens: List[str], doc_tokens: List[str]) -> float:
-    if not query_tokens or not doc_tokens:
-        return 0.0
-    q = set(query_tokens)
-    d = set(doc_tokens)
-    inter = q.intersection(d)
-    if not inter:
-        return 0.0
-    return len(inter) / max(1, len(q))
+
+def _tokenize(text: str) -> List[str]:
+    return [t for t in re.split(r"[^a-zA-Z0-9]+", text.lower()) if t]
 
 
 def _read_doc(path: str) -> str:
@@ -26,31 +36,280 @@ def _read_doc(path: str) -> str:
         return f.read()
 
 
-def retrieve_internal_docs(query: str, k: int = 3) -> List[Dict[str, Any]]:
+def _is_doc(name: str) -> bool:
+    return name.lower().endswith(".txt") or name.lower().endswith(".md")
+
+
+def _passage_params() -> Tuple[int, int]:
+    size = max(8, int(os.getenv("RAG_PASSAGE_TOKENS", "60")))
+    overlap = min(size - 1, max(0, int(os.getenv("RAG_PASSAGE_OVERLAP", "20"))))
+    return size, overlap
+
+
+def split_passages(text: str, size: int, overlap: int) -> List[Tuple[str, List[str]]]:
+    """Split text into overlapping token windows.
+
+    Returns (snippet, tokens) per passage; the snippet is the whitespace-collapsed source
+    text of the window, with ellipses where it is cut out of the middle of the document.
+    """
+    matches = list(_TOKEN_RE.finditer(text))
+    if not matches:
+        return []
+    stride = size - overlap
+    out: List[Tuple[str, List[str]]] = []
+    start = 0
+    while True:
+        window = matches[start:start + size]
+        begin = 0 if start == 0 else window[0].start()
+        last = start + size >= len(matches)
+        end = len(text) if last else window[-1].end()
+        snippet = re.sub(r"\s+", " ", text[begin:end]).strip()
+        if start > 0:
+            snippet = "..." + snippet
+        if not last:
+            snippet += "..."
+        out.append((snippet, [m.group(0).lower() for m in window]))
+        if last:
+            return out
+        start += stride
+
+
+def _highlight(snippet: str, terms: List[str]) -> str:
+    if not terms:
+        return snippet
+    pattern = re.compile(r"(?<![a-zA-Z0-9])(" + "|".join(re.escape(t) for t in terms) + r")(?![a-zA-Z0-9])", re.IGNORECASE)
+    return pattern.sub(r"**\1**", snippet)
+
+
+class InvertedIndex:
+    """Term -> postings index over overlapping passages of internal documents, scored with BM25."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # name -> {"mtime_ns", "size", "sha1", "passages": [passage ids]}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        # passage id -> {"doc", "length", "snippet", "terms"}
+        self.passages: Dict[str, Dict[str, Any]] = {}
+        # term -> {passage id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def add(self, name: str, text: str, stamp: Dict[str, Any]) -> None:
+        size, overlap = _passage_params()
+        passages = split_passages(text, size, overlap)
+        with self._lock:
+            self.remove(name)
+            ids: List[str] = []
+            for i, (snippet, tokens) in enumerate(passages):
+                pid = f"{name}#{i}"
+                counts = Counter(tokens)
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, {})[pid] = tf
+                self.passages[pid] = {"doc": name, "length": len(tokens), "snippet": snippet, "terms": list(counts)}
+                self.total_length += len(tokens)
+                ids.append(pid)
+            self.docs[name] = {**stamp, "passages": ids}
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            doc = self.docs.pop(name, None)
+            if doc is None:
+                return
+            for pid in doc["passages"]:
+                passage = self.passages.pop(pid)
+                self.total_length -= passage["length"]
+                for term in passage["terms"]:
+                    posting = self.postings.get(term)
+                    if posting is None:
+                        continue
+                    posting.pop(pid, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def score_passages(self, query_tokens: List[str]) -> Dict[str, float]:
+        """BM25 score of every passage containing at least one query term."""
+        with self._lock:
+            n = len(self.passages)
+            if not n:
+                return {}
+            avgdl = self.total_length / n or 1.0
+            scores: Dict[str, float] = {}
+            for term in set(query_tokens):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1.0 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for pid, tf in posting.items():
+                    dl = self.passages[pid]["length"]
+                    denom = tf + self.k1 * (1.0 - self.b + self.b * dl / avgdl)
+                    scores[pid] = scores.get(pid, 0.0) + idf * tf * (self.k1 + 1.0) / denom
+            return scores
+
+    def best_per_doc(self, scored: Iterable[Tuple[str, float]], k: int) -> List[Tuple[float, str, str]]:
+        """Collapse passage scores to each document's best passage; return top-k (score, doc, passage id)."""
+        best: Dict[str, Tuple[float, str]] = {}
+        for pid, score in scored:
+            passage = self.passages.get(pid)
+            if passage is None:
+                continue
+            name = passage["doc"]
+            if name not in best or score > best[name][0]:
+                best[name] = (score, pid)
+        return heapq.nlargest(k, ((score, name, pid) for name, (score, pid) in best.items()))
+
+    def search(self, query_tokens: List[str], k: int) -> List[Tuple[float, str, str]]:
+        """Return (score, doc name, best passage id) for the top-k documents by best passage."""
+        return self.best_per_doc(self.score_passages(query_tokens).items(), k)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"version": _INDEX_VERSION, "docs": self.docs, "passages": self.passages, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InvertedIndex":
+        index = cls()
+        if data.get("version") != _INDEX_VERSION:
+            return index
+        index.docs = data.get("docs", {})
+        index.passages = data.get("passages", {})
+        index.postings = data.get("postings", {})
+        index.total_length = sum(p["length"] for p in index.passages.values())
+        return index
+
+
+_index: Optional[InvertedIndex] = None
+_refresh_lock = threading.Lock()
+_warned_no_numpy = False
+
+
+def _rag_mode() -> str:
+    global _warned_no_numpy
+    mode = os.getenv("RAG_MODE", "lexical").strip().lower()
+    if mode != "hybrid":
+        return "lexical"
+    if not vectors.available():
+        if not _warned_no_numpy:
+            logger.warning("RAG_MODE=hybrid needs numpy; falling back to lexical retrieval")
+            _warned_no_numpy = True
+        return "lexical"
+    return "hybrid"
+
+
+def _load_persisted() -> InvertedIndex:
+    try:
+        with open(_INDEX_PATH, "r", encoding="utf-8") as f:
+            return InvertedIndex.from_dict(json.load(f))
+    except (OSError, ValueError):
+        return InvertedIndex()
+
+
+def _persist(index: InvertedIndex) -> None:
+    os.makedirs(os.path.dirname(_INDEX_PATH), exist_ok=True)
+    tmp = _INDEX_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp, _INDEX_PATH)
+
+
+def refresh_index() -> int:
+    """Bring the index in line with storage/internal_docs, re-reading only new or changed files.
+
+    Files are skipped when mtime and size are unchanged, and re-tokenized only when their
+    content hash changed; a new stamp alone (touch, checkout) is still persisted so the next start
+    skips the file. Returns the number of documents added, updated or removed.
+    """
+    global _index
+    with _refresh_lock:
+        index = _index if _index is not None else _load_persisted()
+        os.makedirs(_INTERNAL_DIR, exist_ok=True)
+
+        seen = set()
+        changed = 0
+        restamped = 0
+        for entry in os.scandir(_INTERNAL_DIR):
+            if not (_is_doc(entry.name) and entry.is_file()):
+                continue
+            seen.add(entry.name)
+            st = entry.stat()
+            doc = index.docs.get(entry.name)
+            if doc and doc["mtime_ns"] == st.st_mtime_ns and doc["size"] == st.st_size:
+                continue
+            text = _read_doc(entry.path)
+            sha1 = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            stamp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": sha1}
+            if doc and doc["sha1"] == sha1:
+                doc.update(stamp)
+                restamped += 1
+            else:
+                index.add(entry.name, text, stamp)
+                changed += 1
+
+        for name in [n for n in index.docs if n not in seen]:
+            index.remove(name)
+            changed += 1
+
+        _index = index
+        if changed or restamped or not os.path.exists(_INDEX_PATH):
+            _persist(index)
+        if _rag_mode() == "hybrid" and (changed or not vectors.exists()):
+            ids = list(index.passages)
+            vectors.build(ids, [index.passages[pid]["snippet"] for pid in ids])
+        return changed
+
+
+async def watch_internal_docs(interval_s: float) -> None:
+    """Periodically fold added/changed/removed documents into the index until cancelled."""
+    while True:
+        await asyncio.sleep(interval_s)
+        changed = await asyncio.to_thread(refresh_index)
+        if changed:
+            logger.info("Re-indexed %d internal document(s)", changed)
+
+
+def add_document(name: str, text: str) -> None:
+    """Write a document into storage/internal_docs and index it immediately."""
+    if not _is_doc(name) or os.path.basename(name) != name:
+        raise ValueError("Internal documents must be plain .txt or .md file names")
     os.makedirs(_INTERNAL_DIR, exist_ok=True)
+    with open(os.path.join(_INTERNAL_DIR, name), "w", encoding="utf-8") as f:
+        f.write(text)
+    refresh_index()
 
-    query_tokens = _tokenize(query)
-    candidates: List[Tuple[float, str, str]] = []
 
-    for name in os.listdir(_INTERNAL_DIR):
-        if not (name.lower().endswith(".txt") or name.lower().endswith(".md")):
-            continue
-        path = os.path.join(_INTERNAL_DIR, name)
-        if not os.path.isfile(path):
-            continue
-        text = _read_doc(path)
-        doc_tokens = _tokenize(text)
-        s = _score(query_tokens, doc_tokens)
-        if s > 0:
-            candidates.append((s, name, text))
+def _hybrid_search(index: InvertedIndex, query_tokens: List[str], k: int) -> List[Tuple[float, str, str]]:
+    """Reciprocal-rank fusion of BM25 and dense passage rankings."""
+    depth = int(os.getenv("RAG_HYBRID_DEPTH", "50"))
+    alpha = float(os.getenv("RAG_HYBRID_ALPHA", "0.5"))
+    lexical = heapq.nlargest(depth, index.score_passages(query_tokens).items(), key=lambda x: x[1])
+    dense = vectors.search(query_tokens, depth)
 
-    candidates.sort(key=lambda x: x[0], reverse=True)
-    out: List[Dict[str, Any]] = []
+    fused: Dict[str, float] = {}
+    for rank, (pid, _) in enumerate(lexical):
+        fused[pid] = fused.get(pid, 0.0) + (1.0 - alpha) / (60 + rank)
+    for rank, (_, pid) in enumerate(dense):
+        fused[pid] = fused.get(pid, 0.0) + alpha / (60 + rank)
+    return index.best_per_doc(fused.items(), k)
 
-    for s, name, text in candidates[:k]:
-        snippet = re.sub(r"\s+", " ", text).strip()
-        if len(snippet) > 400:
-            snippet = snippet[:400] + "..."
-        out.append({"title": name, "summary": snippet, "score": round(s, 3)})
+
+def retrieve_internal_docs(query: str, k: int = 3) -> List[Dict[str, Any]]:
+    if _index is None:
+        refresh_index()
+    index = _index
+
+    query_tokens = [t for t in _tokenize(query) if t not in _STOPWORDS]
+    if _rag_mode() == "hybrid":
+        hits = _hybrid_search(index, query_tokens, k)
+    else:
+        hits = index.search(query_tokens, k)
+
+    out: List[Dict[str, Any]] = []
+    for s, name, pid in hits:
+        passage = index.passages.get(pid)
+        if passage is None:
+            continue
+        matched = [t for t in set(vectors.expand_aliases(query_tokens)) if t in passage["terms"]]
+        out.append({"title": name, "summary": _highlight(passage["snippet"], matched), "score": round(s, 4)})
 
     return out
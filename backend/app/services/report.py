@@ -1,179 +1,287 @@
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import datetime
+import functools
+import io
+import logging
 
 
-def build_report(data: Dict[str, Any], path: str):
-    print(f"Starting report generation for path: {path}")
-    print(f"Available data keys: {list(data.keys())}")
-    
-    try:
-        c = canvas.Canvas(path, pagesize=A4)
-        width, height = A4
-
-        def draw_heading(text: str, y: float, level: int = 1):
-            font_size = 16 if level == 1 else 14 if level == 2 else 12
-            c.setFont("Helvetica-Bold", font_size)
-            c.drawString(2 * cm, y, text)
-            return y - (1.2 * cm if level == 1 else 0.8 * cm)
-
-        def draw_lines(lines: List[str], y: float, indent: int = 0):
-            c.setFont("Helvetica", 10)
-            for line in lines:
-                if not line:
-                    y -= 0.4 * cm  # Add some space for empty lines
-                    continue
-                    
-                # Handle line breaks in the text
-                max_line_length = 90 - (indent * 3)  # Adjust for indentation
-                line_parts = [line[i:i+max_line_length] for i in range(0, len(line), max_line_length)]
-                
-                for part in line_parts:
-                    if y < 3 * cm:  # Leave space for footer
-                        c.showPage()
-                        y = height - 2 * cm
-                        c.setFont("Helvetica", 10)
-                    
-                    # Apply indentation
-                    indent_str = " " * indent * 3
-                    c.drawString(2 * cm + (indent * 0.5 * cm), y, f"{indent_str}{part}")
-                    y -= 0.5 * cm
-                    
-            return y
-
-        # Start with a title page
-        y = height - 5 * cm
+logger = logging.getLogger(__name__)
+
+# Streams stay Flate-compressed; the extra ASCII85 pass (7-bit-safe output) is pure Python here and
+# was a third of save() time.
+rl_config.useA85 = 0
+
+WIDTH, HEIGHT = A4
+MARGIN = 2 * cm
+BOTTOM = 3 * cm  # leave space for the footer
+BODY_FONT = ("Helvetica", 10)
+HEADING_FONTS = {1: ("Helvetica-Bold", 16), 2: ("Helvetica-Bold", 14), 3: ("Helvetica-Bold", 12)}
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_width(word: str, font: str, size: float) -> float:
+    # Report text repeats heavily (labels, journals, sponsors); stringWidth is the wrapping hot spot.
+    return stringWidth(word, font, size)
+
+
+def wrap_text(text: str, font: str, size: float, max_width: float) -> List[str]:
+    """Greedy word wrap by rendered width. Words wider than a full line are split by character."""
+    space = _word_width(" ", font, size)
+    lines: List[str] = []
+    current: List[str] = []
+    width = 0.0
+    for word in text.split():
+        w = _word_width(word, font, size)
+        if w > max_width:
+            if current:
+                lines.append(" ".join(current))
+                current, width = [], 0.0
+            chunk = ""
+            for ch in word:
+                if chunk and _word_width(chunk + ch, font, size) > max_width:
+                    lines.append(chunk)
+                    chunk = ""
+                chunk += ch
+            current, width = [chunk], _word_width(chunk, font, size)
+            continue
+        needed = w if not current else width + space + w
+        if current and needed > max_width:
+            lines.append(" ".join(current))
+            current, width = [word], w
+        else:
+            current.append(word)
+            width = needed
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+class _Writer:
+    """Draws flowing text onto the canvas, breaking pages as needed.
+
+    Body text goes through one text object per page; font, leading and indentation are emitted
+    only when they change instead of opening a new text object per line.
+    """
+
+    def __init__(self, c: canvas.Canvas):
+        self.c = c
+        self.y = HEIGHT - MARGIN
+        self._text = None
+        self._x = 0.0
+        self._font: Optional[tuple] = None
+        self._leading = 0.0
+        self._define_forms()
+
+    def _define_forms(self) -> None:
+        # Static page furniture is drawn once per document as form XObjects and referenced per page.
+        c = self.c
+        c.beginForm("title")
         c.setFont("Helvetica-Bold", 20)
-        c.drawCentredString(width/2, y, "PharmaBridge Insights Report")
-        y -= 1.5 * cm
-        
-        c.setFont("Helvetica", 12)
-        y = draw_lines(["", f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ""], y)
-        
-        # Add a new page for the content
-        c.showPage()
-        y = height - 2 * cm
-        
-        # Add query section
-        query = data.get('query', 'No query provided')
-        y = draw_heading("Query", y, 2)
-        y = draw_lines([query, ""], y, 0)
-
-        sources = data.get("sources", {})
-        if isinstance(sources, dict) and sources:
-            y = draw_heading("Data Sources", y, 2)
-            lines = []
-            for label, key in [
-                ("Publications", "publications"),
-                ("Clinical Trials", "trials"),
-                ("Patents", "patents"),
-                ("Market (IQVIA)", "iqvia"),
-                ("EXIM", "exim"),
-                ("Internal Knowledge", "internal_docs"),
-                ("Web Intelligence", "web_intel"),
-            ]:
-                meta = sources.get(key)
-                if isinstance(meta, dict) and meta.get("source"):
-                    lines.append(f"{label}: {meta.get('source')}")
-            generated_at = sources.get("generated_at")
-            if isinstance(generated_at, str) and generated_at:
-                lines.append(f"Generated at: {generated_at}")
-            if lines:
-                y = draw_lines(lines + [""], y, 1)
-        
-        # Helper function to safely get list data
-        def safe_get_list(data, key):
-            items = data.get(key, [])
-            return items if isinstance(items, list) else []
-            
-        # Add each section if data exists
-        sections = [
-            ("publications", "Publications", lambda p: f"{p.get('title', 'No title')} — {p.get('journal', 'No journal')} ({p.get('year', 'N/A')})"),
-            ("trials", "Clinical Trials", lambda t: f"{t.get('nct_id', 'NCTXXXX')} — {t.get('title', 'No title')} [{t.get('phase', 'Phase N/A')}] ({t.get('status', 'Status N/A')})"),
-            ("patents", "Patents", lambda p: f"{p.get('patent_number', 'N/A')} — {p.get('title', 'No title')} (exp: {p.get('expiry', 'N/A')})"),
-        ]
-        
-        for key, title, formatter in sections:
-            items = safe_get_list(data, key)
-            if items:
-                y = draw_heading(title, y, 2)
-                y = draw_lines([formatter(item) for item in items], y, 1)
-                y = draw_lines([""], y)  # Add some space after section
-        
-        # Add IQVIA data if available
-        iqvia = data.get("iqvia", {})
-        if iqvia:
-            y = draw_heading("Market Insights (IQVIA)", y, 2)
-            lines = []
-            if 'therapy_area' in iqvia:
-                lines.append(f"Therapy Area: {iqvia['therapy_area']}")
-            if 'cagr' in iqvia:
-                lines.append(f"CAGR: {iqvia['cagr']}%")
-            if 'market_size' in iqvia:
-                lines.append(f"Market Size: ${iqvia['market_size']}M")
-                
-            competitors = iqvia.get('competitors', [])
-            if competitors:
-                lines.append("")
-                lines.append("Key Competitors:")
-                for comp in competitors[:5]:  # Limit to top 5
-                    lines.append(f"- {comp.get('name', 'N/A')}: {comp.get('market_share', 0) * 100:.1f}%")
-            
-            y = draw_lines(lines, y, 1)
-            y = draw_lines([""], y)  # Add some space after section
-        
-        # Add EXIM data if available
-        exim = data.get("exim", {})
-        if exim:
-            y = draw_heading("EXIM Trends", y, 2)
-            lines = []
-            if 'import_dependency' in exim:
-                lines.append(f"Import Dependency: {exim['import_dependency'] * 100:.1f}%")
-                
-            exporters = exim.get('top_exporters', [])
-            if exporters:
-                lines.append("")
-                lines.append("Top Exporting Countries:")
-                for exp in exporters[:5]:  # Limit to top 5
-                    lines.append(f"- {exp.get('country', 'N/A')}: {exp.get('share', 'N/A')}")
-            
-            y = draw_lines(lines, y, 1)
-            y = draw_lines([""], y)  # Add some space after section
-        
-        # Add Internal Documents if available
-        internal_docs = safe_get_list(data, "internal_docs")
-        if internal_docs:
-            y = draw_heading("Internal Knowledge", y, 2)
-            y = draw_lines([f"- {doc.get('title', 'No title')}: {doc.get('summary', 'No summary')[:100]}" 
-                          for doc in internal_docs], y, 1)
-            y = draw_lines([""], y)  # Add some space after section
-        
-        # Add Web Intelligence if available
-        web_intel = safe_get_list(data, "web_intel")
-        if web_intel:
-            y = draw_heading("Web Intelligence", y, 2)
-            y = draw_lines([f"- {item.get('source', 'Source')}: {item.get('summary', 'No summary')[:100]}" 
-                          for item in web_intel[:5]], y, 1)  # Limit to 5 items
-            y = draw_lines([""], y)  # Add some space after section
-        
-        # Add Insights and Flags if available
-        insights = safe_get_list(data, "insights")
-        if insights:
-            y = draw_heading("Key Insights", y, 2)
-            y = draw_lines([f"• {insight}" for insight in insights], y, 1)
-        
-        # Add footer
+        c.drawCentredString(WIDTH / 2, HEIGHT - 5 * cm, "PharmaBridge Insights Report")
+        c.endForm()
+        c.beginForm("chrome")
         c.setFont("Helvetica", 8)
-        c.drawCentredString(width/2, 1 * cm, "Confidential - PharmaBridge Insights")
-        
+        c.drawCentredString(WIDTH / 2, 1 * cm, "Confidential - PharmaBridge Insights")
+        c.endForm()
+
+    def title_page(self, generated_on: str) -> None:
+        self.c.doForm("title")
+        self.c.setFont(*BODY_FONT)
+        self.c.drawString(MARGIN, HEIGHT - 5 * cm - 1.5 * cm - 0.4 * cm, f"Generated on: {generated_on}")
+        self.c.showPage()
+        self.c.doForm("chrome")
+
+    def flush(self) -> None:
+        if self._text is not None:
+            self.c.drawText(self._text)
+            self._text = None
+
+    def new_page(self) -> None:
+        self.flush()
+        self.c.showPage()
+        self.c.doForm("chrome")
+        self.y = HEIGHT - MARGIN
+
+    def _line(self, x: float, text: str, font: tuple, advance: float) -> None:
+        if self.y < BOTTOM:
+            self.new_page()
+        t = self._text
+        if t is None:
+            t = self._text = self.c.beginText(x, self.y)
+            self._x, self._font, self._leading = x, None, 0.0
+        elif x != self._x:
+            t.moveCursor(x - self._x, 0)
+            self._x = x
+        if self._font != font:
+            t.setFont(*font)
+            self._font = font
+        if self._leading != advance:
+            t.setLeading(advance)
+            self._leading = advance
+        t.textLine(text)
+        self.y -= advance
+
+    def _skip(self, dy: float) -> None:
+        if self._text is not None:
+            self._text.moveCursor(0, dy)
+        self.y -= dy
+
+    def heading(self, text: str, level: int = 2) -> None:
+        self._line(MARGIN, text, HEADING_FONTS[level], 1.2 * cm if level == 1 else 0.8 * cm)
+
+    def lines(self, lines: List[str], indent: int = 0) -> None:
+        x = MARGIN + indent * 0.5 * cm
+        max_width = WIDTH - MARGIN - x
+        font, size = BODY_FONT
+        for line in lines:
+            if not line:
+                self._skip(0.4 * cm)
+                continue
+            for part in wrap_text(line, font, size, max_width):
+                self._line(x, part, BODY_FONT, 0.5 * cm)
+
+    def gap(self) -> None:
+        self.lines([""])
+
+
+def _safe_list(data: Dict[str, Any], key: str) -> List[Any]:
+    items = data.get(key, [])
+    return items if isinstance(items, list) else []
+
+
+def _draw(w: _Writer, data: Dict[str, Any]) -> None:
+    w.title_page(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    w.heading("Query")
+    w.lines([data.get('query', 'No query provided'), ""])
+
+    sources = data.get("sources", {})
+    if isinstance(sources, dict) and sources:
+        w.heading("Data Sources")
+        lines = []
+        for label, key in [
+            ("Publications", "publications"),
+            ("Clinical Trials", "trials"),
+            ("Patents", "patents"),
+            ("Market (IQVIA)", "iqvia"),
+            ("EXIM", "exim"),
+            ("Internal Knowledge", "internal_docs"),
+            ("Web Intelligence", "web_intel"),
+        ]:
+            meta = sources.get(key)
+            if isinstance(meta, dict) and meta.get("source"):
+                lines.append(f"{label}: {meta.get('source')}")
+        generated_at = sources.get("generated_at")
+        if isinstance(generated_at, str) and generated_at:
+            lines.append(f"Generated at: {generated_at}")
+        if lines:
+            w.lines(lines + [""], 1)
+
+    sections = [
+        ("publications", "Publications", lambda p: f"{p.get('title', 'No title')} — {p.get('journal', 'No journal')} ({p.get('year', 'N/A')})"),
+        ("trials", "Clinical Trials", lambda t: f"{t.get('nct_id', 'NCTXXXX')} — {t.get('title', 'No title')} [{t.get('phase', 'Phase N/A')}] ({t.get('status', 'Status N/A')})"),
+        ("patents", "Patents", lambda p: f"{p.get('patent_number', 'N/A')} — {p.get('title', 'No title')} (exp: {p.get('expiry', 'N/A')})"),
+    ]
+    for key, title, formatter in sections:
+        items = _safe_list(data, key)
+        if items:
+            w.heading(title)
+            w.lines([formatter(item) for item in items], 1)
+            w.gap()
+
+    landscape = data.get("trial_landscape")
+    if isinstance(landscape, dict) and landscape:
+        w.heading("Trial Landscape")
+        for key, ls in landscape.items():
+            lines = [f"{key}: {ls.get('total', 'N/A')} registered trials, {ls.get('active', 'N/A')} active"]
+            if ls.get("truncated"):
+                lines.append(f"(stats cover the first {ls.get('scanned')} studies)")
+            phases = ls.get("phases") or {}
+            if phases:
+                lines.append("Phases: " + ", ".join(f"{p} {n}" for p, n in phases.items()))
+            statuses = ls.get("statuses") or {}
+            if statuses:
+                lines.append("Status: " + ", ".join(f"{st} {n}" for st, n in statuses.items()))
+            sponsors = ls.get("top_sponsors") or []
+            if sponsors:
+                lines.append("Top sponsors: " + ", ".join(f"{sp.get('name')} ({sp.get('count')})" for sp in sponsors[:5]))
+            w.lines(lines + [""], 1)
+
+    iqvia = data.get("iqvia", {})
+    if iqvia:
+        w.heading("Market Insights (IQVIA)")
+        lines = []
+        if 'therapy_area' in iqvia:
+            lines.append(f"Therapy Area: {iqvia['therapy_area']}")
+        if 'cagr' in iqvia:
+            lines.append(f"CAGR: {iqvia['cagr']}%")
+        if 'market_size' in iqvia:
+            lines.append(f"Market Size: ${iqvia['market_size']}M")
+        competitors = iqvia.get('competitors', [])
+        if competitors:
+            lines.append("")
+            lines.append("Key Competitors:")
+            for comp in competitors[:5]:  # Limit to top 5
+                lines.append(f"- {comp.get('name', 'N/A')}: {(comp.get('market_share') or 0) * 100:.1f}%")
+        w.lines(lines, 1)
+        w.gap()
+
+    exim = data.get("exim", {})
+    if exim:
+        w.heading("EXIM Trends")
+        lines = []
+        if exim.get('import_dependency') is not None:
+            lines.append(f"Import Dependency: {exim['import_dependency'] * 100:.1f}%")
+        exporters = exim.get('top_exporters', [])
+        if exporters:
+            lines.append("")
+            lines.append("Top Exporting Countries:")
+            for exp in exporters[:5]:  # Limit to top 5
+                lines.append(f"- {exp.get('country', 'N/A')}: {exp.get('share', 'N/A')}")
+        w.lines(lines, 1)
+        w.gap()
+
+    internal_docs = _safe_list(data, "internal_docs")
+    if internal_docs:
+        w.heading("Internal Knowledge")
+        w.lines([f"- {doc.get('title', 'No title')}: {doc.get('summary', 'No summary')[:100]}" for doc in internal_docs], 1)
+        w.gap()
+
+    web_intel = _safe_list(data, "web_intel")
+    if web_intel:
+        w.heading("Web Intelligence")
+        w.lines([f"- {item.get('source', 'Source')}: {item.get('summary', 'No summary')[:100]}" for item in web_intel[:5]], 1)
+        w.gap()
+
+    insights = _safe_list(data, "insights")
+    if insights:
+        w.heading("Key Insights")
+        w.lines([f"• {insight}" for insight in insights], 1)
+
+
+def render_report(data: Dict[str, Any]) -> bytes:
+    """Render the report PDF into memory and return its bytes."""
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    try:
+        writer = _Writer(c)
+        _draw(writer, data)
+        writer.flush()
         c.showPage()
         c.save()
-        print(f"Successfully generated report at: {path}")
-        
-    except Exception as e:
-        print(f"Error generating report: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error generating report")
         raise
+    return buf.getvalue()
+
+
+def build_report(data: Dict[str, Any], path: str):
+    pdf = render_report(data)
+    with open(path, "wb") as f:
+        f.write(pdf)
+    logger.debug("Generated report at %s (%d bytes)", path, len(pdf))
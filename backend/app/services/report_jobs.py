@@ -0,0 +1,159 @@
+import asyncio
+import cProfile
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from .metrics import REPORT_RENDER, REPORTS
+from .report import build_report, render_report
+from .report_store import REPORTS_DIR, report_path, report_store
+
+
+logger = logging.getLogger(__name__)
+
+
+def _render(data: Dict[str, Any], path: str, profile_path: Optional[str] = None) -> float:
+    """Worker-process entry point: render to a temp file and move it into place atomically.
+
+    With `profile_path` the render runs under cProfile and its stats are written there.
+    """
+    started = time.perf_counter()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    prof = cProfile.Profile() if profile_path else None
+    try:
+        if prof is not None:
+            prof.enable()
+        build_report(data, tmp)
+        os.replace(tmp, path)
+    finally:
+        if prof is not None:
+            prof.disable()
+            os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+            prof.dump_stats(profile_path)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return time.perf_counter() - started
+
+
+class ReportQueue:
+    """Bounded queue of PDF render jobs executed on a process pool (reportlab is CPU-bound)."""
+
+    def __init__(self, workers: int, max_pending: int, max_tracked: int = 1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_tracked = max_tracked
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._render_s_total = 0.0
+        self._max_depth = 0
+        self._inline = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def pending(self) -> int:
+        return len(self._futures) + self._inline
+
+    async def render_inline(self, data: Dict[str, Any]) -> Optional[bytes]:
+        """Render on the pool straight to bytes (no file), sharing the queue bound; None when full."""
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                self._counters["rejected"] += 1
+                return None
+            self._inline += 1
+            fut = self._executor().submit(render_report, data)
+        started = time.perf_counter()
+        try:
+            pdf = await asyncio.wrap_future(fut)
+            REPORT_RENDER.observe(time.perf_counter() - started, mode="inline")
+            return pdf
+        finally:
+            with self._lock:
+                self._inline -= 1
+
+    def submit(self, report_id: str, data: Dict[str, Any], profile_path: Optional[str] = None) -> str:
+        """Queue a render; returns "queued" (also when the same report is already in flight), or "rejected" when full.
+
+        `profile_path` asks the worker to cProfile the render into that file (not when deduplicated).
+        """
+        with self._lock:
+            if report_id in self._futures:
+                return "queued"
+            if self.pending() >= self.max_pending:
+                self._counters["rejected"] += 1
+                return "rejected"
+            os.makedirs(REPORTS_DIR, exist_ok=True)
+            fut = self._executor().submit(_render, data, report_path(report_id), profile_path)
+            self._futures[report_id] = fut
+            self._jobs[report_id] = {"status": "queued", "submitted_at": time.time()}
+            self._counters["submitted"] += 1
+            self._max_depth = max(self._max_depth, len(self._futures))
+            while len(self._jobs) > self.max_tracked:
+                self._jobs.popitem(last=False)
+        fut.add_done_callback(lambda f: self._finish(report_id, f))
+        return "queued"
+
+    def _finish(self, report_id: str, fut: Future) -> None:
+        with self._lock:
+            self._futures.pop(report_id, None)
+            job = self._jobs.get(report_id, {})
+            job["finished_at"] = time.time()
+            try:
+                render_s = fut.result()
+                self._render_s_total += render_s
+                REPORT_RENDER.observe(render_s, mode="queued")
+                report_store.add(report_id)
+                job["status"] = "ready"
+                self._counters["completed"] += 1
+                REPORTS.inc(outcome="completed")
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                self._counters["failed"] += 1
+                REPORTS.inc(outcome="failed")
+                logger.warning("Report %s failed to render: %s", report_id, e)
+
+    def status(self, report_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(report_id)
+            if job is None:
+                return None
+            out = {"report_id": report_id, **job}
+            fut = self._futures.get(report_id)
+        if fut is not None and fut.running():
+            out["status"] = "rendering"
+        if out["status"] in ("queued", "rendering"):
+            out["waiting_s"] = round(time.time() - out["submitted_at"], 2)
+        return out
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self._counters["completed"]
+            return {
+                **self._counters,
+                "pending": self.pending(),
+                "max_pending": self.max_pending,
+                "max_depth_seen": self._max_depth,
+                "workers": self.workers,
+                "avg_render_s": round(self._render_s_total / completed, 3) if completed else None,
+            }
+
+    async def shutdown(self) -> None:
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=False)
+
+
+report_queue = ReportQueue(
+    workers=int(os.getenv("REPORT_WORKERS", "2")),
+    max_pending=int(os.getenv("REPORT_QUEUE_MAX", "32")),
+)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+REPORTS_DIR = os.path.join(os.path.dirname(__file__), "..", "storage", "reports")
+INDEX_PATH = os.path.join(REPORTS_DIR, "index.json")
+
+# Keys whose values change between otherwise identical answers and must not affect the report id.
+_VOLATILE_KEYS = frozenset(
+    {"generated_at", "fetched_at", "cache", "cache_age_s", "session", "session_age_s", "timing", "timings"}
+)
+
+# Names the store manages. PDFs saved under random uuids before content ids are never indexed or
+# evicted; they are still served by id (see legacy_report_path).
+_CONTENT_ID_RE = re.compile(r"[0-9a-f]{32}")
+_LEGACY_ID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+logger = logging.getLogger(__name__)
+
+
+def report_path(report_id: str) -> str:
+    return os.path.join(REPORTS_DIR, f"{report_id}.pdf")
+
+
+def legacy_report_path(report_id: str) -> Optional[str]:
+    """Path of a uuid-named PDF from before content ids, if there is one."""
+    if not _LEGACY_ID_RE.fullmatch(report_id):
+        return None
+    path = report_path(report_id)
+    return path if os.path.isfile(path) else None
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def content_id(report_data: Dict[str, Any]) -> str:
+    """Report id derived from the canonicalized report_data, so identical evidence maps to one PDF."""
+    canonical = json.dumps(_canonical(report_data), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class ReportStore:
+    """Index of rendered PDFs (report id -> size and timestamps) with size/age-based eviction.
+
+    The index lives in memory and is persisted to index.json, so lookups never touch the
+    directory. Without an index file the directory is scanned once to rebuild it. Only
+    content-id named PDFs are indexed, so eviction never touches any other file.
+    """
+
+    def __init__(self, max_bytes: int, max_age_s: float):
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._entries: Optional[Dict[str, Dict[str, float]]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _index(self) -> Dict[str, Dict[str, float]]:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(INDEX_PATH, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            entries: Dict[str, Dict[str, float]] = {rid: e for rid, e in loaded.items() if _CONTENT_ID_RE.fullmatch(rid)}
+            if len(entries) != len(loaded):
+                self._dirty = True  # drop entries an earlier rebuild took from legacy files
+            return entries
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError):
+            logger.warning("Report index unreadable; rebuilding from %s", REPORTS_DIR, exc_info=True)
+        entries = {}
+        if os.path.isdir(REPORTS_DIR):
+            for entry in os.scandir(REPORTS_DIR):
+                if entry.is_file() and entry.name.endswith(".pdf") and _CONTENT_ID_RE.fullmatch(entry.name[:-4]):
+                    st = entry.stat()
+                    entries[entry.name[:-4]] = {"size": st.st_size, "created_at": st.st_mtime, "accessed_at": st.st_mtime}
+        self._dirty = True
+        return entries
+
+    def _save(self) -> None:
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        tmp = f"{INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index(), f, separators=(",", ":"))
+        os.replace(tmp, INDEX_PATH)
+        self._dirty = False
+
+    def has(self, report_id: str) -> bool:
+        with self._lock:
+            return report_id in self._index()
+
+    def touch(self, report_id: str) -> bool:
+        """Mark a report as accessed; returns False if it is not in the store."""
+        with self._lock:
+            entry = self._index().get(report_id)
+            if entry is None:
+                return False
+            entry["accessed_at"] = time.time()
+            self._dirty = True
+            return True
+
+    def add(self, report_id: str) -> None:
+        """Register a freshly rendered PDF and evict what no longer fits."""
+        size = os.path.getsize(report_path(report_id))
+        now = time.time()
+        with self._lock:
+            self._index()[report_id] = {"size": size, "created_at": now, "accessed_at": now}
+            self._evict()
+            self._save()
+
+    def _evict(self) -> None:
+        entries = self._index()
+        now = time.time()
+        doomed = [rid for rid, e in entries.items() if now - e["accessed_at"] > self.max_age_s]
+        total = sum(e["size"] for rid, e in entries.items() if rid not in doomed)
+        for rid in sorted(entries, key=lambda r: entries[r]["accessed_at"]):
+            if total <= self.max_bytes:
+                break
+            if rid not in doomed:
+                doomed.append(rid)
+                total -= entries[rid]["size"]
+        for rid in doomed:
+            entries.pop(rid, None)
+            try:
+                os.remove(report_path(rid))
+            except FileNotFoundError:
+                pass
+        if doomed:
+            self._dirty = True
+            logger.info("Evicted %d report(s)", len(doomed))
+
+    def maintain(self) -> None:
+        """Apply eviction and persist pending index changes (startup, shutdown)."""
+        with self._lock:
+            self._evict()
+            if self._dirty:
+                self._save()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._index()
+            return {
+                "reports": len(entries),
+                "bytes": sum(e["size"] for e in entries.values()),
+                "max_bytes": self.max_bytes,
+                "max_age_s": self.max_age_s,
+            }
+
+
+report_store = ReportStore(
+    max_bytes=int(os.getenv("REPORTS_MAX_BYTES", str(512 * 1024 * 1024))),
+    max_age_s=float(os.getenv("REPORTS_MAX_AGE_S", str(14 * 24 * 3600))),
+)
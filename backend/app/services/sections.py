@@ -0,0 +1,14 @@
+from typing import Dict
+
+
+# Result key each agent publishes its payload under (used for deadline fallbacks, prompt packing and
+# batch reports). Kept apart from the orchestrator so services can read it without importing the graph.
+AGENT_SECTIONS: Dict[str, str] = {
+    "web_search": "publications",
+    "trials": "trials",
+    "patent": "patents",
+    "iqvia": "iqvia",
+    "exim": "exim",
+    "internal_knowledge": "internal_docs",
+    "web_intel": "web_intel",
+}
@@ -0,0 +1,58 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import MemoryBackend
+
+
+def molecules_key(molecules: List[str]) -> str:
+    return "|".join(molecules)
+
+
+class SessionStore:
+    """Per-conversation memory of agent results, so follow-up turns only fetch what is missing.
+
+    A session holds the conversation's last molecules and, per molecule set, each agent's latest
+    result with the time it was fetched. Sessions expire after `ttl_s` of inactivity; individual
+    results are reused for `result_ttl_s`.
+    """
+
+    def __init__(self, max_sessions: int, ttl_s: float, result_ttl_s: float):
+        self.result_ttl_s = result_ttl_s
+        self._backend = MemoryBackend(max_sessions, ttl_s)
+
+    def load(self, conversation_id: Optional[str]) -> Dict[str, Any]:
+        if not conversation_id:
+            return {}
+        entry = self._backend.get(conversation_id)
+        return entry[1] if entry is not None else {}
+
+    def fresh_results(self, session: Dict[str, Any], molecules: List[str]) -> Dict[str, Tuple[float, Dict[str, Any]]]:
+        """agent -> (fetched_at epoch, result) for results of these molecules still within result_ttl_s."""
+        now = time.time()
+        results = session.get("results", {}).get(molecules_key(molecules), {})
+        return {agent: entry for agent, entry in results.items() if now - entry[0] <= self.result_ttl_s}
+
+    def save(
+        self,
+        conversation_id: Optional[str],
+        session: Dict[str, Any],
+        molecules: List[str],
+        fetched: Dict[str, Dict[str, Any]],
+    ) -> None:
+        """Record this turn's molecules and the results its agents fetched (reused ones keep their age)."""
+        if not conversation_id:
+            return
+        now = time.time()
+        by_molecules = dict(session.get("results", {}))
+        results = dict(by_molecules.get(molecules_key(molecules), {}))
+        results.update({agent: (now, res) for agent, res in fetched.items()})
+        by_molecules[molecules_key(molecules)] = results
+        self._backend.set(conversation_id, {"molecules": list(molecules), "results": by_molecules})
+
+
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_CONVERSATIONS", "1000")),
+    ttl_s=float(os.getenv("SESSION_TTL_S", "1800")),
+    result_ttl_s=float(os.getenv("SESSION_RESULT_TTL_S", "600")),
+)
@@ -0,0 +1,164 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..mock_data.loader import KNOWN_KEYS
+
+
+_VECTOR_DIR = os.path.join(os.path.dirname(__file__), "..", "storage", "index")
+# Stored term-major, (dim, passages): a query only reads the rows of its own few buckets.
+_MATRIX_PATH = os.path.join(_VECTOR_DIR, "passages.terms.f32.npy")
+_META_PATH = os.path.join(_VECTOR_DIR, "passages.vectors.json")
+
+logger = logging.getLogger(__name__)
+
+_ALIASES: Dict[str, List[str]] = {
+    alias: aliases for aliases in KNOWN_KEYS.values() for alias in aliases
+}
+_CANONICAL: Dict[str, str] = {
+    alias: key for key, aliases in KNOWN_KEYS.items() for alias in aliases
+}
+
+
+def _np():
+    """Import NumPy on demand; hybrid retrieval is optional and NumPy is not a hard dependency."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def available() -> bool:
+    return _np() is not None
+
+
+def _dim() -> int:
+    return int(os.getenv("RAG_VECTOR_DIM", "256"))
+
+
+def _features(text: str, dim: int) -> Dict[int, float]:
+    """Signed hashed term weights for text (feature hashing keeps the vocabulary unbounded at a fixed width).
+
+    The sign bit makes unrelated terms that share a bucket cancel out on average instead of always
+    adding similarity. Brand and molecule aliases collapse onto the molecule key, so "viagra" and
+    "sildenafil" share a feature.
+    """
+    counts: Dict[int, int] = {}
+    for tok in re.findall(r"[a-z0-9]+", text.lower()):
+        h = zlib.crc32(_CANONICAL.get(tok, tok).encode("utf-8"))
+        bucket = h % dim
+        counts[bucket] = counts.get(bucket, 0) + (1 if h & 0x80000000 else -1)
+    return {b: math.copysign(1.0 + math.log(abs(c)), c) for b, c in counts.items() if c}
+
+
+def expand_aliases(tokens: Sequence[str]) -> List[str]:
+    """Add every known brand/molecule alias of any alias present in the tokens."""
+    out = list(tokens)
+    for tok in tokens:
+        for alias in _ALIASES.get(tok, []):
+            if alias not in out:
+                out.append(alias)
+    return out
+
+
+def build(ids: List[str], texts: List[str]) -> None:
+    """Embed passages into an L2-normalized, IDF-weighted float32 matrix and write it to disk, transposed."""
+    global _loaded
+    np = _np()
+    if np is None:
+        return
+    dim = _dim()
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for bucket, weight in _features(text, dim).items():
+            matrix[row, bucket] = weight
+
+    df = np.count_nonzero(matrix, axis=0)
+    idf = (np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0).astype(np.float32)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.maximum(norms, 1e-12)
+
+    os.makedirs(_VECTOR_DIR, exist_ok=True)
+    matrix_tmp = _MATRIX_PATH + ".tmp.npy"
+    np.save(matrix_tmp, np.ascontiguousarray(matrix.T))
+    meta_tmp = _META_PATH + ".tmp"
+    with open(meta_tmp, "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "ids": ids, "idf": idf.tolist()}, f, separators=(",", ":"))
+    # Swap both files under the lock so _load() never pairs a new matrix with old ids. Searches keep
+    # the snapshot they already hold; the next _load() maps the new files.
+    with _load_lock:
+        os.replace(matrix_tmp, _MATRIX_PATH)
+        os.replace(meta_tmp, _META_PATH)
+        _loaded = None
+    try:
+        os.remove(os.path.join(_VECTOR_DIR, "passages.f32.npy"))  # passage-major layout of earlier versions
+    except FileNotFoundError:
+        pass
+
+
+def exists() -> bool:
+    return os.path.exists(_MATRIX_PATH) and os.path.exists(_META_PATH)
+
+
+# Snapshot loaded by _load(): "matrix" (memory-mapped), "ids", "idf", "dim". Never mutated once
+# published; build() drops the reference and the next _load() publishes a new dict.
+_loaded: Optional[Dict[str, Any]] = None
+_load_lock = threading.Lock()
+
+
+def _load() -> Optional[Dict[str, Any]]:
+    global _loaded
+    np = _np()
+    if np is None:
+        return None
+    with _load_lock:
+        if _loaded is None and exists():
+            with open(_META_PATH, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            _loaded = {
+                "matrix": np.load(_MATRIX_PATH, mmap_mode="r"),
+                "ids": meta["ids"],
+                "idf": np.asarray(meta["idf"], dtype=np.float32),
+                "dim": meta["dim"],
+            }
+        return _loaded
+
+
+def search(query_tokens: Sequence[str], k: int) -> List[Tuple[float, str]]:
+    """Cosine top-k over passage vectors. Returns (similarity, passage id).
+
+    The query vector has one non-zero bucket per distinct term, so the dot products only need those
+    rows of the term-major matrix: a handful of contiguous reads instead of a scan of every
+    passage's full vector.
+    """
+    state = _load()
+    if state is None or not query_tokens:
+        return []
+    np = _np()
+    matrix, ids, idf, dim = state["matrix"], state["ids"], state["idf"], state["dim"]
+    if not len(ids):
+        return []
+
+    q = np.zeros(dim, dtype=np.float32)
+    for bucket, weight in _features(" ".join(query_tokens), dim).items():
+        q[bucket] = weight
+    q *= idf
+    norm = float(np.linalg.norm(q))
+    if norm == 0.0:
+        return []
+    q /= norm
+
+    min_sim = float(os.getenv("RAG_VECTOR_MIN_SIM", "0.1"))
+    nz = np.flatnonzero(q)
+    sims = q[nz] @ matrix[nz]
+    k = min(k, len(ids))
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    return [(float(sims[i]), ids[i]) for i in top if sims[i] >= min_sim]
@@ -0,0 +1,65 @@
+import json
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+
+from ..mock_data.loader import detect_key
+
+
+def utcnow_iso() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def resolve_keys(query: str, keys: Optional[List[str]]) -> List[str]:
+    """Molecule keys an agent should cover: the planner's list, else the single key detected in the query."""
+    return list(keys) if keys else [detect_key(query)]
+
+
+def molecule_result(
+    section: str,
+    keys: List[str],
+    by_molecule: Dict[str, Any],
+    metas: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Shape per-molecule agent output into the usual {section, _meta} result.
+
+    List sections are concatenated in molecule order, dropping items shared between molecules
+    (e.g. a head-to-head publication); dict sections (iqvia, exim) keep the first
+    molecule's value at the top level. With more than one molecule the per-molecule values and
+    metadata are kept under "by_molecule", and the top-level _meta summarizes them so consumers
+    reading only _meta still see a partial fallback: every fallback reason, the shared cache
+    outcome ("mixed" when molecules differ or only some went through the cache) and the oldest
+    fetch time.
+    """
+    first = by_molecule[keys[0]]
+    if isinstance(first, list):
+        seen = set()
+        combined: Any = []
+        for k in keys:
+            for item in by_molecule[k]:
+                ident = json.dumps(item, sort_keys=True, default=str)
+                if ident not in seen:
+                    seen.add(ident)
+                    combined.append(item)
+    else:
+        combined = first
+
+    if len(keys) == 1:
+        return {section: combined, "_meta": metas[keys[0]]}
+
+    per = [metas[k] for k in keys]
+    meta: Dict[str, Any] = {
+        "source": "+".join(dict.fromkeys(m["source"] for m in per)),
+        "fetched_at": min((m["fetched_at"] for m in per if m.get("fetched_at")), default=None) or utcnow_iso(),
+        "molecules": keys,
+        "by_molecule": metas,
+    }
+    reasons = list(dict.fromkeys(m["fallback_reason"] for m in per if m.get("fallback_reason")))
+    if reasons:
+        meta["fallback_reason"] = "+".join(reasons)
+    outcomes = list(dict.fromkeys(m.get("cache") for m in per))
+    if outcomes != [None]:
+        meta["cache"] = outcomes[0] if len(outcomes) == 1 else "mixed"
+        ages = [m["cache_age_s"] for m in per if m.get("cache_age_s") is not None]
+        if ages:
+            meta["cache_age_s"] = max(ages)
+    return {section: combined, "by_molecule": by_molecule, "_meta": meta}
@@ -1,24 +1,22 @@
-from typing import Dict, Any
-from datetime import datetime
+from typing import Dict, Any, List, Optional
 
-from ..mock_data.loader import load_mock
+from ..mock_data.loader import get_dataset
 from ..services.rag import retrieve_internal_docs
+from .common import molecule_result, resolve_keys, utcnow_iso
 
 
-def internal_knowledge_agent(query: str) -> Dict[str, Any]:
+def internal_knowledge_agent(query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
     try:
         docs = retrieve_internal_docs(query, k=3)
         if docs:
             return {
                 "internal_docs": docs,
-                "_meta": {"source": "local_internal_docs", "fetched_at": datetime.utcnow().isoformat() + "Z"},
+                "_meta": {"source": "local_internal_docs", "fetched_at": utcnow_iso()},
             }
     except Exception:
         pass
 
-    data = load_mock(query)
-    internal_docs = data.get("internal_docs", [])
-    return {
-        "internal_docs": internal_docs,
-        "_meta": {"source": "mock", "fetched_at": datetime.utcnow().isoformat() + "Z"},
-    }
+    keys = resolve_keys(query, keys)
+    by_molecule = {k: get_dataset(k).get("internal_docs", []) for k in keys}
+    metas = {k: {"source": "mock", "fetched_at": utcnow_iso()} for k in keys}
+    return molecule_result("internal_docs", keys, by_molecule, metas)
@@ -1,12 +1,10 @@
-from typing import Dict, Any
-from datetime import datetime
-from ..mock_data.loader import load_mock
+from typing import Dict, Any, List, Optional
+from ..mock_data.loader import get_dataset
+from .common import molecule_result, resolve_keys, utcnow_iso
 
 
-def iqvia_agent(query: str) -> Dict[str, Any]:
-    data = load_mock(query)
-    iqvia = data.get("iqvia", {})
-    return {
-        "iqvia": iqvia,
-        "_meta": {"source": "mock", "fetched_at": datetime.utcnow().isoformat() + "Z"},
-    }
+def iqvia_agent(query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+    keys = resolve_keys(query, keys)
+    by_molecule = {k: get_dataset(k).get("iqvia", {}) for k in keys}
+    metas = {k: {"source": "mock", "fetched_at": utcnow_iso()} for k in keys}
+    return molecule_result("iqvia", keys, by_molecule, metas)
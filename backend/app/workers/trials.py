@@ -1,109 +1,229 @@
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import logging
 import os
+import time
 
-import httpx
+from ..mock_data.loader import get_dataset
+from ..services.http import upstream_request
+from ..services.limits import CircuitOpenError
+from ..services.cache import evidence_cache, normalize_key
+from ..services.ctgov_mirror import TrialLandscape, mirror, parse_study
+from .common import molecule_result, resolve_keys, utcnow_iso
 
-from ..mock_data.loader import load_mock
-from ..mock_data.loader import detect_key
 
+_CACHE = evidence_cache("ctgov")
 
-def _first_str(v: Any) -> Optional[str]:
-    if isinstance(v, str) and v.strip():
-        return v.strip()
-    if isinstance(v, list) and v:
-        for item in v:
-            if isinstance(item, str) and item.strip():
-                return item.strip()
-    return None
+# The only study fields the trial list and landscape read; keeps landscape pages small.
+_LANDSCAPE_FIELDS = ",".join([
+    "NCTId", "OrgStudyId", "BriefTitle", "OfficialTitle", "OverallStatus", "Phase", "LeadSponsorName", "CompletionDate",
+])
 
+logger = logging.getLogger(__name__)
 
-def _ctgov_fetch(query: str, page_size: int = 5) -> List[Dict[str, Any]]:
+
+async def _ctgov_fetch(query: str, page_size: int = 5) -> List[Dict[str, Any]]:
     term = query.strip()
     if not term:
         return []
 
     timeout_s = float(os.getenv("CTGOV_TIMEOUT_S", "10"))
 
-    with httpx.Client(timeout=timeout_s) as client:
-        r = client.get(
-            "https://clinicaltrials.gov/api/v2/studies",
-            params={
-                "query.term": term,
-                "pageSize": str(page_size),
-                "countTotal": "false",
-            },
-        )
-        r.raise_for_status()
-        data = r.json()
+    r = await upstream_request(
+        "ctgov",
+        "GET",
+        "/studies",
+        params={
+            "query.term": term,
+            "pageSize": str(page_size),
+            "countTotal": "false",
+        },
+        timeout=timeout_s,
+    )
+    data = r.json()
 
     studies = data.get("studies", [])
     if not isinstance(studies, list):
         return []
 
-    out: List[Dict[str, Any]] = []
-    for s in studies:
-        ps = (s or {}).get("protocolSection", {})
-        idmod = (ps or {}).get("identificationModule", {})
-        statusmod = (ps or {}).get("statusModule", {})
-        designmod = (ps or {}).get("designModule", {})
-        sponsmod = (ps or {}).get("sponsorCollaboratorsModule", {})
-
-        nct = _first_str(idmod.get("nctId")) or _first_str(idmod.get("orgStudyId"))
-        title = _first_str(idmod.get("briefTitle")) or _first_str(idmod.get("officialTitle"))
-        status = _first_str(statusmod.get("overallStatus"))
-        phases = designmod.get("phases")
-        phase = _first_str(phases)
-
-        sponsor = None
-        lead = sponsmod.get("leadSponsor")
-        if isinstance(lead, dict):
-            sponsor = _first_str(lead.get("name"))
-
-        completion_date = None
-        cds = statusmod.get("completionDateStruct")
-        if isinstance(cds, dict):
-            completion_date = _first_str(cds.get("completionDate"))
-
-        if not nct or not title:
-            continue
-
-        out.append(
-            {
-                "nct_id": nct,
-                "title": title,
-                "status": status or "N/A",
-                "phase": phase or "N/A",
-                "completion_date": completion_date or "N/A",
-                "sponsor": sponsor or "N/A",
-                "url": f"https://clinicaltrials.gov/study/{nct}",
-            }
+    return [t for t in (parse_study(s) for s in studies) if t is not None]
+
+
+async def _cached_ctgov_fetch(term: str, page_size: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    try:
+        return await _CACHE.get_or_fetch(
+            normalize_key(term, page_size),
+            lambda: _ctgov_fetch(term, page_size=page_size),
         )
+    except CircuitOpenError:
+        return [], {"fallback_reason": "circuit_open"}
+    except Exception:
+        return [], {"fallback_reason": "upstream_error"}
+
+
+def _landscape_budget_s() -> float:
+    """Time a landscape scan may take: CTGOV_LANDSCAPE_BUDGET_S, else 1s inside the trials agent deadline."""
+    # Same settings as the orchestrator's per-agent deadline, which cancels the whole agent.
+    deadline_s = float(os.getenv("AGENT_DEADLINE_TRIALS_S", os.getenv("AGENT_DEADLINE_S", "12")))
+    return float(os.getenv("CTGOV_LANDSCAPE_BUDGET_S", max(deadline_s - 1, 0.5)))
 
+
+async def _ctgov_landscape(term: str, top_n: int) -> Dict[str, Any]:
+    """Walk every result page for the term, keeping the top_n trials and folding the rest into landscape stats.
+
+    Pages are requested with only the fields we read. The next page is fetched while the current one
+    is folded, so at most two pages are held at a time whatever the number of studies.
+
+    Each page gets CTGOV_LANDSCAPE_PAGE_TIMEOUT_S, cut to what is left of the scan budget, and no page
+    is started once the budget is spent: the scan ends truncated before the agent deadline cancels it.
+    A scan cut short by an error or the budget is flagged "interrupted" so it is cached only briefly.
+    """
+    term = term.strip()
+    if not term:
+        return {}
+    page_size = os.getenv("CTGOV_LANDSCAPE_PAGE_SIZE", "1000")
+    max_pages = int(os.getenv("CTGOV_LANDSCAPE_MAX_PAGES", "10"))
+    page_timeout_s = float(os.getenv("CTGOV_LANDSCAPE_PAGE_TIMEOUT_S", os.getenv("CTGOV_TIMEOUT_S", "10")))
+    budget_s = _landscape_budget_s()
+    stop_at = time.monotonic() + budget_s
+    acc = TrialLandscape(int(os.getenv("CTGOV_LANDSCAPE_MAX_SPONSORS", "1000")))
+    params = {"query.term": term, "pageSize": page_size, "fields": _LANDSCAPE_FIELDS}
+
+    async def fetch_page(token: Optional[str], timeout_s: float) -> Dict[str, Any]:
+        page = dict(params, pageToken=token, countTotal="false") if token else dict(params, countTotal="true")
+        r = await upstream_request("ctgov", "GET", "/studies", params=page, timeout=timeout_s)
+        return r.json()
+
+    top: List[Dict[str, Any]] = []
+    total: Optional[int] = None
+    truncated = interrupted = False
+    pages = 0
+    pending: Optional[asyncio.Future] = asyncio.ensure_future(fetch_page(None, min(page_timeout_s, budget_s)))
+    try:
+        while pending is not None:
+            try:
+                data = await pending
+            except Exception:
+                if pages == 0:
+                    raise
+                logger.warning("CT.gov landscape for %r stopped after %d page(s)", term, pages, exc_info=True)
+                truncated = interrupted = True
+                break
+            pages += 1
+            if total is None and isinstance(data.get("totalCount"), int):
+                total = data["totalCount"]
+            token = data.get("nextPageToken")
+            pending = None
+            remaining_s = stop_at - time.monotonic()
+            if token and pages < max_pages and remaining_s > 0:
+                pending = asyncio.ensure_future(fetch_page(token, min(page_timeout_s, remaining_s)))
+            elif token:
+                if pages < max_pages:
+                    logger.warning("CT.gov landscape for %r ran out of time after %d page(s)", term, pages)
+                    interrupted = True
+                truncated = True
+            studies = data.get("studies")
+            for study in studies if isinstance(studies, list) else []:
+                trial = parse_study(study)
+                if trial is None:
+                    continue
+                if len(top) < top_n:
+                    top.append(trial)
+                acc.add(trial["phase"], trial["status"], trial["sponsor"])
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+    out = {"trials": top, "landscape": acc.to_dict(total=total, truncated=truncated)}
+    if interrupted:
+        out["interrupted"] = True
     return out
 
 
-def trials_agent(query: str) -> Dict[str, Any]:
-    page_size = int(os.getenv("CTGOV_PAGE_SIZE", "5"))
-    key = detect_key(query)
-    term = key if key != "generic" else query
+def _partial_landscape(found: Dict[str, Any]) -> bool:
+    """Negative-cache test for scans: no trials, or a scan an error or the time budget cut short."""
+    return not found.get("trials") or bool(found.get("interrupted"))
+
+
+async def _cached_ctgov_landscape(term: str, top_n: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     try:
-        trials = _ctgov_fetch(term, page_size=page_size)
-        if trials:
-            return {
-                "trials": trials,
-                "_meta": {
-                    "source": "clinicaltrials_gov_api",
-                    "fetched_at": datetime.utcnow().isoformat() + "Z",
-                    "query_term": term,
-                },
-            }
+        return await _CACHE.get_or_fetch(
+            normalize_key("landscape", term, top_n, os.getenv("CTGOV_LANDSCAPE_MAX_PAGES", "10")),
+            lambda: _ctgov_landscape(term, top_n),
+            negative=_partial_landscape,
+        )
+    except CircuitOpenError:
+        return {}, {"fallback_reason": "circuit_open"}
     except Exception:
-        pass
-
-    data = load_mock(query)
-    trials = data.get("trials", [])
-    return {
-        "trials": trials,
-        "_meta": {"source": "mock", "fetched_at": datetime.utcnow().isoformat() + "Z", "query_term": term},
-    }
+        return {}, {"fallback_reason": "upstream_error"}
+
+
+def _landscape_enabled() -> bool:
+    return os.getenv("CTGOV_LANDSCAPE", "0").strip().lower() in ("1", "true", "yes")
+
+
+def _mirror_mode() -> bool:
+    return os.getenv("CTGOV_MODE", "live").strip().lower() == "mirror"
+
+
+async def _mirror_trials(keys: List[str], terms: Dict[str, str], page_size: int, landscape: bool) -> Dict[str, Any]:
+    """Answer from the local CT.gov mirror; the live API is not called."""
+    def lookup() -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, Any]]]:
+        found = mirror.search_many([terms[k] for k in keys], page_size)
+        scans = [mirror.landscape(terms[k]) for k in keys] if landscape else []
+        return found, scans
+
+    scans: List[Dict[str, Any]] = []
+    try:
+        found, scans = await asyncio.to_thread(lookup)
+        reason = None if any(found) or mirror.available() else "mirror_empty"
+    except Exception:
+        logger.warning("CT.gov mirror lookup failed", exc_info=True)
+        found, reason = [[] for _ in keys], "mirror_error"
+
+    by_molecule: Dict[str, Any] = {}
+    metas: Dict[str, Dict[str, Any]] = {}
+    for k, trials in zip(keys, found):
+        if trials:
+            by_molecule[k] = trials
+            metas[k] = {"source": "clinicaltrials_gov_mirror", "fetched_at": utcnow_iso(), "query_term": terms[k]}
+        else:
+            by_molecule[k] = get_dataset(k).get("trials", [])
+            metas[k] = {"source": "mock", "fetched_at": utcnow_iso(), "query_term": terms[k]}
+            if reason:
+                metas[k]["fallback_reason"] = reason
+    result = molecule_result("trials", keys, by_molecule, metas)
+    if scans:
+        result["landscape"] = {k: scan for k, scan in zip(keys, scans) if scan["scanned"]}
+    return result
+
+
+async def trials_agent(query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+    page_size = int(os.getenv("CTGOV_PAGE_SIZE", "5"))
+    keys = resolve_keys(query, keys)
+    terms = {k: k if k != "generic" else query for k in keys}
+    landscape = _landscape_enabled()
+    if _mirror_mode():
+        return await _mirror_trials(keys, terms, page_size, landscape)
+    # One CT.gov lookup per molecule, fetched concurrently.
+    fetch = _cached_ctgov_landscape if landscape else _cached_ctgov_fetch
+    fetched = await asyncio.gather(*(fetch(terms[k], page_size) for k in keys))
+
+    by_molecule: Dict[str, Any] = {}
+    metas: Dict[str, Dict[str, Any]] = {}
+    landscapes: Dict[str, Dict[str, Any]] = {}
+    for k, (found, cache_meta) in zip(keys, fetched):
+        trials = found.get("trials", []) if landscape else found
+        if trials:
+            by_molecule[k] = trials
+            metas[k] = {"source": "clinicaltrials_gov_api", "fetched_at": utcnow_iso(), "query_term": terms[k], **cache_meta}
+            if landscape:
+                landscapes[k] = found["landscape"]
+        else:
+            by_molecule[k] = get_dataset(k).get("trials", [])
+            metas[k] = {"source": "mock", "fetched_at": utcnow_iso(), "query_term": terms[k]}
+            if cache_meta.get("fallback_reason"):
+                metas[k]["fallback_reason"] = cache_meta["fallback_reason"]
+    result = molecule_result("trials", keys, by_molecule, metas)
+    if landscapes:
+        result["landscape"] = landscapes
+    return result
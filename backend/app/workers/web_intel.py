@@ -1,12 +1,10 @@
-from typing import Dict, Any
-from datetime import datetime
-from ..mock_data.loader import load_mock
+from typing import Dict, Any, List, Optional
+from ..mock_data.loader import get_dataset
+from .common import molecule_result, resolve_keys, utcnow_iso
 
 
-def web_intel_agent(query: str) -> Dict[str, Any]:
-    data = load_mock(query)
-    web = data.get("web_intel", [])
-    return {
-        "web_intel": web,
-        "_meta": {"source": "mock", "fetched_at": datetime.utcnow().isoformat() + "Z"},
-    }
+def web_intel_agent(query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+    keys = resolve_keys(query, keys)
+    by_molecule = {k: get_dataset(k).get("web_intel", []) for k in keys}
+    metas = {k: {"source": "mock", "fetched_at": utcnow_iso()} for k in keys}
+    return molecule_result("web_intel", keys, by_molecule, metas)
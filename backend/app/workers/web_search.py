@@ -1,12 +1,17 @@
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import os
 import re
+import xml.etree.ElementTree as ET
 
-import httpx
+from ..mock_data.loader import get_dataset
+from ..services.http import upstream_request, upstream_stream
+from ..services.limits import CircuitOpenError
+from ..services.cache import evidence_cache, normalize_key
+from .common import molecule_result, resolve_keys, utcnow_iso
 
-from ..mock_data.loader import load_mock
-from ..mock_data.loader import detect_key
+
+_CACHE = evidence_cache("pubmed")
 
 
 def _extract_year(text: str) -> Optional[int]:
@@ -21,77 +26,249 @@ def _extract_year(text: str) -> Optional[int]:
         return None
 
 
-def _pubmed_fetch(query: str, retmax: int = 5) -> List[Dict[str, Any]]:
-    term = query.strip()
-    if not term:
-        return []
+def _parse_summary(pmid: str, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    title = (item.get("title") or "").strip().rstrip(".")
+    journal = (item.get("fulljournalname") or item.get("source") or "").strip()
+    pubdate = (item.get("pubdate") or item.get("sortpubdate") or "").strip()
+    year = _extract_year(pubdate)
+    if not title:
+        return None
+    return {
+        "pmid": pmid,
+        "title": title,
+        "journal": journal or "PubMed",
+        "year": year or "N/A",
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+    }
 
-    timeout_s = float(os.getenv("PUBMED_TIMEOUT_S", "8"))
 
-    with httpx.Client(timeout=timeout_s) as client:
-        esearch = client.get(
-            "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi",
-            params={"db": "pubmed", "term": term, "retmax": str(retmax), "retmode": "json"},
-        )
-        esearch.raise_for_status()
-        ids = (
-            esearch.json()
-            .get("esearchresult", {})
-            .get("idlist", [])
-        )
+async def _esearch(term: str, retmax: int, timeout_s: float) -> List[str]:
+    esearch = await upstream_request(
+        "pubmed",
+        "GET",
+        "/esearch.fcgi",
+        params={"db": "pubmed", "term": term, "retmax": str(retmax), "retmode": "json"},
+        timeout=timeout_s,
+    )
+    return (
+        esearch.json()
+        .get("esearchresult", {})
+        .get("idlist", [])
+    )
+
+
+async def _pubmed_fetch_many(queries: List[str], retmax: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+    """Search several terms in one round: concurrent esearches, then a single esummary for the union of PMIDs.
 
-        if not ids:
-            return []
+    Results are split back per term by PMID, keeping each term's relevance order.
+    """
+    terms = [q.strip() for q in queries]
+    timeout_s = float(os.getenv("PUBMED_TIMEOUT_S", "8"))
+
+    searchable = [t for t in dict.fromkeys(terms) if t]
+    id_lists = await asyncio.gather(*(_esearch(t, retmax, timeout_s) for t in searchable))
+    ids_by_term = dict(zip(searchable, id_lists))
 
-        esummary = client.get(
-            "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi",
-            params={"db": "pubmed", "id": ",".join(ids), "retmode": "json"},
+    all_ids = list(dict.fromkeys(pmid for ids in id_lists for pmid in ids))
+    summaries: Dict[str, Dict[str, Any]] = {}
+    if all_ids:
+        esummary = await upstream_request(
+            "pubmed",
+            "GET",
+            "/esummary.fcgi",
+            params={"db": "pubmed", "id": ",".join(all_ids), "retmode": "json"},
+            timeout=timeout_s,
         )
-        esummary.raise_for_status()
         data = esummary.json().get("result", {})
+        for pmid in all_ids:
+            pub = _parse_summary(pmid, data.get(pmid, {}))
+            if pub is not None:
+                summaries[pmid] = pub
+
+    return {
+        q: [summaries[pmid] for pmid in ids_by_term.get(t, []) if pmid in summaries]
+        for q, t in zip(queries, terms)
+    }
+
+
+def _text(elem: Optional[ET.Element]) -> str:
+    # Titles and abstracts carry inline markup (<i>, <sup>, ...); keep all of the text.
+    return " ".join("".join(elem.itertext()).split()) if elem is not None else ""
+
+
+def _parse_article(article: ET.Element) -> Optional[Dict[str, Any]]:
+    """Publication dict (with authors and abstract, like the mock samples) from one efetch PubmedArticle."""
+    citation = article.find("MedlineCitation")
+    art = citation.find("Article") if citation is not None else None
+    if art is None:
+        return None
+    pmid = (citation.findtext("PMID") or "").strip()
+    title = _text(art.find("ArticleTitle")).rstrip(".")
+    if not pmid or not title:
+        return None
+
+    journal = (art.findtext("Journal/Title") or art.findtext("Journal/ISOAbbreviation") or "").strip()
+    pubdate = art.find("Journal/JournalIssue/PubDate")
+    year = None
+    if pubdate is not None:
+        year = _extract_year(pubdate.findtext("Year") or pubdate.findtext("MedlineDate") or "")
+    if year is None:
+        year = _extract_year(art.findtext("ArticleDate/Year") or "")
+
+    authors: List[str] = []
+    for author in art.findall("AuthorList/Author")[: int(os.getenv("PUBMED_MAX_AUTHORS", "6"))]:
+        last = (author.findtext("LastName") or "").strip()
+        initials = (author.findtext("Initials") or "").strip()
+        name = f"{last}, {initials}" if last and initials else last or (author.findtext("CollectiveName") or "").strip()
+        if name:
+            authors.append(name)
+
+    sections = []
+    for part in art.findall("Abstract/AbstractText"):
+        text = _text(part)
+        if text:
+            label = part.get("Label")
+            sections.append(f"{label}: {text}" if label else text)
+
+    pub: Dict[str, Any] = {
+        "pmid": pmid,
+        "title": title,
+        "journal": journal or "PubMed",
+        "year": year or "N/A",
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+    }
+    if authors:
+        pub["authors"] = authors
+    if sections:
+        pub["abstract"] = " ".join(sections)
+    return pub
 
-        pubs: List[Dict[str, Any]] = []
-        for pmid in ids:
-            item = data.get(pmid, {})
-            title = (item.get("title") or "").strip().rstrip(".")
-            journal = (item.get("fulljournalname") or item.get("source") or "").strip()
-            pubdate = (item.get("pubdate") or item.get("sortpubdate") or "").strip()
-            year = _extract_year(pubdate)
-            if not title:
-                continue
-            pubs.append(
-                {
-                    "pmid": pmid,
-                    "title": title,
-                    "journal": journal or "PubMed",
-                    "year": year or "N/A",
-                    "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
-                }
-            )
-        return pubs
-
-
-def web_search_agent(query: str) -> Dict[str, Any]:
+
+async def _esearch_history(term: str, timeout_s: float) -> Tuple[Optional[str], Optional[str], int]:
+    """Run the search on the history server; returns (WebEnv, query_key, count) without transferring ids."""
+    esearch = await upstream_request(
+        "pubmed",
+        "GET",
+        "/esearch.fcgi",
+        params={"db": "pubmed", "term": term, "usehistory": "y", "retmax": "0", "retmode": "json"},
+        timeout=timeout_s,
+    )
+    result = esearch.json().get("esearchresult", {})
+    return result.get("webenv"), result.get("querykey"), int(result.get("count") or 0)
+
+
+async def _efetch_page(webenv: str, query_key: str, retstart: int, retmax: int, timeout_s: float) -> List[Dict[str, Any]]:
+    """Stream one efetch page and parse it incrementally.
+
+    Each PubmedArticle is turned into a publication dict as soon as its end tag arrives and
+    then cleared from the tree, so memory holds one article (plus the parsed dicts) rather
+    than the whole page's XML.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root: Optional[ET.Element] = None
+    out: List[Dict[str, Any]] = []
+
+    def drain() -> None:
+        nonlocal root
+        for event, elem in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = elem
+            elif elem.tag in ("PubmedArticle", "PubmedBookArticle"):
+                if elem.tag == "PubmedArticle":
+                    pub = _parse_article(elem)
+                    if pub is not None:
+                        out.append(pub)
+                root.clear()
+
+    async with upstream_stream(
+        "pubmed",
+        "GET",
+        "/efetch.fcgi",
+        params={
+            "db": "pubmed",
+            "WebEnv": webenv,
+            "query_key": query_key,
+            "retstart": str(retstart),
+            "retmax": str(retmax),
+            "rettype": "abstract",
+            "retmode": "xml",
+        },
+        timeout=timeout_s,
+    ) as r:
+        async for chunk in r.aiter_bytes():
+            parser.feed(chunk)
+            drain()
+    parser.close()
+    drain()
+    return out
+
+
+async def _pubmed_abstracts(term: str, limit: int, timeout_s: float) -> List[Dict[str, Any]]:
+    """Top `limit` results for a term, with abstracts, paged off the history server in efetch batches."""
+    webenv, query_key, count = await _esearch_history(term, timeout_s)
+    total = min(count, limit)
+    if not webenv or not query_key or total <= 0:
+        return []
+    batch = max(1, int(os.getenv("PUBMED_EFETCH_BATCH", "200")))
+    slots = asyncio.Semaphore(max(1, int(os.getenv("PUBMED_EFETCH_CONCURRENCY", "2"))))
+
+    async def page(retstart: int) -> List[Dict[str, Any]]:
+        async with slots:
+            return await _efetch_page(webenv, query_key, retstart, min(batch, total - retstart), timeout_s)
+
+    pages = await asyncio.gather(*(page(start) for start in range(0, total, batch)))
+    return [pub for pubs in pages for pub in pubs]
+
+
+async def _pubmed_abstracts_many(queries: List[str], retmax: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+    """Abstract-mode counterpart of _pubmed_fetch_many: each term is searched and fetched concurrently."""
+    timeout_s = float(os.getenv("PUBMED_TIMEOUT_S", "8"))
+    searchable = [t for t in dict.fromkeys(q.strip() for q in queries) if t]
+    found = await asyncio.gather(*(_pubmed_abstracts(t, retmax, timeout_s) for t in searchable))
+    by_term = dict(zip(searchable, found))
+    return {q: by_term.get(q.strip(), []) for q in queries}
+
+
+def _abstracts_enabled() -> bool:
+    return os.getenv("PUBMED_ABSTRACTS", "0").strip().lower() in ("1", "true", "yes")
+
+
+async def _pubmed_fetch(query: str, retmax: int = 5) -> List[Dict[str, Any]]:
+    return (await _pubmed_fetch_many([query], retmax=retmax))[query]
+
+
+async def web_search_agent(query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
     retmax = int(os.getenv("PUBMED_RETMAX", "5"))
-    key = detect_key(query)
-    term = key if key != "generic" else query
+    keys = resolve_keys(query, keys)
+    terms = {k: k if k != "generic" else query for k in keys}
+    abstracts = _abstracts_enabled()
+    fetch_terms = _pubmed_abstracts_many if abstracts else _pubmed_fetch_many
+    cache_keys = {k: normalize_key(terms[k], retmax, *(["abstracts"] if abstracts else [])) for k in keys}
+    term_for = {cache_keys[k]: terms[k] for k in keys}
+
+    async def fetch_many(missing: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        found = await fetch_terms([term_for[ck] for ck in missing], retmax=retmax)
+        return {ck: found[term_for[ck]] for ck in missing}
+
+    fallback_reason = None
     try:
-        pubs = _pubmed_fetch(term, retmax=retmax)
-        if pubs:
-            return {
-                "publications": pubs,
-                "_meta": {
-                    "source": "pubmed_api",
-                    "fetched_at": datetime.utcnow().isoformat() + "Z",
-                    "query_term": term,
-                },
-            }
+        fetched = await _CACHE.get_or_fetch_many(list(cache_keys.values()), fetch_many)
+    except CircuitOpenError:
+        fetched, fallback_reason = {}, "circuit_open"
     except Exception:
-        pass
+        fetched, fallback_reason = {}, "upstream_error"
 
-    data = load_mock(query)
-    pubs = data.get("publications", [])
-    return {
-        "publications": pubs,
-        "_meta": {"source": "mock", "fetched_at": datetime.utcnow().isoformat() + "Z", "query_term": term},
-    }
+    by_molecule: Dict[str, Any] = {}
+    metas: Dict[str, Dict[str, Any]] = {}
+    for k in keys:
+        pubs, cache_meta = fetched.get(cache_keys[k], ([], {}))
+        if pubs:
+            by_molecule[k] = pubs
+            metas[k] = {"source": "pubmed_api", "fetched_at": utcnow_iso(), "query_term": terms[k], **cache_meta}
+        else:
+            by_molecule[k] = get_dataset(k).get("publications", [])
+            metas[k] = {"source": "mock", "fetched_at": utcnow_iso(), "query_term": terms[k]}
+            if fallback_reason:
+                metas[k]["fallback_reason"] = fallback_reason
+    return molecule_result("publications", keys, by_molecule, metas)
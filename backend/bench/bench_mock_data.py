@@ -0,0 +1,61 @@
+# Mock dataset access per request: the preloaded read-only store vs opening and parsing
+# samples/<key>.json on every load_mock call, as the loader did before. A full-analysis request
+# loads the dataset from up to six agents, so each simulated request makes --loads calls.
+#
+#   python -m backend.bench.bench_mock_data [--requests 2000] [--loads 6]
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict
+
+from backend.app.mock_data import loader
+
+QUERIES = [
+    "semaglutide market size",
+    "tirzepatide patents and trials",
+    "donanemab clinical trials",
+    "sildenafil repurposing",
+    "an unknown molecule",
+]
+
+
+def _parse_per_call(query: str) -> Dict[str, Any]:
+    path = os.path.join(loader.DATA_DIR, f"{loader.detect_key(query)}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--loads", type=int, default=6)
+    args = parser.parse_args()
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.requests)]
+
+    started = time.perf_counter()
+    loader.preload()
+    preload_ms = (time.perf_counter() - started) * 1000
+
+    nbytes = 0
+    for q in queries:
+        path = os.path.join(loader.DATA_DIR, f"{loader.detect_key(q)}.json")
+        nbytes += os.path.getsize(path) * args.loads if os.path.exists(path) else 0
+
+    for label, load in (("preloaded store", loader.load_mock), ("parse per call", _parse_per_call)):
+        started = time.perf_counter()
+        for q in queries:
+            for _ in range(args.loads):
+                load(q)
+        us = (time.perf_counter() - started) / len(queries) * 1e6
+        print(f"{label:16s} {us:8.1f} µs/request")
+    print(
+        f"one-off preload {preload_ms:.1f} ms; parsing per call read {nbytes / len(queries) / 1024:.1f} KiB "
+        f"and opened {args.loads} files per request"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Per-request orchestration overhead: invoking the graphs compiled once at import (WORKFLOWS) vs
+# building and compiling a StateGraph on every call, as run_workflow did before. Agents are replaced
+# by coroutines returning canned mock data at once, so only planning, graph execution and
+# aggregation are timed. The old synchronous invoke, which also blocked the event loop for the whole
+# workflow, cannot run the current async nodes and is not reproduced.
+#
+#   python -m backend.bench.bench_orchestration [--requests 300]
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.app import orchestrator
+
+QUERY = "semaglutide market size, patents, clinical trials and latest publications"
+
+
+def _instant_agent(name: str):
+    async def agent(query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        return orchestrator._fallback_result(name, query, keys, "bench")
+
+    return agent
+
+
+async def _per_request_ms(n: int, make_app) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        await make_app().ainvoke({"query": QUERY, "history": [], "session": None}, config={"configurable": {}})
+    return (time.perf_counter() - started) / n * 1000
+
+
+async def _bench(n: int) -> None:
+    builders = {"parallel": orchestrator.build_parallel_graph, "sequential": orchestrator.build_sequential_graph}
+    for mode, build in builders.items():
+        started = time.perf_counter()
+        for _ in range(n):
+            build()
+        compile_ms = (time.perf_counter() - started) / n * 1000
+        once_ms = await _per_request_ms(n, lambda: orchestrator.WORKFLOWS[mode])
+        each_ms = await _per_request_ms(n, build)
+        print(
+            f"{mode:10s}: compiled once {once_ms:6.2f} ms/request  compiled per request {each_ms:6.2f} ms/request"
+            f"  (build+compile alone {compile_ms:.2f} ms)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+    for name in orchestrator.AGENTS:
+        orchestrator.AGENTS[name] = _instant_agent(name)
+    asyncio.run(_bench(args.requests))
+
+
+if __name__ == "__main__":
+    main()
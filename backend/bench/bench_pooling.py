@@ -0,0 +1,66 @@
+# Upstream throughput against the local stub server: requests/second through the pooled upstream
+# client (services/http.upstream_request) vs a fresh httpx.AsyncClient per request, as before pooling.
+# Rate limits are switched off so only connection handling is measured. Against a remote upstream
+# the gap is larger, since every fresh client there also pays DNS and a TLS handshake.
+#
+#   python -m backend.bench.bench_pooling [--requests 2000] [--concurrency 20]
+import argparse
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+from backend.app.services.http import close_clients, upstream_request
+from backend.bench.stub_server import serve
+
+
+async def _run(n: int, concurrency: int, request: Callable[[], Awaitable[httpx.Response]]) -> float:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with slots:
+            r = await request()
+            r.json()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    return n / (time.perf_counter() - started)
+
+
+async def _bench(base_url: str, n: int, concurrency: int) -> None:
+    async def pooled() -> httpx.Response:
+        return await upstream_request("ctgov", "GET", "/studies", params={"query.term": "semaglutide"})
+
+    async def unpooled() -> httpx.Response:
+        async with httpx.AsyncClient(base_url=base_url, timeout=10) as client:
+            r = await client.get("/studies", params={"query.term": "semaglutide"})
+            r.raise_for_status()
+            return r
+
+    try:
+        await _run(concurrency, concurrency, pooled)  # warm the pool
+        for label, request in (("pooled", pooled), ("client per request", unpooled)):
+            rps = await _run(n, concurrency, request)
+            print(f"{label:20s} {rps:8.0f} req/s  ({n} requests, concurrency {concurrency})")
+    finally:
+        await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    with serve() as base_url:
+        os.environ["CTGOV_BASE_URL"] = base_url
+        os.environ["CTGOV_RATE_PER_S"] = "0"
+        os.environ["HTTP2_ENABLED"] = "0"
+        os.environ["HTTP_MAX_CONNECTIONS"] = str(args.concurrency)
+        os.environ["HTTP_MAX_KEEPALIVE_CONNECTIONS"] = str(args.concurrency)
+        asyncio.run(_bench(base_url, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
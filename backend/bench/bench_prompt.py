@@ -0,0 +1,75 @@
+# LLM prompt size per query class: the packed, token-budgeted report_data (services/prompt) vs the
+# repr of the whole dict that the prompt embedded before. Report data comes from the workflow with
+# agents answering instantly from the mock datasets. With GROQ_API_KEY set, --llm also sends both
+# prompts to the configured model and times the completions (GROQ_MAX_TOKENS caps the output).
+#
+#   python -m backend.bench.bench_prompt [--llm] [--repeat 3]
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.app import orchestrator
+from backend.app.services import llm
+from backend.app.services.http import close_clients, upstream_request
+from backend.app.services.prompt import estimate_tokens, pack_report_data
+
+QUERY_CLASSES = {
+    "market": "semaglutide market size and sales by region",
+    "patents": "tirzepatide patent expiry and exclusivity",
+    "trials": "donanemab clinical trials status",
+    "literature": "latest publications on sildenafil repurposing",
+    "full analysis": "full analysis of semaglutide: market, patents, trials, publications and internal docs",
+    "two molecules": "compare semaglutide and tirzepatide market, patents and trials",
+}
+
+
+def _instant_agent(name: str):
+    async def agent(query: str, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        return orchestrator._fallback_result(name, query, keys, "bench")
+
+    return agent
+
+
+async def _completion_s(payload: Dict[str, Any], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await upstream_request("groq", "POST", "/chat/completions", headers=llm._auth_headers(), json=payload)
+    return (time.perf_counter() - started) / repeat
+
+
+async def _bench(with_llm: bool, repeat: int) -> None:
+    print(f"{'class':14s} {'agents':>6s} {'repr tokens':>12s} {'packed tokens':>14s} {'pack ms':>8s}" + ("  repr s  packed s" if with_llm else ""))
+    for label, query in QUERY_CLASSES.items():
+        final = await orchestrator.run_workflow(query=query, history=[])
+        report_data, agents_used = final["report_data"], final["agents_used"]
+        old = str({"query": query, "report_data": report_data})
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            packed = pack_report_data(report_data, agents_used)
+        pack_ms = (time.perf_counter() - started) / repeat * 1000
+
+        line = f"{label:14s} {len(agents_used):6d} {estimate_tokens(old):12d} {estimate_tokens(packed):14d} {pack_ms:8.2f}"
+        if with_llm:
+            old_s = await _completion_s(llm._completion_payload(query, old), repeat)
+            new_s = await _completion_s(llm._completion_payload(query, packed), repeat)
+            line += f"  {old_s:6.2f}  {new_s:8.2f}"
+        print(line)
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="also time completions (needs GROQ_API_KEY)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if args.llm and not llm._is_configured():
+        parser.error("--llm needs GROQ_API_KEY")
+    for name in orchestrator.AGENTS:
+        orchestrator.AGENTS[name] = _instant_agent(name)
+    asyncio.run(_bench(args.llm, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
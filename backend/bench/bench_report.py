@@ -0,0 +1,90 @@
+# PDF report rendering: 1,000 reports of varying size built from the mock datasets, each section
+# repeated 1-25x with distinct titles. Times render_report (in memory) and build_report (to disk).
+# --baseline times another report module's build_report(data, path) on the same inputs, e.g. the
+# engine before the rework:
+#
+#   git show e921f94^:backend/app/services/report.py > /tmp/report_old.py
+#   python -m backend.bench.bench_report [--reports 1000] [--baseline /tmp/report_old.py]
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import random
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from backend.app.mock_data import loader
+from backend.app.services.report import build_report, render_report
+
+_LIST_SECTIONS = ("publications", "trials", "patents", "internal_docs", "web_intel")
+_SCALES = (1, 2, 5, 10, 25)
+
+
+def _reports(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    loader.preload()
+    datasets = [loader.get_dataset(k) for k in ("semaglutide", "tirzepatide", "donanemab", "sildenafil")]
+    out = []
+    for i in range(n):
+        base = datasets[i % len(datasets)]
+        scale = rng.choice(_SCALES)
+        data: Dict[str, Any] = {"query": f"report {i}: {rng.choice(list(loader.KNOWN_KEYS))} landscape"}
+        for section in _LIST_SECTIONS:
+            items = list(base.get(section) or [])
+            data[section] = [
+                {**item, "title": f"{item.get('title', '')} (set {j})"} for j in range(scale) for item in items
+            ]
+        # Nulls dropped: the engine before the rework crashed on them.
+        data["iqvia"] = {k: v for k, v in (base.get("iqvia") or {}).items() if v is not None}
+        data["exim"] = {k: v for k, v in (base.get("exim") or {}).items() if v is not None}
+        data["insights"] = [f"Insight {j}: {rng.choice(data['publications'] or [{'title': 'n/a'}])['title']}" for j in range(scale)]
+        data["sources"] = {s: {"source": "mock"} for s in _LIST_SECTIONS}
+        out.append(data)
+    return out
+
+
+def _time(label: str, reports: List[Dict[str, Any]], render: Callable[[Dict[str, Any], int], int]) -> str:
+    started = time.perf_counter()
+    nbytes = sum(render(data, i) for i, data in enumerate(reports))
+    total_s = time.perf_counter() - started
+    return (
+        f"{label:22s} {total_s:7.2f}s total  {total_s / len(reports) * 1000:7.2f} ms/report"
+        f"  {nbytes / len(reports) / 1024:6.1f} KiB/report"
+    )
+
+
+def _load(path: str):
+    spec = importlib.util.spec_from_file_location("baseline_report", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=1000)
+    parser.add_argument("--baseline", help="path to another report.py to compare against")
+    args = parser.parse_args()
+    reports = _reports(args.reports, random.Random(7))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def to_disk(build) -> Callable[[Dict[str, Any], int], int]:
+            def render(data: Dict[str, Any], i: int) -> int:
+                path = os.path.join(tmp, f"r{i}.pdf")
+                build(data, path)
+                return os.path.getsize(path)
+
+            return render
+
+        print(_time("render_report (memory)", reports, lambda data, i: len(render_report(data))))
+        print(_time("build_report (disk)", reports, to_disk(build_report)))
+        if args.baseline:
+            baseline = _load(args.baseline)
+            with contextlib.redirect_stdout(io.StringIO()):  # the old engine printed debug output per report
+                line = _time("baseline (disk)", reports, to_disk(baseline.build_report))
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Dense passage search at scale: term-major matrix (rows of the query's buckets only) vs a full
+# passage-major scan, for a few RAG_VECTOR_DIM values.
+#
+#   python -m backend.bench.bench_vectors [--passages 100000] [--dims 64 128 256]
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from backend.app.services import vectors
+
+
+def _texts(n: int, rng: random.Random):
+    vocab = [f"term{i}" for i in range(20000)] + ["semaglutide", "tirzepatide", "sildenafil", "obesity", "market"]
+    return [" ".join(rng.choices(vocab, k=45)) for _ in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--passages", type=int, default=100_000)
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    rng = random.Random(3)
+    texts = _texts(args.passages, rng)
+    ids = [f"p{i}" for i in range(len(texts))]
+    queries = [["semaglutide", "obesity", rng.choice(texts).split()[0], "market"] for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors._VECTOR_DIR = tmp
+        vectors._MATRIX_PATH = os.path.join(tmp, "m.npy")
+        vectors._META_PATH = os.path.join(tmp, "m.json")
+        for dim in args.dims:
+            os.environ["RAG_VECTOR_DIM"] = str(dim)
+            started = time.perf_counter()
+            vectors.build(ids, texts)
+            build_s = time.perf_counter() - started
+            vectors.search(queries[0], 50)
+            started = time.perf_counter()
+            for q in queries:
+                vectors.search(q, 50)
+            term_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+            rows = np.ascontiguousarray(np.load(vectors._MATRIX_PATH).T)  # the previous passage-major layout
+            qv = np.ones(dim, dtype=np.float32) / np.sqrt(dim)
+            started = time.perf_counter()
+            for _ in queries:
+                sims = rows @ qv
+                np.argpartition(-sims, 49)[:50]
+            full_ms = (time.perf_counter() - started) / len(queries) * 1000
+            print(f"dim {dim:4d}: build {build_s:5.1f}s  term-major {term_ms:6.2f} ms/query  full scan {full_ms:6.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Local stand-in for the PubMed E-utilities, ClinicalTrials.gov and OpenAI-compatible chat completion
+# APIs, for benchmarks and tests. Serves canned responses over keep-alive HTTP/1.1 from a background
+# thread on an ephemeral port:
+#
+#   with serve() as base_url:
+#       os.environ["CTGOV_BASE_URL"] = base_url
+#       os.environ["GROQ_BASE_URL"] = base_url
+#
+# or standalone: python -m backend.bench.stub_server [--port 8765]
+#
+# Chat completions stream CHAT_WORDS as SSE deltas when the request asks for `stream`. The model name
+# picks a failure to simulate: "stub-error" answers 500, "stub-cut" drops the connection after two
+# deltas, "stub-after-done" sends one more delta after [DONE].
+import argparse
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional
+
+_ESEARCH = {"esearchresult": {"idlist": ["1", "2"], "count": "2", "webenv": "W", "querykey": "1"}}
+_ESUMMARY = {
+    "result": {
+        "uids": ["1", "2"],
+        "1": {"title": "Stub semaglutide paper.", "fulljournalname": "J Stub", "pubdate": "2024 Jan"},
+        "2": {"title": "Stub tirzepatide paper", "source": "K Stub", "pubdate": "2023"},
+    }
+}
+_STUDIES = {
+    "studies": [
+        {
+            "protocolSection": {
+                "identificationModule": {"nctId": "NCT00000001", "briefTitle": "Stub trial"},
+                "statusModule": {"overallStatus": "RECRUITING"},
+                "designModule": {"phases": ["PHASE3"]},
+                "sponsorCollaboratorsModule": {"leadSponsor": {"name": "Acme"}},
+            }
+        }
+    ]
+}
+
+CHAT_WORDS = ["Data ", "Sources", ": ", "mock", ".\n", "Findings", " here", "."]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/esearch.fcgi"):
+            self._json(_ESEARCH)
+        elif path.endswith("/esummary.fcgi"):
+            self._json(_ESUMMARY)
+        elif path.endswith("/studies"):
+            self._json(_STUDIES)
+        else:
+            self._json({"error": "not found"}, status=404)
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._json({"error": "not found"}, status=404)
+        elif body.get("model") == "stub-error":
+            self._json({"error": {"message": "stub failure"}}, status=500)
+        elif body.get("stream"):
+            self._stream_chat(body.get("model", ""))
+        else:
+            self._json({"choices": [{"message": {"role": "assistant", "content": "".join(CHAT_WORDS)}}]})
+
+    def _stream_chat(self, model: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = CHAT_WORDS[:2] if model == "stub-cut" else CHAT_WORDS
+        self._chunk(": keep-alive\n\n")
+        for word in words:
+            self._chunk(self._event({"choices": [{"delta": {"content": word}}]}))
+        if model == "stub-cut":
+            self.close_connection = True  # no terminating chunk: the client sees a truncated body
+            return
+        self._chunk("data: [DONE]\n\n")
+        if model == "stub-after-done":
+            self._chunk(self._event({"choices": [{"delta": {"content": "after done"}}]}))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _event(self, data: Dict[str, Any]) -> str:
+        return f"data: {json.dumps(data)}\n\n"
+
+    def _chunk(self, text: str) -> None:
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _json(self, body: Dict[str, Any], status: int = 200) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+@contextmanager
+def serve(port: int = 0, handler: Optional[type] = None) -> Iterator[str]:
+    """Run the stub server in a daemon thread for the duration of the block; yields its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler or StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="stub-server", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"stub server on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
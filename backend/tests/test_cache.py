@@ -0,0 +1,155 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backend.app.services.cache import MemoryBackend, ResponseCache, SQLiteBackend
+
+
+def _cache() -> ResponseCache:
+    return ResponseCache(MemoryBackend(max_entries=16, ttl_s=60), "test")
+
+
+def test_cancelled_owner_does_not_cancel_coalesced_waiter():
+    async def main():
+        cache = _cache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.3)
+            return "value"
+
+        # A starts the fetch and hits its deadline; B coalesces on the same key with a longer one.
+        a = asyncio.create_task(asyncio.wait_for(cache.get_or_fetch("k", fetch), timeout=0.1))
+        await asyncio.sleep(0)
+        b = asyncio.create_task(asyncio.wait_for(cache.get_or_fetch("k", fetch), timeout=5))
+        with pytest.raises(asyncio.TimeoutError):
+            await a
+        value, meta = await b
+        assert value == "value"
+        assert meta["cache"] == "coalesced"
+        assert len(calls) == 1
+        # The abandoned fetch still filled the cache.
+        assert (await cache.get_or_fetch("k", fetch))[1]["cache"] == "hit"
+
+    asyncio.run(main())
+
+
+def test_cancelled_owner_does_not_cancel_coalesced_waiter_many():
+    async def main():
+        cache = _cache()
+
+        async def fetch_many(keys):
+            await asyncio.sleep(0.3)
+            return {k: k.upper() for k in keys}
+
+        a = asyncio.create_task(asyncio.wait_for(cache.get_or_fetch_many(["x", "y"], fetch_many), timeout=0.1))
+        await asyncio.sleep(0)
+        b = asyncio.create_task(cache.get_or_fetch_many(["y", "z"], fetch_many))
+        with pytest.raises(asyncio.TimeoutError):
+            await a
+        out = await b
+        assert out["y"][0] == "Y" and out["y"][1]["cache"] == "coalesced"
+        assert out["z"][0] == "Z" and out["z"][1]["cache"] == "miss"
+
+    asyncio.run(main())
+
+
+def test_fetch_error_reaches_every_waiter_and_is_not_cached():
+    async def main():
+        cache = _cache()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            raise ValueError("upstream down")
+
+        results = await asyncio.gather(
+            cache.get_or_fetch("k", fetch), cache.get_or_fetch("k", fetch), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+        assert not cache._inflight
+
+        async def ok():
+            return 1
+
+        value, meta = await cache.get_or_fetch("k", ok)
+        assert (value, meta["cache"]) == (1, "miss")
+
+    asyncio.run(main())
+
+
+def test_empty_results_expire_after_the_negative_ttl(monkeypatch):
+    async def main():
+        cache = ResponseCache(MemoryBackend(max_entries=16, ttl_s=60), "test", negative_ttl_s=5)
+        answers = iter([[], ["late"], ["fresh"]])
+
+        async def fetch():
+            return next(answers)
+
+        assert (await cache.get_or_fetch("k", fetch))[0] == []
+        assert (await cache.get_or_fetch("k", fetch))[1]["cache"] == "hit"
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 10)
+        value, meta = await cache.get_or_fetch("k", fetch)  # the empty answer has expired
+        assert (value, meta["cache"]) == (["late"], "miss")
+        monkeypatch.setattr(time, "time", lambda: now + 20)
+        assert (await cache.get_or_fetch("k", fetch))[0] == ["late"]  # a real answer keeps the full TTL
+
+        # Callers can flag their own negative results.
+        partial = {"items": [1], "complete": False}
+
+        async def fetch_partial():
+            return partial
+
+        await cache.get_or_fetch("p", fetch_partial, negative=lambda v: not v["complete"])
+        assert cache.backend._data["p"][2] == 5
+
+    asyncio.run(main())
+
+
+def test_sqlite_backend_runs_off_the_event_loop(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), "test", max_entries=16, ttl_s=60)
+    threads = set()
+    for name in ("get", "set"):
+        original = getattr(backend, name)
+
+        def traced(*args, _original=original, **kwargs):
+            threads.add(threading.get_ident())
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(backend, name, traced)
+
+    async def main():
+        cache = ResponseCache(backend, "test", negative_ttl_s=5)
+
+        async def fetch_many(keys):
+            return {k: ([] if k == "none" else [k]) for k in keys}
+
+        out = await cache.get_or_fetch_many(["a", "none"], fetch_many)
+        assert out["a"][0] == ["a"] and out["a"][1]["cache"] == "miss"
+        assert (await cache.peek("a"))[0] == ["a"]
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert threads and loop_thread not in threads
+    rows = dict(backend._conn.execute("SELECT key, ttl_s FROM cache"))
+    assert rows == {"a": None, "none": 5}
+
+
+def test_sqlite_backend_upgrades_files_without_per_entry_ttls(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE cache (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+        " stored_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+    )
+    conn.execute("INSERT INTO cache VALUES ('test', 'k', '\"v\"', ?, ?)", (time.time(), time.time()))
+    conn.commit()
+    conn.close()
+    backend = SQLiteBackend(path, "test", max_entries=16, ttl_s=60)
+    assert backend.get("k")[1] == "v"
+    backend.set("n", [], ttl_s=5)
+    assert backend.get("n")[1] == []
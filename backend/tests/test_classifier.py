@@ -0,0 +1,150 @@
+from typing import List, Set
+
+import pytest
+
+from backend.app.orchestrator import plan_tasks
+from backend.app.services.classifier import classify
+from backend.app.services.matcher import AhoCorasick
+
+
+# The planner and clarification checks as they were before the Aho-Corasick classifier: plain substring scans.
+def _baseline_tasks(query: str) -> List[str]:
+    q = query.lower()
+    full = any(k in q for k in [
+        "repurpose", "repurposing", "complete analysis", "business case", "i need everything", "we're evaluating",
+        "we are evaluating", "we're considering", "considering licensing", "licensing", "compare the market",
+    ])
+    if full:
+        return ["web_search", "trials", "patent", "iqvia", "internal_knowledge", "web_intel"]
+    tasks = ["web_search"]
+    for agent, keywords in [
+        ("trials", ["trial", "phase", "study", "nct", "pipeline"]),
+        ("patent", ["patent", "expiry", "fto", "ip", "biosimilar", "generic", "competition"]),
+        ("iqvia", ["market", "sales", "cagr", "iqvia", "market size", "therapy area"]),
+        ("exim", ["export", "import", "exim", "trade", "sourcing", "dependency"]),
+        ("internal_knowledge", ["internal", "mins", "deck", "strategy", "upload", "pdf", "briefing"]),
+        ("web_intel", ["web", "guideline", "news", "forum", "publication", "real-time", "real time", "web search"]),
+    ]:
+        if any(k in q for k in keywords):
+            tasks.append(agent)
+    return tasks
+
+
+def _baseline_clarifications(query: str) -> Set[str]:
+    q = query.lower()
+    out = set()
+    if any(k in q for k in ["unmet need", "opportunity", "whitespace"]) and not any(
+        r in q for r in ["us", "eu", "europe", "india", "china", "apac", "emea", "region", "global"]
+    ):
+        out.add("region")
+    if any(k in q for k in ["competition", "competitor", "biosimilar"]) and not any(
+        k in q for k in ["moa", "mechanism", "class", "molecule", "drug", "brand"]
+    ):
+        out.add("competition_scope")
+    if ("market" in q or "sales" in q) and not any(k in q for k in ["year", "2022", "2023", "2024", "2025"]):
+        out.add("time_horizon")
+    return out
+
+
+def _clarifications(query: str) -> Set[str]:
+    intents = classify(query)["intents"]
+    out = set()
+    if "opportunity" in intents and "region" not in intents:
+        out.add("region")
+    if "competition" in intents and "competition_scope" not in intents:
+        out.add("competition_scope")
+    if "market_or_sales" in intents and "time_horizon" not in intents:
+        out.add("time_horizon")
+    return out
+
+
+SAME_AS_BASELINE = [
+    "patented formulations of tirzepatide",
+    "marketing authorisation status of semaglutide",
+    "Semaglutide trials in NASH",
+    "Phase3 readouts for donanemab",
+    "status of NCT01234567",
+    "sildenafil patent expiries and generics in the EU",
+    "sildenafil patent expiries",
+    "biosimilars threatening our brand",
+    "who are the competitors for tirzepatide by mechanism",
+    "market size and sales of GLP-1s in 2024",
+    "markets with the highest CAGR over five years",
+    "therapy areas where sildenafil could be repurposed",
+    "export and import dependency for semaglutide API",
+    "trade flows and sourcing risk",
+    "exporters of donanemab",
+    "internal strategy decks on obesity",
+    "summarize the uploaded PDFs",
+    "board briefings from last quarter",
+    "latest guidelines and news on Alzheimer's",
+    "publications and forums discussing tirzepatide",
+    "real-time web search for sildenafil",
+    "business case for sildenafil vs tirzepatide strategy briefing",
+    "we're considering licensing donanemab",
+    "complete analysis of semaglutide",
+    "I need everything on tirzepatide",
+    "unmet needs in heart failure",
+    "whitespace opportunities in APAC",
+    "competition for semaglutide",
+    "what does the trial landscape look like for donanemab",
+    "tell me about semaglutide",
+]
+
+# Deliberate departures from the substring scans: keywords starting mid-word, or running on into a
+# longer word, no longer fire, and irregular plurals now do.
+CHANGED = [
+    ("shipping delays for semaglutide", ["web_search"]),  # "ip" in "shipping"
+    ("phase 3 pipelines for obesity", ["web_search", "trials"]),  # "ip" in "pipelines"
+    ("focus on obesity opportunity", ["web_search"]),  # "us" in "focus" no longer answers the region question
+    ("recent studies of donanemab", ["web_search", "trials"]),
+    ("important results for semaglutide", ["web_search"]),  # "import" in "important"
+    ("trademark disputes over tirzepatide", ["web_search"]),  # "trade" in "trademark"
+    ("webinar on donanemab", ["web_search"]),  # "web" in "webinar"
+]
+
+
+@pytest.mark.parametrize("query", SAME_AS_BASELINE)
+def test_planner_matches_baseline(query):
+    assert plan_tasks(classify(query)["intents"]) == _baseline_tasks(query)
+    assert _clarifications(query) == _baseline_clarifications(query)
+
+
+@pytest.mark.parametrize("query,tasks", CHANGED)
+def test_intended_differences(query, tasks):
+    assert plan_tasks(classify(query)["intents"]) == tasks
+    # Each entry must really depart from the baseline, in its tasks or its clarifications.
+    assert (_baseline_tasks(query), _baseline_clarifications(query)) != (tasks, _clarifications(query))
+
+
+def test_focus_is_not_a_region():
+    assert _clarifications("focus on obesity opportunity") == {"region"}
+    assert _baseline_clarifications("focus on obesity opportunity") == set()
+
+
+def test_molecule_aliases_match_whole_words_only():
+    assert classify("ozempic vs mounjaro")["molecules"] == ["semaglutide", "tirzepatide"]
+    assert classify("sildenafils")["molecules"] == []
+
+
+def test_stems_and_words():
+    m = AhoCorasick([("us", "region")], stems=[("patent", "patent")])
+    assert m.labels("patented in the US") == ["patent", "region"]
+    assert m.labels("use of patents") == ["patent"]
+    assert m.labels("depatented") == []
+
+
+@pytest.mark.parametrize("text,labels", [
+    ("import", ["exim"]),
+    ("imports imported importers importing", ["exim"]),
+    ("important", []),
+    ("importance", []),
+    ("trade", ["exim"]),
+    ("traded trades", ["exim"]),
+    ("trademark", []),
+    ("trademarks", []),
+    ("import-export", ["exim"]),  # punctuation ends a word
+])
+def test_stems_take_inflections_not_longer_words(text, labels):
+    m = AhoCorasick([], stems=[("import", "exim"), ("trade", "exim")])
+    assert m.labels(text) == labels
@@ -0,0 +1,113 @@
+import asyncio
+import copy
+import json
+import os
+import zipfile
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+
+from backend.app.services import ctgov_mirror
+from backend.app.services.ctgov_mirror import CtgovMirror, ingest, parse_study
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "ctgov_studies.json")
+
+
+@pytest.fixture
+def store(tmp_path):
+    mirror = CtgovMirror(str(tmp_path / "mirror.sqlite3"))
+    assert ingest(FIXTURE, mirror) == 5  # the record without an NCT id is skipped
+    return mirror
+
+
+def _studies() -> List[Dict[str, Any]]:
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return json.load(f)["studies"]
+
+
+def test_parse_study_reads_the_v2_fields():
+    trial = parse_study(_studies()[0])
+    assert trial == {
+        "nct_id": "NCT04777396",
+        "title": "Semaglutide Effects on Heart Disease and Stroke in Patients With Overweight or Obesity",
+        "status": "ACTIVE_NOT_RECRUITING",
+        "phase": "PHASE3",
+        "completion_date": "2025-09-30",
+        "sponsor": "Novo Nordisk A/S",
+        "url": "https://clinicaltrials.gov/study/NCT04777396",
+    }
+    fallback = parse_study(_studies()[4])  # no design module, no completion date
+    assert fallback["phase"] == "N/A" and fallback["completion_date"] == "N/A"
+    assert parse_study(_studies()[3])["title"].startswith("A Study of Donanemab")  # officialTitle only
+
+
+def test_ingest_reads_zip_exports_of_single_studies(tmp_path):
+    path = tmp_path / "ctg-studies.json.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        for study in _studies():
+            nct = study["protocolSection"]["identificationModule"].get("nctId", "unknown")
+            zf.writestr(f"ctg-studies/{nct}.json", json.dumps(study))
+    mirror = CtgovMirror(str(tmp_path / "zip.sqlite3"))
+    assert ingest(str(path), mirror) == 5
+    assert mirror.stats()["studies"] == 5
+
+
+def test_search_matches_text_interventions_and_ids(store):
+    assert {t["nct_id"] for t in store.search("semaglutide obesity", 5)} == {"NCT04777396", "NCT05822830"}
+    assert [t["nct_id"] for t in store.search("SELECT stroke", 5)] == ["NCT04777396"]  # acronym + title
+    assert [t["nct_id"] for t in store.search("Wegovy", 5)] == ["NCT04777396"]  # intervention other name
+    assert [t["nct_id"] for t in store.search("amyloid", 5)] == ["NCT05108285"]  # keyword
+    assert [t["nct_id"] for t in store.search("see nct03915366", 5)] == ["NCT03915366"]
+    assert store.search("!!", 5) == []
+    assert store.search_many(["tirzepatide", "sildenafil"], 1) == [
+        store.search("tirzepatide", 1),
+        store.search("sildenafil", 1),
+    ]
+
+
+def test_landscape_counts_every_matching_study(store):
+    ls = store.landscape("tirzepatide")
+    assert ls["total"] == ls["scanned"] == 2
+    assert ls["active"] == 1
+    assert ls["phases"] == {"PHASE3": 2}
+    assert ls["statuses"] == {"RECRUITING": 1, "COMPLETED": 1}
+    assert ls["top_sponsors"] == [{"name": "Eli Lilly and Company", "count": 2}]
+    assert store.landscape("no such condition")["total"] == 0
+
+
+def test_sync_pulls_updates_since_the_watermark(store, monkeypatch):
+    assert store.watermark() == "2024-06-01"
+    updated = copy.deepcopy(_studies()[2])
+    updated["protocolSection"]["statusModule"].update(
+        overallStatus="ACTIVE_NOT_RECRUITING", lastUpdatePostDateStruct={"date": "2024-07-02"}
+    )
+    new = copy.deepcopy(_studies()[4])
+    new["protocolSection"]["identificationModule"]["nctId"] = "NCT06000001"
+    new["protocolSection"]["statusModule"]["lastUpdatePostDateStruct"] = {"date": "2024-07-05"}
+    pages = {None: {"studies": [updated], "nextPageToken": "t2"}, "t2": {"studies": [new]}}
+    calls: List[Dict[str, Any]] = []
+
+    async def fake_request(name: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        calls.append(kwargs["params"])
+        return httpx.Response(200, json=pages[kwargs["params"].get("pageToken")])
+
+    monkeypatch.setattr(ctgov_mirror, "upstream_request", fake_request)
+    assert asyncio.run(ctgov_mirror.sync(store)) == 2
+
+    assert calls[0]["filter.advanced"] == "AREA[LastUpdatePostDate]RANGE[2024-06-01,MAX]"
+    assert calls[1]["pageToken"] == "t2"
+    assert store.watermark() == "2024-07-05"
+    assert store.stats()["studies"] == 6 and store.stats()["synced_at"]
+    # The updated study replaced the old row in the table and the FTS index alike.
+    assert [t["status"] for t in store.search("NCT04184622", 5)] == ["ACTIVE_NOT_RECRUITING"]
+    ls = store.landscape("tirzepatide")
+    assert ls["total"] == 2 and ls["active"] == 2
+
+
+def test_sync_needs_an_ingested_mirror(tmp_path, monkeypatch):
+    async def fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("an empty mirror must not call the API")
+
+    monkeypatch.setattr(ctgov_mirror, "upstream_request", fail)
+    assert asyncio.run(ctgov_mirror.sync(CtgovMirror(str(tmp_path / "empty.sqlite3")))) == 0
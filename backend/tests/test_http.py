@@ -0,0 +1,60 @@
+import asyncio
+from typing import List
+
+import httpx
+import pytest
+
+from backend.app.services import http, limits
+from backend.app.services.limits import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Point the "ctgov" upstream at an in-process transport answering with the queued status codes."""
+    statuses: List[int] = []
+    seen: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.path)
+        # A streamed body, like a real transport's, so the client reads it and sets response.elapsed.
+        return httpx.Response(statuses.pop(0) if statuses else 200, stream=httpx.ByteStream(b'{"ok": true}'))
+
+    client = httpx.AsyncClient(base_url="http://stub", transport=httpx.MockTransport(handler))
+    breaker = CircuitBreaker(threshold=2, reset_s=60)
+    monkeypatch.setitem(http._clients, "ctgov", client)
+    monkeypatch.setitem(limits._breakers, "ctgov", breaker)
+    return statuses, seen, breaker
+
+
+def _get():
+    return http.upstream_request("ctgov", "GET", "/studies")
+
+
+def test_upstream_request_returns_response(upstream):
+    _, seen, breaker = upstream
+    r = asyncio.run(_get())
+    assert r.json() == {"ok": True}
+    assert seen == ["/studies"]
+    assert breaker.snapshot()["successes"] == 1
+
+
+def test_upstream_errors_open_the_breaker(upstream):
+    statuses, seen, breaker = upstream
+    statuses.extend([503, 429])
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(_get())
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(_get())
+    assert len(seen) == 2  # the short-circuited call never reached the upstream
+
+
+def test_client_errors_do_not_count_as_upstream_failures(upstream):
+    statuses, _, breaker = upstream
+    statuses.extend([404, 400, 404])
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(_get())
+    assert breaker.state == "closed"
+    assert breaker.snapshot()["failures"] == 0
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from backend.app.services.limits import CircuitBreaker, TokenBucket
+
+
+def test_breaker_trips_after_consecutive_failures():
+    breaker = CircuitBreaker(threshold=3, reset_s=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # a success resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    snap = breaker.snapshot()
+    assert snap["trips"] == 1 and snap["short_circuited"] == 1 and snap["retry_in_s"] > 0
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=1, reset_s=0)
+    breaker.record_failure()
+    assert breaker.allow()  # reset elapsed: the probe
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow()
+    breaker.release()  # probe cancelled without an outcome
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow() and breaker.allow()
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def main():
+        bucket = TokenBucket(rate=20, burst=2)
+        started = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        burst_s = time.monotonic() - started
+        await asyncio.gather(bucket.acquire(), bucket.acquire())
+        return burst_s, time.monotonic() - started
+
+    burst_s, total_s = asyncio.run(main())
+    assert burst_s < 0.04
+    assert total_s >= 0.09  # two more tokens at 20/s
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from backend.app.services import http, limits, llm
+from backend.app.services.cache import MemoryBackend, ResponseCache
+from backend.bench.stub_server import CHAT_WORDS, serve
+
+FALLBACK = "fallback answer"
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    with serve() as base_url:
+        yield base_url
+
+
+@pytest.fixture
+def groq(monkeypatch, stub_url):
+    """Point the Groq upstream at the stub server with fresh clients, breakers and LLM cache."""
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("GROQ_BASE_URL", stub_url)
+    monkeypatch.setenv("GROQ_RATE_PER_S", "0")
+    monkeypatch.setattr(http, "_clients", {})
+    monkeypatch.setattr(limits, "_breakers", {})
+    monkeypatch.setattr(llm, "_CACHE", ResponseCache(MemoryBackend(max_entries=16, ttl_s=60), "llm"))
+
+    def use_model(model: str) -> None:
+        monkeypatch.setenv("GROQ_MODEL", model)
+
+    return use_model
+
+
+def _stream(query: str, cache_meta: Dict[str, Any]) -> List[str]:
+    async def main():
+        try:
+            return [
+                chunk
+                async for chunk in llm.stream_chat_response(
+                    query=query, history=[], report_data={}, fallback_text=FALLBACK, cache_meta=cache_meta
+                )
+            ]
+        finally:
+            await http.close_clients()
+
+    return asyncio.run(main())
+
+
+def test_stream_yields_deltas_and_caches_the_answer(groq):
+    groq("stub")
+    meta: Dict[str, Any] = {}
+    assert _stream("semaglutide market", meta) == CHAT_WORDS
+    assert meta["cache"] == "miss"
+    meta = {}
+    assert _stream("semaglutide market", meta) == ["".join(CHAT_WORDS)]
+    assert meta["cache"] == "hit"
+
+
+def test_stream_stops_at_done(groq):
+    groq("stub-after-done")
+    assert _stream("semaglutide market", {}) == CHAT_WORDS
+
+
+def test_failure_before_first_token_yields_fallback(groq):
+    groq("stub-error")
+    meta: Dict[str, Any] = {}
+    assert _stream("semaglutide market", meta) == [FALLBACK]
+    assert meta == {}
+
+
+def test_failure_mid_stream_keeps_sent_tokens_and_skips_cache(groq):
+    groq("stub-cut")
+    assert _stream("semaglutide market", {}) == CHAT_WORDS[:2]
+    assert len(llm._CACHE.backend) == 0
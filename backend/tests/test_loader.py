@@ -0,0 +1,54 @@
+import json
+import pickle
+
+import pytest
+
+from backend.app.mock_data import loader
+
+
+def test_datasets_are_read_only_all_the_way_down():
+    data = loader.get_dataset("semaglutide")
+    trials = data["trials"]
+    for mutate in (
+        lambda: trials.append({}),
+        lambda: trials.sort(key=str),
+        lambda: trials[0].update(title="changed"),
+        lambda: data["iqvia"].__setitem__("cagr", 0),
+        lambda: data.pop("patents"),
+        lambda: loader.get_dataset("no such molecule")["trials"].append({}),
+    ):
+        with pytest.raises(TypeError):
+            mutate()
+    assert loader.get_dataset("semaglutide")["trials"] == trials
+
+
+def test_frozen_sections_serialize_like_plain_json():
+    trials = loader.get_dataset("semaglutide")["trials"]
+    assert isinstance(trials, list) and isinstance(trials[0], dict)
+    assert json.loads(json.dumps(trials)) == trials
+    copy = pickle.loads(pickle.dumps(trials))  # how report data reaches the render workers
+    assert type(copy) is list and type(copy[0]) is dict
+    copy.append({})
+
+
+@pytest.mark.parametrize("content", [None, "{not json", '["ozempic"]', '{"semaglutide": "ozempic"}'])
+def test_bad_alias_table_is_skipped(tmp_path, monkeypatch, caplog, content):
+    path = tmp_path / "aliases.json"
+    if content is not None:
+        path.write_text(content)
+    monkeypatch.setenv("MOLECULE_ALIASES_PATH", str(path))
+    known = {k: list(v) for k, v in loader.KNOWN_KEYS.items()}
+    monkeypatch.setattr(loader, "KNOWN_KEYS", known)
+    loader._load_extra_aliases()
+    assert loader.KNOWN_KEYS == known
+    assert "Ignoring molecule alias table" in caplog.text
+
+
+def test_alias_table_merges_into_known_keys(tmp_path, monkeypatch):
+    path = tmp_path / "aliases.json"
+    path.write_text('{"Semaglutide": ["Rybelsus", "ozempic"], "liraglutide": ["victoza"]}')
+    monkeypatch.setenv("MOLECULE_ALIASES_PATH", str(path))
+    monkeypatch.setattr(loader, "KNOWN_KEYS", {k: list(v) for k, v in loader.KNOWN_KEYS.items()})
+    loader._load_extra_aliases()
+    assert loader.KNOWN_KEYS["semaglutide"] == ["semaglutide", "ozempic", "wegovy", "rybelsus"]
+    assert loader.KNOWN_KEYS["liraglutide"] == ["liraglutide", "victoza"]
@@ -0,0 +1,34 @@
+from backend.app.workers.common import molecule_result
+
+
+def test_single_molecule_keeps_its_meta():
+    meta = {"source": "pubmed_api", "fetched_at": "2026-01-01T00:00:00Z", "cache": "hit", "cache_age_s": 3.0}
+    res = molecule_result("publications", ["aspirin"], {"aspirin": [{"title": "a"}]}, {"aspirin": meta})
+    assert res == {"publications": [{"title": "a"}], "_meta": meta}
+
+
+def test_partial_fallback_is_lifted_to_top_level_meta():
+    metas = {
+        "semaglutide": {"source": "clinicaltrials_gov_api", "fetched_at": "2026-01-02T00:00:00Z", "cache": "hit", "cache_age_s": 5.0},
+        "tirzepatide": {"source": "mock", "fetched_at": "2026-01-01T00:00:00Z", "fallback_reason": "upstream_error"},
+    }
+    by_molecule = {"semaglutide": [{"nct_id": "NCT1"}], "tirzepatide": [{"nct_id": "NCT2"}, {"nct_id": "NCT1"}]}
+    res = molecule_result("trials", ["semaglutide", "tirzepatide"], by_molecule, metas)
+    meta = res["_meta"]
+    assert res["trials"] == [{"nct_id": "NCT1"}, {"nct_id": "NCT2"}]
+    assert meta["source"] == "clinicaltrials_gov_api+mock"
+    assert meta["fallback_reason"] == "upstream_error"
+    assert meta["cache"] == "mixed"
+    assert meta["cache_age_s"] == 5.0
+    assert meta["fetched_at"] == "2026-01-01T00:00:00Z"
+    assert meta["by_molecule"] is metas
+
+
+def test_uniform_outcomes_are_kept():
+    metas = {
+        k: {"source": "mock", "fetched_at": "2026-01-01T00:00:00Z", "fallback_reason": "circuit_open"}
+        for k in ("a", "b")
+    }
+    meta = molecule_result("iqvia", ["a", "b"], {"a": {"x": 1}, "b": {"x": 2}}, metas)["_meta"]
+    assert meta["fallback_reason"] == "circuit_open"
+    assert "cache" not in meta
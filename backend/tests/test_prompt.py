@@ -0,0 +1,67 @@
+import json
+
+from backend.app.services.prompt import estimate_tokens, pack_report_data
+
+
+AGENTS = ["web_search", "iqvia", "exim", "internal_knowledge"]
+
+
+def _iqvia(n: int):
+    return {
+        "therapy_area": "Metabolic",
+        "cagr": 12.5,
+        "competitors": [{"name": f"Competitor {i}", "market_share": 0.1} for i in range(n)],
+        "trends": ["Payer pressure on GLP-1 pricing and access across markets"] * 4,
+    }
+
+
+def _exim():
+    return {"import_dependency": 0.4, "top_exporters": [{"country": c, "share": "20%"} for c in "ABCDE"], "notes": "x " * 60}
+
+
+def _report(molecules):
+    per = {
+        m: {
+            "publications": [{"title": f"{m} study {i}", "abstract": "word " * 80} for i in range(3)],
+            "iqvia": _iqvia(8),
+            "exim": _exim(),
+        }
+        for m in molecules
+    }
+    return {
+        "query": "business case",
+        "publications": [p for m in molecules for p in per[m]["publications"]],
+        "iqvia": per[molecules[0]]["iqvia"],
+        "exim": per[molecules[0]]["exim"],
+        "internal_docs": [{"title": "Strategy memo", "summary": "Internal positioning notes"}],
+        "molecules": per if len(molecules) > 1 else {},
+        "sources": {"internal_docs": {"source": "local_internal_docs"}},
+    }
+
+
+def test_flat_sections_without_breakdown_are_sent():
+    packed = json.loads(pack_report_data(_report(["sildenafil", "tirzepatide"]), AGENTS, 10000))
+    assert packed["internal_docs"] == [{"title": "Strategy memo", "summary": "Internal positioning notes"}]
+    # Sections with a per-molecule breakdown are not duplicated at the top level.
+    assert "publications" not in packed and "iqvia" not in packed
+    assert set(packed["molecules"]["tirzepatide"]) == {"publications", "iqvia", "exim"}
+
+
+def test_dict_sections_shrink_with_the_budget():
+    report = _report(["sildenafil", "tirzepatide", "semaglutide"])
+    sizes = [estimate_tokens(pack_report_data(report, AGENTS, budget)) for budget in (10000, 1500, 800, 300)]
+    assert sizes == sorted(sizes, reverse=True) and len(set(sizes)) == len(sizes)
+    assert sizes[1] <= 1500 and sizes[2] <= 800
+
+    packed = json.loads(pack_report_data(report, AGENTS, 300))
+    assert "iqvia (semaglutide)" in packed["omitted"]
+    assert "iqvia" not in packed["molecules"]["semaglutide"]
+    # List sections keep their top item however small the budget.
+    assert len(packed["molecules"]["sildenafil"]["publications"]) == 1
+    assert packed["internal_docs"]
+
+
+def test_within_budget_is_untouched():
+    packed = json.loads(pack_report_data(_report(["sildenafil"]), AGENTS, 100000))
+    assert "omitted" not in packed
+    assert len(packed["publications"]) == 3 and len(packed["iqvia"]["competitors"]) == 8
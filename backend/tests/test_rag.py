@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from backend.app.services import rag
+
+
+@pytest.fixture
+def docs_dir(tmp_path, monkeypatch):
+    docs = tmp_path / "internal_docs"
+    docs.mkdir()
+    monkeypatch.setattr(rag, "_INTERNAL_DIR", str(docs))
+    monkeypatch.setattr(rag, "_INDEX_PATH", str(tmp_path / "index" / "internal_docs.json"))
+    monkeypatch.setattr(rag, "_index", None)
+    monkeypatch.setenv("RAG_MODE", "lexical")
+    return docs
+
+
+def test_touched_file_is_persisted_and_not_reread(docs_dir, monkeypatch):
+    path = docs_dir / "memo.md"
+    path.write_text("Semaglutide strategy memo for the obesity franchise.", encoding="utf-8")
+    assert rag.refresh_index() == 1
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert rag.refresh_index() == 0
+
+    # A restart loads the persisted index: the new stamp must be there, so the file is not read again.
+    monkeypatch.setattr(rag, "_index", None)
+    reads = []
+    monkeypatch.setattr(rag, "_read_doc", lambda p: reads.append(p) or "")
+    assert rag.refresh_index() == 0
+    assert reads == []
+
+
+def test_changed_and_removed_files_are_counted(docs_dir):
+    path = docs_dir / "memo.md"
+    path.write_text("first version", encoding="utf-8")
+    (docs_dir / "other.txt").write_text("another document", encoding="utf-8")
+    assert rag.refresh_index() == 2
+
+    path.write_text("second, longer version", encoding="utf-8")
+    (docs_dir / "other.txt").unlink()
+    assert rag.refresh_index() == 2
+    assert set(rag._index.docs) == {"memo.md"}
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+
+import pytest
+
+from backend.app.services import report_store
+from backend.app.services.report_store import ReportStore, content_id
+
+LEGACY_ID = "0cd1b98c-1e2f-4c57-b2e9-5ab0feca67fc"
+
+
+@pytest.fixture
+def reports_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_store, "REPORTS_DIR", str(tmp_path))
+    monkeypatch.setattr(report_store, "INDEX_PATH", str(tmp_path / "index.json"))
+    return tmp_path
+
+
+def _pdf(directory, report_id: str, age_s: float = 0) -> str:
+    path = os.path.join(directory, f"{report_id}.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+    then = time.time() - age_s
+    os.utime(path, (then, then))
+    return path
+
+
+def test_rebuild_evicts_only_content_id_reports(reports_dir):
+    old = content_id({"query": "old"})
+    old_path = _pdf(reports_dir, old, age_s=3600)
+    legacy_path = _pdf(reports_dir, LEGACY_ID, age_s=3600)
+    other_path = _pdf(reports_dir, "notes", age_s=3600)
+
+    store = ReportStore(max_bytes=1 << 20, max_age_s=60)
+    store.maintain()
+    assert not os.path.exists(old_path)
+    assert os.path.exists(legacy_path) and os.path.exists(other_path)
+    with open(reports_dir / "index.json", "r", encoding="utf-8") as f:
+        assert json.load(f) == {}
+    assert report_store.legacy_report_path(LEGACY_ID) == legacy_path
+    assert report_store.legacy_report_path(old) is None
+
+
+def test_legacy_entries_in_an_existing_index_are_dropped_not_deleted(reports_dir):
+    fresh = content_id({"query": "fresh"})
+    _pdf(reports_dir, fresh)
+    legacy_path = _pdf(reports_dir, LEGACY_ID, age_s=3600)
+    stamp = {"size": 9, "created_at": time.time() - 3600, "accessed_at": time.time() - 3600}
+    with open(reports_dir / "index.json", "w", encoding="utf-8") as f:
+        json.dump({fresh: dict(stamp, accessed_at=time.time()), LEGACY_ID: stamp}, f)
+
+    store = ReportStore(max_bytes=1 << 20, max_age_s=60)
+    store.maintain()
+    assert os.path.exists(legacy_path)
+    assert store.has(fresh) and not store.has(LEGACY_ID)
+    with open(reports_dir / "index.json", "r", encoding="utf-8") as f:
+        assert list(json.load(f)) == [fresh]
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from backend.app import orchestrator
+from backend.app.services.sessions import SessionStore
+from backend.app.workers.common import molecule_result, resolve_keys
+
+
+@pytest.fixture
+def calls(monkeypatch) -> Dict[str, int]:
+    """Offline stand-ins for every agent and a private session store; returns agent -> call count."""
+    counts: Dict[str, int] = {}
+
+    def stub(name: str):
+        section = orchestrator.AGENT_SECTIONS[name]
+
+        async def agent(query: str, keys: List[str] = None):
+            counts[name] = counts.get(name, 0) + 1
+            keys = resolve_keys(query, keys)
+            empty = {} if section in ("iqvia", "exim") else []
+            metas = {k: {"source": "stub", "fetched_at": "2026-01-01T00:00:00Z"} for k in keys}
+            return molecule_result(section, keys, {k: empty for k in keys}, metas)
+
+        return agent
+
+    for name in orchestrator.AGENTS:
+        monkeypatch.setitem(orchestrator.AGENTS, name, stub(name))
+    monkeypatch.setattr(orchestrator, "sessions", SessionStore(max_sessions=8, ttl_s=60, result_ttl_s=60))
+    return counts
+
+
+def _turn(query: str, conversation_id: str = "t"):
+    return asyncio.run(orchestrator.run_workflow(query, [], conversation_id=conversation_id))
+
+
+def test_follow_up_reuses_earlier_results(calls):
+    first = _turn("semaglutide patents and clinical trials")
+    assert {"patent", "trials"} <= set(first["tasks"])
+    before = dict(calls)
+
+    # No molecule named: the follow-up stays on semaglutide and reuses the patent result.
+    second = _turn("and what about the patents?")
+    assert second["molecules"] == ["semaglutide"]
+    assert "patent" in second["reused"] and "patent" not in second["tasks"]
+    assert second["results"]["patent"]["_meta"]["session"] == "reused"
+    assert calls["patent"] == before["patent"]
+
+
+def test_multi_molecule_fallback_is_not_remembered(calls, monkeypatch):
+    def trials_with_partial_fallback(query, keys=None):
+        metas = {
+            keys[0]: {"source": "clinicaltrials_gov_api", "fetched_at": "2026-01-01T00:00:00Z"},
+            keys[1]: {"source": "mock", "fetched_at": "2026-01-01T00:00:00Z", "fallback_reason": "upstream_error"},
+        }
+        return {
+            "trials": [],
+            "by_molecule": {k: [] for k in keys},
+            "_meta": {"source": "clinicaltrials_gov_api+mock", "molecules": keys, "by_molecule": metas},
+        }
+
+    monkeypatch.setitem(orchestrator.AGENTS, "trials", trials_with_partial_fallback)
+    final = _turn("semaglutide vs tirzepatide trials")
+    assert final["molecules"] == ["semaglutide", "tirzepatide"]
+    assert "trials" in final["results"]
+
+    again = _turn("semaglutide vs tirzepatide trials")
+    assert "trials" in again["tasks"] and "trials" not in again["reused"]
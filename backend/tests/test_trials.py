@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import pytest
+
+from backend.app.services.cache import MemoryBackend, ResponseCache
+from backend.app.workers import trials
+
+
+def _study(i: int) -> Dict[str, Any]:
+    return {
+        "protocolSection": {
+            "identificationModule": {"nctId": f"NCT{i:08d}", "briefTitle": f"Study {i}"},
+            "statusModule": {"overallStatus": "RECRUITING"},
+            "designModule": {"phases": ["PHASE2"]},
+            "sponsorCollaboratorsModule": {"leadSponsor": {"name": "Sponsor"}},
+        }
+    }
+
+
+@pytest.fixture
+def upstream(monkeypatch) -> Tuple[Dict[Any, Any], List[Dict[str, Any]]]:
+    """Serve three CT.gov pages of two studies; returns the pages by token and the kwargs of every request."""
+    calls: List[Dict[str, Any]] = []
+    book = {
+        None: {"studies": [_study(1), _study(2)], "nextPageToken": "p2", "totalCount": 6},
+        "p2": {"studies": [_study(3), _study(4)], "nextPageToken": "p3"},
+        "p3": {"studies": [_study(5), _study(6)]},
+    }
+
+    async def fake_request(name: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        calls.append(kwargs)
+        page = book[kwargs["params"].get("pageToken")]
+        if isinstance(page, Exception):
+            raise page
+        return httpx.Response(200, json=page)
+
+    monkeypatch.setattr(trials, "upstream_request", fake_request)
+    monkeypatch.setattr(trials, "_CACHE", ResponseCache(MemoryBackend(max_entries=16, ttl_s=900), "ctgov", 60))
+    monkeypatch.setenv("CTGOV_LANDSCAPE_PAGE_TIMEOUT_S", "4")
+    return book, calls
+
+
+def _cached_ttl(term: str) -> float:
+    return next(ttl for key, (_, _, ttl) in trials._CACHE.backend._data.items() if term in key)
+
+
+def test_complete_scan_is_cached_for_the_full_ttl(upstream):
+    _, calls = upstream
+    found, meta = asyncio.run(trials._cached_ctgov_landscape("semaglutide", 3))
+    assert [t["nct_id"] for t in found["trials"]] == ["NCT00000001", "NCT00000002", "NCT00000003"]
+    assert found["landscape"]["total"] == found["landscape"]["scanned"] == 6
+    assert "truncated" not in found["landscape"] and "interrupted" not in found
+    assert meta["cache"] == "miss" and _cached_ttl("semaglutide") == 900
+    assert [c["timeout"] for c in calls] == [4, 4, 4]
+
+
+def test_scan_cut_short_by_an_error_is_cached_briefly(upstream):
+    book, _ = upstream
+    book["p3"] = httpx.ConnectError("reset")
+    found, _ = asyncio.run(trials._cached_ctgov_landscape("semaglutide", 3))
+    assert found["landscape"]["scanned"] == 4 and found["landscape"]["truncated"]
+    assert found["interrupted"]
+    assert _cached_ttl("semaglutide") == 60
+
+
+def test_page_cap_truncates_without_shortening_the_ttl(upstream, monkeypatch):
+    _, calls = upstream
+    monkeypatch.setenv("CTGOV_LANDSCAPE_MAX_PAGES", "2")
+    found, _ = asyncio.run(trials._cached_ctgov_landscape("semaglutide", 3))
+    assert found["landscape"]["truncated"] and "interrupted" not in found
+    assert len(calls) == 2 and _cached_ttl("semaglutide") == 900
+
+
+def test_scan_budget_follows_the_trials_deadline(monkeypatch):
+    for name in ("AGENT_DEADLINE_TRIALS_S", "CTGOV_LANDSCAPE_BUDGET_S"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("AGENT_DEADLINE_S", "12")
+    assert trials._landscape_budget_s() == 11
+    monkeypatch.setenv("AGENT_DEADLINE_TRIALS_S", "5")
+    assert trials._landscape_budget_s() == 4
+    monkeypatch.setenv("CTGOV_LANDSCAPE_BUDGET_S", "2.5")
+    assert trials._landscape_budget_s() == 2.5
+
+
+def test_scan_stops_within_its_budget(upstream, monkeypatch):
+    _, calls = upstream
+    fast = trials.upstream_request
+
+    async def slow(*args: Any, **kwargs: Any) -> httpx.Response:
+        await asyncio.sleep(0.15)
+        return await fast(*args, **kwargs)
+
+    monkeypatch.setattr(trials, "upstream_request", slow)
+    monkeypatch.setenv("CTGOV_LANDSCAPE_BUDGET_S", "0.2")
+    found = asyncio.run(trials._ctgov_landscape("semaglutide", 3))
+    # Page 1 may take the whole budget; page 2 only what was left, and page 3 is never started.
+    assert len(calls) == 2
+    assert calls[0]["timeout"] == 0.2 and 0 < calls[1]["timeout"] < 0.1
+    assert found["landscape"]["scanned"] == 4
+    assert found["landscape"]["truncated"] and found["interrupted"]
@@ -0,0 +1,56 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from backend.app.services import vectors  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def vector_dir(tmp_path, monkeypatch):
+    """Keep the vectors on tmp_path; monkeypatch restores the module's paths and snapshot on teardown."""
+    monkeypatch.setattr(vectors, "_VECTOR_DIR", str(tmp_path))
+    monkeypatch.setattr(vectors, "_MATRIX_PATH", str(tmp_path / "m.npy"))
+    monkeypatch.setattr(vectors, "_META_PATH", str(tmp_path / "m.json"))
+    monkeypatch.setattr(vectors, "_loaded", None)
+    monkeypatch.setenv("RAG_VECTOR_DIM", "64")
+
+
+def test_search_matches_a_full_cosine_scan(monkeypatch):
+    monkeypatch.setenv("RAG_VECTOR_MIN_SIM", "-1")
+
+    texts = [
+        "semaglutide obesity phase 3 weight loss outcomes",
+        "tirzepatide versus semaglutide head to head trial",
+        "sildenafil pulmonary hypertension repurposing",
+        "viagra erectile dysfunction market share",
+        "donanemab amyloid clearance alzheimer",
+        "supply chain import dependency for peptides",
+    ]
+    ids = [f"p{i}" for i in range(len(texts))]
+    vectors.build(ids, texts)
+
+    query = ["sildenafil", "market"]
+    meta = vectors._load()
+    dense = np.ascontiguousarray(np.asarray(meta["matrix"]).T)  # back to one row per passage
+    q = np.zeros(64, dtype=np.float32)
+    for bucket, weight in vectors._features(" ".join(query), 64).items():
+        q[bucket] = weight
+    q *= meta["idf"]
+    q /= np.linalg.norm(q)
+    expected = {pid: float(s) for pid, s in zip(ids, dense @ q)}
+
+    got = vectors.search(query, len(ids))
+    assert {pid: s for s, pid in got} == pytest.approx(expected, abs=1e-6)
+    assert [s for s, _ in got] == sorted((s for s, _ in got), reverse=True)
+    # "viagra" collapses onto sildenafil, so the market passage about the brand ranks first.
+    assert got[0][1] == "p3"
+
+
+def test_rebuild_leaves_a_held_snapshot_intact():
+    vectors.build(["a", "b"], ["semaglutide obesity", "sildenafil market"])
+    held = vectors._load()
+    vectors.build(["c"], ["donanemab amyloid"])
+    # A search that loaded the old snapshot before the rebuild still sees a consistent one.
+    assert held["ids"] == ["a", "b"] and held["matrix"].shape == (64, 2)
+    assert vectors._load()["ids"] == ["c"]
+    assert [pid for _, pid in vectors.search(["donanemab"], 5)] == ["c"]